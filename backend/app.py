@@ -1,17 +1,29 @@
 """
 Main Flask application with clean routes
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import traceback
 
 # Import configuration
-from config import CORS_ORIGINS, DEBUG, HOST, PORT
+from config import (
+    CORS_ORIGINS, DEBUG, HOST, PORT,
+    QUESTION_EXTRACTION_PROFILE, ROSTER_EXTRACTION_PROFILE, UPLOAD_CHUNK_SIZE,
+)
 
 # Import services
-from services.pdf_utils import validate_pdf_file
+from services.pdf_utils import validate_pdf_file, resolve_extraction_profile
 from services.student_service import extract_students_from_pdf
-from services.question_service import extract_questions_from_pdf
+from services.question_service import extract_questions_incremental
+from services.admission import admission_controlled, extraction_gate, init_client_identity
+from services.logging_setup import configure_logging
+from services.responses import init_responses
+from services.chunked_uploads import (
+    UploadError, create_upload, upload_status, put_chunk, finalize_upload, open_upload, discard_upload
+)
+
+# Route services logs through the background queue
+configure_logging()
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -19,7 +31,14 @@ app = Flask(__name__)
 # Configure CORS
 CORS(app, origins=CORS_ORIGINS)
 
+# Fast JSON encoding and gzip/brotli response compression
+init_responses(app)
+
+# Client addresses for the extraction limits, through trusted proxies only
+init_client_identity(app)
+
 @app.route("/api/extract-students", methods=["POST", "OPTIONS"])
+@admission_controlled
 def extract_students():
     """Extract student information from uploaded PDF"""
     # Handle preflight requests
@@ -27,19 +46,30 @@ def extract_students():
         return jsonify({"status": "ok"}), 200
         
     try:
-        # Check if a file was included in the request
-        if 'file' not in request.files:
+        # Check if a file or a finalized chunked upload was included in the request
+        upload_id = request.values.get("uploadId")
+        if 'file' not in request.files and not upload_id:
             return jsonify({"error": "No file part in the request"}), 400
 
-        file = request.files["file"]
-
-        # Validate PDF file
-        is_valid, error_message = validate_pdf_file(file)
-        if not is_valid:
-            return jsonify({"error": error_message}), 400
-
-        # Extract students from PDF
-        students = extract_students_from_pdf(file)
+        # The assembled upload is read in place, not copied again
+        file = open_upload(upload_id) if upload_id else request.files["file"]
+        try:
+            # Validate PDF file
+            is_valid, error_message = validate_pdf_file(file)
+            if not is_valid:
+                return jsonify({"error": error_message}), 400
+
+            profile, error_message = resolve_extraction_profile(request.values.get("profile"), ROSTER_EXTRACTION_PROFILE)
+            if error_message:
+                return jsonify({"error": error_message}), 400
+
+            # Extract students from PDF
+            students = extract_students_from_pdf(file, profile)
+        finally:
+            if upload_id:
+                file.close()
+        if upload_id:
+            discard_upload(upload_id)
         
         if not students:
             return jsonify({
@@ -48,12 +78,14 @@ def extract_students():
                 "count": 0
             }), 200
             
-        return jsonify({
-            "students": students,
-            "count": len(students),
-            "message": f"Successfully extracted {len(students)} students"
-        }), 200
+        # Large rosters are streamed straight from their columns
+        return Response(students.json_chunks(
+            count=len(students),
+            message=f"Successfully extracted {len(students)} students"
+        ), status=200, mimetype="application/json")
         
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         print(f"Unexpected error in extract_students: {e}")
         print(f"Error type: {type(e)}")
@@ -61,6 +93,7 @@ def extract_students():
         return jsonify({"error": "Internal server error occurred while processing the file"}), 500
 
 @app.route("/api/upload", methods=["POST", "OPTIONS"])
+@admission_controlled
 def upload_file():
     """Extract questions from uploaded PDF"""
     # Handle preflight requests
@@ -68,43 +101,103 @@ def upload_file():
         return jsonify({"status": "ok"}), 200
         
     try:
-        # Check if a file was included in the request
-        if 'file' not in request.files:
+        # Check if a file or a finalized chunked upload was included in the request
+        upload_id = request.values.get("uploadId")
+        if 'file' not in request.files and not upload_id:
             return jsonify({"error": "No file part in the request"}), 400
 
-        file = request.files["file"]
-
-        # Validate PDF file
-        is_valid, error_message = validate_pdf_file(file)
-        if not is_valid:
-            return jsonify({"error": error_message}), 400
-
-        # Extract questions from PDF
-        questions = extract_questions_from_pdf(file)
+        # The assembled upload is read in place, not copied again
+        file = open_upload(upload_id) if upload_id else request.files["file"]
+        try:
+            # Validate PDF file
+            is_valid, error_message = validate_pdf_file(file)
+            if not is_valid:
+                return jsonify({"error": error_message}), 400
+
+            profile, error_message = resolve_extraction_profile(request.values.get("profile"), QUESTION_EXTRACTION_PROFILE)
+            if error_message:
+                return jsonify({"error": error_message}), 400
+
+            # Extract questions from PDF, reusing unchanged pages of a previous upload
+            questions, extraction = extract_questions_incremental(
+                file, request.form.get("previousExtractionId"), profile
+            )
+        finally:
+            if upload_id:
+                file.close()
+        if upload_id:
+            discard_upload(upload_id)
         
         if not questions:
             return jsonify({
                 "message": "Successfully processed PDF, but no questions in the expected format were found.",
                 "questions": [],
-                "count": 0
+                "count": 0,
+                **extraction
             }), 200
             
         return jsonify({
             "questions": questions,
             "count": len(questions),
-            "message": f"Successfully extracted {len(questions)} questions"
+            "message": f"Successfully extracted {len(questions)} questions",
+            **extraction
         }), 200
         
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         print(f"Unexpected error in upload_file: {e}")
         print(f"Error type: {type(e)}")
         traceback.print_exc()
         return jsonify({"error": "Internal server error occurred while processing the file"}), 500
 
+@app.route("/api/uploads", methods=["POST"])
+def create_chunked_upload():
+    """Start a resumable chunked upload: {"filename", "size", "sha256"?}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        state = create_upload(data.get("filename"), data.get("size"), data.get("sha256"))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    return jsonify(dict(state, chunkSize=UPLOAD_CHUNK_SIZE)), 201
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def get_chunked_upload(upload_id):
+    """Upload state; "offset" is where the next chunk starts after an interruption"""
+    try:
+        return jsonify(upload_status(upload_id)), 200
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id):
+    """Write one chunk: raw bytes at ?offset=N, with their SHA-256 in X-Chunk-Sha256"""
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Missing chunk offset"}), 400
+    try:
+        state = put_chunk(upload_id, offset, request.stream, request.content_length,
+                          request.headers.get("X-Chunk-Sha256"))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    return jsonify(state), 200
+
+@app.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_chunked_upload(upload_id):
+    """Complete an upload; extract it by passing its uploadId to /api/upload or /api/extract-students"""
+    try:
+        return jsonify(finalize_upload(upload_id)), 200
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """Health check endpoint for monitoring"""
-    return jsonify({"status": "healthy", "message": "PDF processing service is running"}), 200
+    return jsonify({
+        "status": "healthy",
+        "message": "PDF processing service is running",
+        "extraction": extraction_gate.stats()
+    }), 200
 
 @app.errorhandler(404)
 def not_found(error):
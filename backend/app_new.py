@@ -1,21 +1,48 @@
 """
 Main Flask application with database integration
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
 from flask_cors import CORS
 import traceback
 
 # Import configuration
-from config import CORS_ORIGINS, DEBUG, HOST, PORT, DATABASE_URI
+from config import (
+    CORS_ORIGINS, DEBUG, HOST, PORT, DATABASE_URI,
+    QUESTION_EXTRACTION_PROFILE, ROSTER_EXTRACTION_PROFILE, UPLOAD_CHUNK_SIZE,
+)
 
 # Import services
-from services.pdf_utils import validate_pdf_file
+from services.pdf_utils import validate_pdf_file, resolve_extraction_profile
 from services.student_service import extract_students_from_pdf
-from services.question_service import extract_questions_from_pdf
+from services.question_service import extract_questions_incremental
+from services.admission import admission_controlled, extraction_gate, init_client_identity
+from services.logging_setup import configure_logging
+from services.responses import init_responses
+from services.chunked_uploads import (
+    UploadError, create_upload, upload_status, put_chunk, finalize_upload, open_upload, discard_upload
+)
+from services.roster_validation import parse_roster, validate_roster, save_roster
+from services.roster_lookup import roster_index
+from services.answer_matcher import exam_option_indexes, match_answer
+from services.exam_payload import exam_response
+from services.question_bank import (
+    ensure_search_index, ensure_speech_columns, find_near_duplicates, search_questions, add_questions_to_bank,
+    serialize_question
+)
+from services.speech_text import render_question_speech
+from services.results_export import EXPORT_FORMATS, csv_chunks, xlsx_chunks, ensure_results_index
+from services.item_statistics import (
+    ensure_item_statistics, exam_statistics, rebuild_item_statistics, record_answer
+)
 
 # Import models
 from models import db, Student, Exam, Question, StudentAnswer
 
+# Route services logs through the background queue
+configure_logging()
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -27,11 +54,35 @@ db.init_app(app)
 # Configure CORS
 CORS(app, origins=CORS_ORIGINS)
 
-# Create tables
-with app.app_context():
-    db.create_all()
+# Fast JSON encoding and gzip/brotli response compression
+init_responses(app)
+
+# Client addresses for the extraction limits, through trusted proxies only
+init_client_identity(app)
+
+def init_db():
+    """Create database tables (run once per deployment, not on import)"""
+    with app.app_context():
+        db.create_all()
+        ensure_search_index()
+        ensure_speech_columns()
+        ensure_results_index()
+        ensure_item_statistics()
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create database tables: flask --app app_new init-db"""
+    init_db()
+    print("Database tables created")
+
+@app.cli.command("rebuild-item-stats")
+def rebuild_item_stats_command():
+    """Recompute item statistics from all answers: flask --app app_new rebuild-item-stats"""
+    count = rebuild_item_statistics()
+    print(f"Item statistics rebuilt from {count} answers")
 
 @app.route("/api/extract-students", methods=["POST", "OPTIONS"])
+@admission_controlled
 def extract_students():
     """Extract student information from uploaded PDF"""
     # Handle preflight requests
@@ -39,19 +90,30 @@ def extract_students():
         return jsonify({"status": "ok"}), 200
 
     try:
-        # Check if a file was included in the request
-        if 'file' not in request.files:
+        # Check if a file or a finalized chunked upload was included in the request
+        upload_id = request.values.get("uploadId")
+        if 'file' not in request.files and not upload_id:
             return jsonify({"error": "No file part in the request"}), 400
 
-        file = request.files["file"]
-
-        # Validate PDF file
-        is_valid, error_message = validate_pdf_file(file)
-        if not is_valid:
-            return jsonify({"error": error_message}), 400
-
-        # Extract students from PDF
-        students = extract_students_from_pdf(file)
+        # The assembled upload is read in place, not copied again
+        file = open_upload(upload_id) if upload_id else request.files["file"]
+        try:
+            # Validate PDF file
+            is_valid, error_message = validate_pdf_file(file)
+            if not is_valid:
+                return jsonify({"error": error_message}), 400
+
+            profile, error_message = resolve_extraction_profile(request.values.get("profile"), ROSTER_EXTRACTION_PROFILE)
+            if error_message:
+                return jsonify({"error": error_message}), 400
+
+            # Extract students from PDF
+            students = extract_students_from_pdf(file, profile)
+        finally:
+            if upload_id:
+                file.close()
+        if upload_id:
+            discard_upload(upload_id)
 
         if not students:
             return jsonify({
@@ -60,19 +122,62 @@ def extract_students():
                 "count": 0
             }), 200
 
-        return jsonify({
-            "students": students,
-            "count": len(students),
-            "message": f"Successfully extracted {len(students)} students"
-        }), 200
+        # Large rosters are streamed straight from their columns
+        return Response(students.json_chunks(
+            count=len(students),
+            message=f"Successfully extracted {len(students)} students"
+        ), status=200, mimetype="application/json")
 
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         print(f"Unexpected error in extract_students: {e}")
         print(f"Error type: {type(e)}")
         traceback.print_exc()
         return jsonify({"error": "Internal server error occurred while processing the file"}), 500
 
+@app.route("/api/students/import", methods=["POST"])
+def import_students():
+    """Validate a reviewed roster and save it; nothing is written while any row conflicts"""
+    data = request.get_json(silent=True) or {}
+    students = data.get("students") or []
+    if not students or not isinstance(students, list) or not all(isinstance(s, dict) for s in students):
+        return jsonify({"error": "Expected a non-empty list of students"}), 400
+
+    roster = parse_roster(students)
+    conflicts = validate_roster(roster)
+    if data.get("dryRun"):
+        return jsonify({"conflicts": conflicts, "valid": not conflicts, "count": len(roster)}), 200
+    if conflicts:
+        return jsonify({
+            "error": f"{len(conflicts)} conflicts found, no students were imported",
+            "conflicts": conflicts
+        }), 409
+
+    try:
+        saved = save_roster(roster)
+    except IntegrityError:
+        # Another import saved some of these students since validation
+        db.session.rollback()
+        return jsonify({
+            "error": "Some students were saved by another import meanwhile, no students were imported",
+            "conflicts": validate_roster(roster)
+        }), 409
+
+    return jsonify({"count": saved, "message": f"Imported {saved} students"}), 201
+
+@app.route("/api/students/verify", methods=["POST"])
+def verify_student():
+    """Match a spoken roll number or name against the roster"""
+    data = request.get_json(silent=True) or {}
+    transcript = data.get("transcript")
+    if not transcript or not isinstance(transcript, str):
+        return jsonify({"error": "Missing transcript"}), 400
+
+    return jsonify(roster_index.lookup(transcript, class_name=data.get("class"))), 200
+
 @app.route("/api/upload", methods=["POST", "OPTIONS"])
+@admission_controlled
 def upload_file():
     """Extract questions from uploaded PDF"""
     # Handle preflight requests
@@ -80,43 +185,107 @@ def upload_file():
         return jsonify({"status": "ok"}), 200
 
     try:
-        # Check if a file was included in the request
-        if 'file' not in request.files:
+        # Check if a file or a finalized chunked upload was included in the request
+        upload_id = request.values.get("uploadId")
+        if 'file' not in request.files and not upload_id:
             return jsonify({"error": "No file part in the request"}), 400
 
-        file = request.files["file"]
-
-        # Validate PDF file
-        is_valid, error_message = validate_pdf_file(file)
-        if not is_valid:
-            return jsonify({"error": error_message}), 400
+        # The assembled upload is read in place, not copied again
+        file = open_upload(upload_id) if upload_id else request.files["file"]
+        try:
+            # Validate PDF file
+            is_valid, error_message = validate_pdf_file(file)
+            if not is_valid:
+                return jsonify({"error": error_message}), 400
+
+            profile, error_message = resolve_extraction_profile(request.values.get("profile"), QUESTION_EXTRACTION_PROFILE)
+            if error_message:
+                return jsonify({"error": error_message}), 400
+
+            # Extract questions from PDF, reusing unchanged pages of a previous upload
+            questions, extraction = extract_questions_incremental(
+                file, request.form.get("previousExtractionId"), profile
+            )
+        finally:
+            if upload_id:
+                file.close()
+        if upload_id:
+            discard_upload(upload_id)
 
-        # Extract questions from PDF
-        questions = extract_questions_from_pdf(file)
+        # Flag questions that are already in the question bank
+        for question, duplicate in zip(questions, find_near_duplicates(questions)):
+            question["duplicateOf"] = duplicate
 
         if not questions:
             return jsonify({
                 "message": "Successfully processed PDF, but no questions in the expected format were found.",
                 "questions": [],
-                "count": 0
+                "count": 0,
+                **extraction
             }), 200
 
         return jsonify({
             "questions": questions,
             "count": len(questions),
-            "message": f"Successfully extracted {len(questions)} questions"
+            "message": f"Successfully extracted {len(questions)} questions",
+            **extraction
         }), 200
 
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         print(f"Unexpected error in upload_file: {e}")
         print(f"Error type: {type(e)}")
         traceback.print_exc()
         return jsonify({"error": "Internal server error occurred while processing the file"}), 500
 
+@app.route("/api/uploads", methods=["POST"])
+def create_chunked_upload():
+    """Start a resumable chunked upload: {"filename", "size", "sha256"?}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        state = create_upload(data.get("filename"), data.get("size"), data.get("sha256"))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    return jsonify(dict(state, chunkSize=UPLOAD_CHUNK_SIZE)), 201
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def get_chunked_upload(upload_id):
+    """Upload state; "offset" is where the next chunk starts after an interruption"""
+    try:
+        return jsonify(upload_status(upload_id)), 200
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id):
+    """Write one chunk: raw bytes at ?offset=N, with their SHA-256 in X-Chunk-Sha256"""
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Missing chunk offset"}), 400
+    try:
+        state = put_chunk(upload_id, offset, request.stream, request.content_length,
+                          request.headers.get("X-Chunk-Sha256"))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+    return jsonify(state), 200
+
+@app.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_chunked_upload(upload_id):
+    """Complete an upload; extract it by passing its uploadId to /api/upload or /api/extract-students"""
+    try:
+        return jsonify(finalize_upload(upload_id)), 200
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """Health check endpoint for monitoring"""
-    return jsonify({"status": "healthy", "message": "PDF processing service is running"}), 200
+    return jsonify({
+        "status": "healthy",
+        "message": "PDF processing service is running",
+        "extraction": extraction_gate.stats()
+    }), 200
 
 # Database API routes
 @app.route("/api/student/me", methods=["GET"])
@@ -186,21 +355,115 @@ def get_exam():
                 correct_answer=q_data["correct_answer"],
                 question_type="multiple-choice"
             )
+            render_question_speech(question)
             db.session.add(question)
         db.session.commit()
 
-    questions = Question.query.filter_by(exam_id=exam.id).all()
-    questions_data = []
-    for q in questions:
-        questions_data.append({
-            "text": q.question_text,
-            "options": q.options
-        })
+    # Encoded and compressed once per exam, until its questions change
+    return exam_response(exam)
+
+@app.route("/api/exam/<int:exam_id>/answer", methods=["POST"])
+def match_spoken_answer(exam_id):
+    """Map a spoken answer to one of a question's options"""
+    data = request.get_json(silent=True) or {}
+    transcript = data.get("transcript")
+    if not transcript or not isinstance(transcript, str):
+        return jsonify({"error": "Missing transcript"}), 400
+
+    option_index = exam_option_indexes.for_question(exam_id, data.get("questionId"))
+    if option_index is None:
+        return jsonify({"error": "Question not found in this exam"}), 404
+
+    return jsonify(match_answer(option_index, transcript)), 200
+
+@app.route("/api/exam/<int:exam_id>/responses", methods=["POST"])
+def record_exam_answer(exam_id):
+    """Save a student's answer to a question, replacing an earlier one"""
+    data = request.get_json(silent=True) or {}
+    roll_number = str(data.get("studentId") or "").strip()
+    question_id = data.get("questionId")
+    answer = data.get("answer")
+    if not roll_number or not isinstance(question_id, int) or not (answer is None or isinstance(answer, str)):
+        return jsonify({"error": "Expected studentId, questionId and answer"}), 400
+    if answer is not None and len(answer) > StudentAnswer.answer.type.length:
+        return jsonify({"error": "Answer is too long"}), 400
+
+    student = Student.query.filter_by(roll_number=roll_number).first()
+    if student is None:
+        return jsonify({"error": "Student not found"}), 404
+    question = db.session.get(Question, question_id)
+    if question is None or question.exam_id != exam_id:
+        return jsonify({"error": "Question not found in this exam"}), 404
+
+    # Item statistics are updated in the same transaction
+    row = record_answer(student.id, question.id, answer)
+    db.session.commit()
+    return jsonify({
+        "questionId": question.id,
+        "answer": row.answer,
+        "answeredAt": row.answered_at.isoformat(),
+    }), 200
+
+@app.route("/api/exam/<int:exam_id>/statistics", methods=["GET"])
+def get_exam_statistics(exam_id):
+    """Difficulty, discrimination and answer distribution of each question of an exam"""
+    if db.session.get(Exam, exam_id) is None:
+        return jsonify({"error": "Exam not found"}), 404
+    return jsonify(exam_statistics(exam_id))
+
+@app.route("/api/exam/<int:exam_id>/results/export", methods=["GET"])
+def export_exam_results(exam_id):
+    """Stream every answer of an exam with per-student scores as CSV or XLSX"""
+    export_format = request.args.get("format", "csv").strip().lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}."}), 400
+    exam = db.session.get(Exam, exam_id)
+    if exam is None:
+        return jsonify({"error": "Exam not found"}), 404
+
+    chunks = csv_chunks(exam_id) if export_format == "csv" else xlsx_chunks(exam_id)
+    filename = f"{secure_filename(exam.title) or 'exam'}_results.{export_format}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.route("/api/question-bank", methods=["POST"])
+def save_to_question_bank():
+    """Save reviewed questions under an exam and index them for search"""
+    data = request.get_json(silent=True) or {}
+    questions = data.get("questions") or []
+    if not questions or not isinstance(questions, list) \
+            or not all(isinstance(q, dict) and q.get("question") for q in questions):
+        return jsonify({"error": "Expected a non-empty list of questions"}), 400
+
+    duplicates = find_near_duplicates(questions)
+    exam, saved = add_questions_to_bank(questions, exam_id=data.get("examId"), exam_title=data.get("examTitle"))
+
+    saved_data = []
+    for question, duplicate in zip(saved, duplicates):
+        item = serialize_question(question)
+        item["duplicateOf"] = duplicate
+        saved_data.append(item)
 
     return jsonify({
-        "title": exam.title,
-        "questions": questions_data
-    })
+        "examId": exam.id,
+        "questions": saved_data,
+        "count": len(saved_data),
+        "message": f"Saved {len(saved_data)} questions to the question bank"
+    }), 201
+
+@app.route("/api/question-bank/search", methods=["GET"])
+def search_question_bank():
+    """Full-text search over saved questions"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing search query 'q'"}), 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+
+    results = [serialize_question(question) for question in search_questions(query, limit)]
+    return jsonify({"questions": results, "count": len(results)})
 
 @app.errorhandler(404)
 def not_found(error):
@@ -214,4 +477,5 @@ def internal_error(error):
 
 # For local development
 if __name__ == "__main__":
+    init_db()
     app.run(debug=DEBUG, host=HOST, port=PORT)
@@ -0,0 +1,993 @@
+"""
+Benchmarks for the backend
+
+    python -m bench throughput [--models sync threaded gevent] [--duration 10]
+    python -m bench cold-start [--app app] [--budget-ms N]
+    python -m bench question-parts [--blocks 100000] [--reference REV]
+    python -m bench question-bank [--size 100000]
+    python -m bench profiles [--pdf quiz.pdf ...] [--rounds 5]
+    python -m bench roster --pdf roster.pdf ... [--rounds 3] [--profile balanced]
+    python -m bench roster-validation [--size 50000]
+    python -m bench roster-lookup [--size 10000]
+    python -m bench responses [--size 5000] [--rounds 10]
+    python -m bench page-memory [--pages 500] [--budget-kb N]
+    python -m bench parse-plans [--questions 300] [--rounds 5]
+    python -m bench question-scorer [--paragraphs 5000]
+    python -m bench export-memory [--students 5000] [--budget-kb N]
+    python -m bench item-stats [--students 300] [--questions 20] [--changes 2000]
+
+cold-start: imports the app in a fresh interpreter and answers one
+/api/health request; exits non-zero if that takes longer than the budget
+or if the heavy PDF modules were loaded along the way.
+
+question-parts: compares parse_question_parts with the regex cascade it
+replaced, i.e. extract_options_from_text, extract_correct_answer_from_text
+and separate_question_from_options of services/question_service.py at git
+revision --reference. It runs both on --blocks random blocks of option
+markers, answer labels, line breaks and words, and on synthetic quiz texts.
+It reports how many options, answers and stems differ, with examples. Stems
+are expected to differ: the stem is now the text before the first option and
+the answer label. Exits non-zero if options or answers differ.
+
+question-bank: fills a scratch SQLite bank with synthetic questions and
+times full-text search and near-duplicate lookups against it.
+
+profiles: runs question and roster extraction on the given PDFs under every
+extraction profile and reports the median time per document and how many
+questions and tables were found in total.
+
+roster: times the roster table builder against pdfplumber's table finder
+on the given roster PDFs and checks both give the same rows (ignoring empty
+rows and headers repeated on later pages). Both run under --profile, which
+must be one that lets the table finder run.
+
+roster-validation: saves a synthetic roster to a scratch database, then
+validates a roster of the same size that repeats some of it, timing the
+check and counting the queries it ran.
+
+roster-lookup: saves a synthetic class to a scratch database and times
+spoken roll number and (misspelt) name lookups against the roster index,
+then checks transcripts with digit homophones ("here for the exam") verify
+the student they name; exits non-zero if one does not.
+
+responses: encodes a synthetic roster of --size students and a question
+payload with the stdlib and the fast JSON providers and reports the time
+and the size of each content coding.
+
+page-memory: extracts text from synthetic question PDFs of a tenth of
+--pages and of --pages pages under tracemalloc and reports the peak; exits
+non-zero if the peak grows by more than the budget per additional page,
+i.e. if pages are kept alive instead of released once laid out.
+
+parse-plans: parses synthetic question texts in several templates with no
+remembered plan and again with the plan learnt from the first pass, and
+reports the time of each. Then seeds every other plan for each template and
+checks each parse still gives the cascade's questions; exits non-zero if
+one does not.
+
+question-scorer: trains a throwaway scorer on synthetic question and prose
+paragraphs, then times batch scoring against the is_question_text rules on
+unseen ones and reports how often each agrees with the labels. No weights
+are written.
+
+export-memory: saves answers of --students students to 20 questions of
+one exam and of a tenth as many to another in a scratch database, exports
+both as CSV and XLSX under tracemalloc and reports the peak; exits non-zero
+if the larger export peaks more than the budget above the smaller one.
+
+item-stats: records answers of --students students to an exam through the
+ORM, then changes, clears and deletes --changes of them at random, timing
+each write with its statistics update. Checks the incrementally maintained
+statistics against a rebuild from scratch and times reading them against
+the rebuild.
+
+throughput: starts `python -m serve` once per worker model and drives it
+with concurrent PDF uploads and health checks, reporting uploads/s,
+health checks/s and health-check latency while extractions are running.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from config import WARMUP_PDF, COLD_START_BUDGET_MS, PAGE_MEMORY_BUDGET_KB, EXPORT_MEMORY_BUDGET_KB
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Modules that must only load on the first extraction request
+HEAVY_MODULES = ('pdfplumber', 'pdfminer', 'PIL')
+
+COLD_START_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {app} as module
+response = module.app.test_client().get('/api/health')
+elapsed = time.perf_counter() - started
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"ms": elapsed * 1000, "status": response.status_code, "heavy": heavy}}))
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _multipart_body(pdf_bytes, filename):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/pdf\r\n\r\n'
+    ).encode() + pdf_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def _wait_until_up(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/health', timeout=1):
+                return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    return False
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+@contextlib.contextmanager
+def _scratch_db():
+    """
+    App context on a new SQLite database in a temporary directory, with the
+    schema init_db creates in app_new
+    """
+    from flask import Flask
+    from models import db
+    from services.item_statistics import ensure_item_statistics
+    from services.question_bank import ensure_search_index, ensure_speech_columns
+    from services.results_export import ensure_results_index
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            ensure_search_index()
+            ensure_speech_columns()
+            ensure_results_index()
+            ensure_item_statistics()
+            yield
+
+
+def run_load(base_url, pdf_path, duration, upload_clients, health_clients):
+    """Drive one running server; returns a dict of measurements"""
+    with open(pdf_path, 'rb') as f:
+        body, content_type = _multipart_body(f.read(), os.path.basename(pdf_path))
+
+    stop_at = time.monotonic() + duration
+    lock = threading.Lock()
+    results = {'uploads': 0, 'rejected': 0, 'errors': 0, 'health': 0, 'health_latency': []}
+
+    def upload_loop(index):
+        headers = {'Content-Type': content_type, 'X-Forwarded-For': f'10.0.0.{index}'}
+        while time.monotonic() < stop_at:
+            req = urllib.request.Request(f'{base_url}/api/upload', data=body, headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=60) as resp:
+                    resp.read()
+                key = 'uploads'
+            except urllib.error.HTTPError as e:
+                key = 'rejected' if e.code == 429 else 'errors'
+                if e.code == 429:
+                    time.sleep(float(e.headers.get('Retry-After', 1)) / 10)
+            except (urllib.error.URLError, OSError):
+                key = 'errors'
+            with lock:
+                results[key] += 1
+
+    def health_loop():
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f'{base_url}/api/health', timeout=30) as resp:
+                    resp.read()
+            except (urllib.error.URLError, OSError):
+                with lock:
+                    results['errors'] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                results['health'] += 1
+                results['health_latency'].append(elapsed)
+
+    threads = [threading.Thread(target=upload_loop, args=(i,)) for i in range(upload_clients)]
+    threads += [threading.Thread(target=health_loop) for _ in range(health_clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latency = results.pop('health_latency')
+    results['uploads_per_s'] = results['uploads'] / duration
+    results['health_per_s'] = results['health'] / duration
+    results['health_p50_ms'] = _percentile(latency, 50) * 1000
+    results['health_p95_ms'] = _percentile(latency, 95) * 1000
+    return results
+
+
+def throughput(args):
+    rows = []
+    for model in args.models:
+        port = _free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'serve', '--workers', model, '--host', '127.0.0.1', '--port', str(port)],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not _wait_until_up(base_url):
+                print(f"{model}: server did not start")
+                continue
+            result = run_load(base_url, args.pdf, args.duration, args.upload_clients, args.health_clients)
+            rows.append((model, result))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'model':<10}{'uploads/s':>11}{'429s':>7}{'health/s':>10}{'health p50':>12}{'health p95':>12}")
+    for model, r in rows:
+        print(f"{model:<10}{r['uploads_per_s']:>11.1f}{r['rejected']:>7}{r['health_per_s']:>10.1f}"
+              f"{r['health_p50_ms']:>10.1f}ms{r['health_p95_ms']:>10.1f}ms")
+    return 0
+
+
+def cold_start(args):
+    """Measure import + first health check in a fresh interpreter"""
+    samples = []
+    for _ in range(args.runs):
+        probe = subprocess.run(
+            [sys.executable, '-c', COLD_START_PROBE.format(app=args.app, heavy=HEAVY_MODULES)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+
+    best_ms = min(sample['ms'] for sample in samples)
+    heavy = samples[0]['heavy']
+    print(f"{args.app}: cold start {best_ms:.0f}ms (budget {args.budget_ms}ms), "
+          f"health status {samples[0]['status']}, heavy modules loaded: {heavy or 'none'}")
+
+    if samples[0]['status'] != 200:
+        print("FAIL: health check did not return 200")
+        return 1
+    if heavy:
+        print(f"FAIL: {', '.join(heavy)} imported before the first extraction")
+        return 1
+    if best_ms > args.budget_ms:
+        print("FAIL: cold start over budget")
+        return 1
+    return 0
+
+
+# Revision whose question_service still parsed options, answers and stems
+# with separate regex cascades
+QUESTION_PARTS_REFERENCE = "0df375c^"
+
+# Pieces of the random question blocks question-parts parses
+_QUESTION_PART_ATOMS = [
+    'A)', 'B)', 'c)', 'd)', 'a.', 'B.', 'C. ', 'D.', 'Answer:', 'answer: ', 'Answer: B)', 'ANSWER: c.',
+    'Answer: D', ' ', '  ', '\t', '\n', '\n', '\n', '\r', '\r\n', 'foo', 'Egypt', 'K2', ', ', 'x',
+    'AN4', 'OR7', 'mountain', '(A)', 'e)', 'Z.', 'Mount Everest', ' A) ', ' b. ', '?',
+]
+
+
+def _question_service_at(revision):
+    """services/question_service.py as of a git revision, loaded as a module"""
+    import types
+
+    source = subprocess.run(
+        ['git', 'show', f'{revision}:./services/question_service.py'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    module = types.ModuleType('services._question_service_reference')
+    module.__package__ = 'services'
+    exec(compile(source, f'{revision}:services/question_service.py', 'exec'), module.__dict__)
+    return module
+
+
+def question_parts(args):
+    """Compare parse_question_parts with the separate regex cascades it replaced"""
+    import logging
+    from services import question_service
+
+    logging.disable(logging.CRITICAL)
+    try:
+        reference = _question_service_at(args.reference)
+    except subprocess.CalledProcessError as e:
+        print(f"Cannot load question_service at {args.reference}: {e.stderr.strip()}")
+        return 1
+
+    def reference_parts(block):
+        options = reference.extract_options_from_text(block)
+        return (reference.separate_question_from_options(block, options), options,
+                reference.extract_correct_answer_from_text(block))
+
+    rng = random.Random(args.seed)
+    differences = {"stem": [], "options": [], "answer": []}
+    for _ in range(args.blocks):
+        block = "".join(rng.choice(_QUESTION_PART_ATOMS) for _ in range(rng.randint(0, 25)))
+        expected = reference_parts(block)
+        parsed = question_service.parse_question_parts(block)
+        for kind, old, new in zip(differences, expected, parsed):
+            if old != new:
+                differences[kind].append((block, old, new))
+
+    for kind, found in differences.items():
+        print(f"{kind}: {len(found)} of {args.blocks} random blocks differ")
+        for block, old, new in found[:args.examples]:
+            print(f"  {block!r}\n    {args.reference}: {old!r}\n    now: {new!r}")
+
+    templates = [("{})", "{})", "Answer: {})"), ("{}.", "{}.", "Answer: {}."),
+                 ("Q{}.", "{}.", "Answer: {}"), ("Question {}:", "inline", "Answer: {})")]
+    for template in templates:
+        old_questions = reference.extract_questions_from_text(_template_text(template, 100))
+        new_questions = question_service.extract_questions_from_text(_template_text(template, 100))
+        changed = [(old, new) for old, new in zip(old_questions, new_questions) if old != new]
+        print(f"{' / '.join(template):36} {len(changed)} of {len(new_questions)} questions differ")
+        for old, new in changed[:args.examples]:
+            print(f"    {args.reference}: {old['question']!r}\n    now: {new['question']!r}")
+
+    if differences["options"] or differences["answer"]:
+        print("FAIL: options or answers differ from the reference")
+        return 1
+    return 0
+
+
+def _synthetic_questions(count, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    for _ in range(count):
+        stem = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 18)))
+        yield {
+            "question": f"Which of the following {stem}?",
+            "options": [" ".join(rng.choice(vocabulary) for _ in range(2)) for _ in range(4)],
+            "correctAnswer": "",
+            "type": "multiple-choice",
+        }
+
+
+def question_bank(args):
+    """Time search and duplicate lookups on a bank of args.size questions"""
+    from services.question_bank import add_questions_to_bank, find_near_duplicates, search_questions
+
+    with _scratch_db():
+        started = time.perf_counter()
+        batch = []
+        for question in _synthetic_questions(args.size):
+            batch.append(question)
+            if len(batch) == 1000:
+                add_questions_to_bank(batch, exam_title="bench")
+                batch = []
+        if batch:
+            add_questions_to_bank(batch, exam_title="bench")
+        print(f"Indexed {args.size} questions in {time.perf_counter() - started:.1f}s")
+
+        probes = list(_synthetic_questions(args.queries, seed=7))  # same seed: exact duplicates
+        rng = random.Random(1)
+        search_ms = []
+        for probe in probes:
+            words = probe["question"].split()[3:]
+            query = " ".join(rng.sample(words, 2))
+            started = time.perf_counter()
+            search_questions(query)
+            search_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        matches = find_near_duplicates(probes)
+        dedupe_ms = (time.perf_counter() - started) * 1000
+
+    found = sum(1 for match in matches if match)
+    print(f"search: p50 {_percentile(search_ms, 50):.2f}ms, p95 {_percentile(search_ms, 95):.2f}ms")
+    print(f"duplicate check: {len(probes)} questions in {dedupe_ms:.1f}ms "
+          f"({dedupe_ms / len(probes):.2f}ms each), {found} flagged")
+    return 0
+
+
+def profiles(args):
+    """Compare the extraction profiles on the same PDFs"""
+    import io
+    import logging
+    from services.pdf_utils import EXTRACTION_PROFILES, extract_tables_from_pdf
+    from services.question_service import extract_questions_from_pdf
+
+    logging.getLogger('services.question_service').setLevel(logging.WARNING)
+    documents = []
+    for path in args.pdf:
+        with open(path, 'rb') as f:
+            documents.append(f.read())
+
+    rows = []
+    for name in EXTRACTION_PROFILES:
+        question_ms, table_ms = [], []
+        questions = tables = 0
+        for _ in range(args.rounds):
+            for pdf_bytes in documents:
+                started = time.perf_counter()
+                questions_found = extract_questions_from_pdf(io.BytesIO(pdf_bytes), name)
+                question_ms.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                tables_found = extract_tables_from_pdf(io.BytesIO(pdf_bytes), name)
+                table_ms.append((time.perf_counter() - started) * 1000)
+                questions += len(questions_found)
+                tables += len(tables_found)
+        rows.append((name, _percentile(question_ms, 50), _percentile(table_ms, 50),
+                     questions // args.rounds, tables // args.rounds))
+
+    print(f"{'profile':<10}{'questions ms':>14}{'tables ms':>11}{'questions':>11}{'tables':>8}")
+    for name, q_ms, t_ms, questions, tables in rows:
+        print(f"{name:<10}{q_ms:>14.1f}{t_ms:>11.1f}{questions:>11}{tables:>8}")
+    return 0
+
+
+def roster(args):
+    """Time the roster table builder against pdfplumber's extract_tables"""
+    import contextlib
+    import io
+    from services.pdf_utils import extract_tables_from_pdf
+    from services.roster_tables import extract_roster_tables
+
+    failed = False
+    print(f"{'pdf':<30}{'builder ms':>12}{'tables ms':>11}{'rows':>7}  same rows")
+    for path in args.pdf:
+        with open(path, 'rb') as f:
+            pdf_bytes = f.read()
+        builder_ms, table_ms = [], []
+        for _ in range(args.rounds):
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                built = extract_roster_tables(io.BytesIO(pdf_bytes), args.profile)
+                builder_ms.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                tables = extract_tables_from_pdf(io.BytesIO(pdf_bytes), args.profile)
+                table_ms.append((time.perf_counter() - started) * 1000)
+
+        rows = [row for table in tables for row in table if any(row)]
+        expected = rows[:1] + [row for row in rows[1:] if row != rows[0]]
+        expected = [[cell or '' for cell in row] for row in expected]
+        same = bool(built) and built[0] == expected
+        failed |= bool(expected) and not same
+        print(f"{os.path.basename(path):<30}{_percentile(builder_ms, 50):>12.1f}{_percentile(table_ms, 50):>11.1f}"
+              f"{len(built[0]) if built else 0:>7}  {'yes' if same else 'no' if expected else '-'}")
+    return 1 if failed else 0
+
+
+def roster_validation(args):
+    """Time validate_roster on args.size rows against args.size saved students"""
+    from sqlalchemy import event
+    from models import db
+    from services.roster_validation import parse_roster, validate_roster, save_roster
+
+    def students(start, count):
+        return [{"rollNumber": f"R{i:07d}", "name": f"Student {i}", "email": f"s{i}@example.edu",
+                 "department": "CS", "year": "SE"} for i in range(start, start + count)]
+
+    with _scratch_db():
+        save_roster(parse_roster(students(0, args.size)))
+
+        # Half the rows are already saved, and every 100th repeats its neighbour
+        records = students(args.size // 2, args.size)
+        for i in range(100, len(records), 100):
+            records[i] = dict(records[i - 1])
+
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.append(1))
+        started = time.perf_counter()
+        conflicts = validate_roster(parse_roster(records))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+    reasons = {}
+    for conflict in conflicts:
+        reasons[conflict["reason"]] = reasons.get(conflict["reason"], 0) + 1
+    print(f"validated {args.size} rows in {elapsed_ms:.0f}ms with {len(queries)} queries: {reasons}")
+    return 0
+
+
+def roster_lookup(args):
+    """Time roster_index lookups on a class of args.size students"""
+    from services.roster_lookup import RosterIndex
+    from services.roster_validation import parse_roster, save_roster
+
+    rng = random.Random(11)
+    syllables = ["ra", "ja", "an", "vi", "sh", "ma", "ri", "ya", "de", "ko", "li", "na", "su", "pa", "te"]
+    names = [" ".join("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).title()
+                      for _ in range(2)) for _ in range(args.size)]
+    with _scratch_db():
+        save_roster(parse_roster({"rollNumber": f"CS{i:05d}", "name": name} for i, name in enumerate(names)))
+        index = RosterIndex()
+        started = time.perf_counter()
+        index.lookup("warm up")
+        print(f"Built index for {args.size} students in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        roll_ms, name_ms, found = [], [], 0
+        for _ in range(args.queries):
+            i = rng.randrange(args.size)
+            spoken_roll = "c s " + " ".join(f"{i:05d}")
+            started = time.perf_counter()
+            index.lookup(f"my roll number is {spoken_roll}")
+            roll_ms.append((time.perf_counter() - started) * 1000)
+
+            misspelt = names[i][:-1] if len(names[i]) > 6 else names[i]
+            started = time.perf_counter()
+            result = index.lookup(f"my name is {misspelt}")
+            name_ms.append((time.perf_counter() - started) * 1000)
+            found += bool(result["match"]) and result["match"]["name"] == names[i]
+
+    print(f"roll number: p50 {_percentile(roll_ms, 50):.2f}ms, p95 {_percentile(roll_ms, 95):.2f}ms")
+    print(f"name: p50 {_percentile(name_ms, 50):.2f}ms, p95 {_percentile(name_ms, 95):.2f}ms, "
+          f"{found} of {args.queries} misspelt names matched")
+    return _roster_lookup_regressions()
+
+
+# Transcript -> (name of the student it must verify or None, lowest confidence)
+# on a class where roll numbers are plain numbers
+_LOOKUP_REGRESSIONS = {
+    "I am here for the exam, Meera Nair": ("Meera Nair", 0.6),
+    "this is Anita speaking to you": ("Anita Rao", 0.6),
+    "I am here for the exam": (None, 0.0),
+    "my roll number is four": ("Vikram Singh", 1.0),
+    "roll number is for, Vikram Singh": ("Vikram Singh", 1.0),
+    "roll number two, Meera Nair": ("Meera Nair", 0.6),
+}
+
+
+def _roster_lookup_regressions():
+    """Homophones of digits ("for", "to") must not verify a student by roll number"""
+    from services.roster_lookup import RosterIndex
+    from services.roster_validation import parse_roster, save_roster
+
+    names = ["Anita Rao", "Rahul Verma", "Meera Nair", "Vikram Singh"]
+    failures = 0
+    with _scratch_db():
+        save_roster(parse_roster({"rollNumber": str(i), "name": name} for i, name in enumerate(names, 1)))
+        index = RosterIndex()
+        for transcript, (expected, min_confidence) in _LOOKUP_REGRESSIONS.items():
+            result = index.lookup(transcript)
+            name = result["match"]["name"] if result["match"] else None
+            if name != expected or result["confidence"] < min_confidence:
+                failures += 1
+                print(f"FAIL: {transcript!r} verified {name} ({result['matchedBy']}, "
+                      f"confidence {result['confidence']}), expected {expected}")
+    print(f"{len(_LOOKUP_REGRESSIONS) - failures} of {len(_LOOKUP_REGRESSIONS)} transcript regressions pass")
+    return 1 if failures else 0
+
+
+def responses(args):
+    """Time JSON encoding and compression of a roster and an exam payload"""
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from services.responses import FastJSONProvider, ENCODINGS, compress, orjson
+
+    students = [{"rollNumber": f"CS{i:05d}", "name": f"Student Name {i}", "email": f"s{i}@example.edu",
+                 "department": "Computer Engineering", "year": "SE", "class": "SE-A", "division": "A"}
+                for i in range(args.size)]
+    code = "\n".join(f"    for (int i = 0; i < n; i++) {{ sum += values[i] * {i}; }}" for i in range(12))
+    questions = [{"id": i, "text": f"Question {i}: what does this print?\n\n{code}",
+                  "options": [f"{i}", f"{i + 1}", "Compilation error", "Undefined behaviour"]}
+                 for i in range(200)]
+
+    app = Flask(__name__)
+    providers = [("stdlib", DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(("orjson", FastJSONProvider(app)))
+    else:
+        print("orjson is not installed; the fast provider falls back to the stdlib encoder")
+    for label, payload in (("roster", {"students": students}), ("exam", {"questions": questions})):
+        for name, provider in providers:
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                body = provider.dumps(payload, separators=(",", ":")).encode()
+            elapsed_ms = (time.perf_counter() - started) * 1000 / args.rounds
+            print(f"{label}: {name} encode {elapsed_ms:.1f}ms, {len(body)} bytes")
+        for encoding in ENCODINGS:
+            started = time.perf_counter()
+            size = len(compress(body, encoding))
+            print(f"{label}: {encoding} {size} bytes ({size / len(body):.0%}) "
+                  f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return 0
+
+
+def _synthetic_question_pdf(pages, questions_per_page=8, seed=5):
+    """A PDF of numbered multiple-choice questions in Helvetica, one content stream per page"""
+    rng = random.Random(seed)
+    words = ["cell", "energy", "protein", "membrane", "enzyme", "nucleus", "function", "process", "organism"]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    number = 0
+    for _ in range(pages):
+        lines = []
+        for _ in range(questions_per_page):
+            number += 1
+            lines.append(f"{number}. Which " + " ".join(rng.choice(words) for _ in range(10)) + "?")
+            lines.extend(f"{letter}) " + " ".join(rng.choice(words) for _ in range(3)) for letter in "abcd")
+        ops = "".join(f"BT /F1 10 Tf 50 {780 - 14 * row} Td ({line}) Tj ET\n" for row, line in enumerate(lines))
+        stream = ops.encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for index, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (index, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def page_memory(args):
+    """Peak traced memory of text extraction at a tenth of args.pages and at args.pages pages"""
+    import io
+    import tracemalloc
+    from services.pdf_utils import extract_text_from_pdf
+
+    # Untraced warm-up, so module imports and font loading are not counted
+    extract_text_from_pdf(io.BytesIO(_synthetic_question_pdf(1)))
+    peaks = {}
+    for pages in (max(1, args.pages // 10), args.pages):
+        pdf = io.BytesIO(_synthetic_question_pdf(pages))
+        tracemalloc.start()
+        started = time.perf_counter()
+        text = extract_text_from_pdf(pdf)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks[pages] = peak
+        print(f"{pages} pages: peak {peak / 1024 / 1024:.1f}MB ({peak / pages / 1024:.0f}KB per page), "
+              f"{len(text)} characters in {elapsed:.1f}s")
+
+    (small, small_peak), (large, large_peak) = peaks.items()
+    growth_kb = (large_peak - small_peak) / max(1, large - small) / 1024
+    print(f"peak grows {growth_kb:.0f}KB per additional page (budget {args.budget_kb:.0f}KB)")
+    if growth_kb > args.budget_kb:
+        print("FAIL: peak memory grows with the page count")
+        return 1
+    return 0
+
+
+def _template_text(template, count, seed=3):
+    """Question text in one of a few teacher formats"""
+    rng = random.Random(seed)
+    words = ["which", "value", "function", "returns", "loop", "array", "pointer", "class", "method", "variable"]
+    number, option, answer = template
+    blocks = []
+    for i in range(1, count + 1):
+        stem = " ".join(rng.choice(words) for _ in range(9))
+        options = [" ".join(rng.choice(words) for _ in range(2)) for _ in range(4)]
+        letter = rng.choice("ABCD")
+        lines = [number.format(i) + f" What {stem}?"]
+        if option == "inline":
+            lines.append(" ".join(f"{l}) {text}" for l, text in zip("ABCD", options)))
+        else:
+            lines.extend(option.format(l) + f" {text}" for l, text in zip("ABCD", options))
+        lines.append(answer.format(letter))
+        blocks.append("\n".join(lines))
+    return "\n".join(blocks)
+
+
+def parse_plans(args):
+    """Time extract_questions_from_text on fresh templates and on remembered ones"""
+    import logging
+    from services import question_service
+    from services.parse_plans import ParsePlanCache, PARAGRAPHS
+
+    logging.disable(logging.CRITICAL)
+    templates = [("{})", "{})", "Answer: {})"), ("{}.", "{}.", "Answer: {}."),
+                 ("Q{}.", "{}.", "Answer: {}"), ("Question {}:", "inline", "Answer: {})")]
+    failed = False
+    for template in templates:
+        text = _template_text(template, args.questions)
+        fingerprint, _ = question_service.format_fingerprint(question_service.clean_pdf_text(text))
+        question_service.parse_plans = cache = ParsePlanCache()
+        cascade = question_service.extract_questions_from_text(text)
+        learnt = cache.get(fingerprint)
+
+        timings = {}
+        for label in ("cascade", "planned"):
+            elapsed = []
+            for _ in range(args.rounds):
+                if label == "cascade":
+                    cache.forget(fingerprint)
+                elif learnt is not None:
+                    cache.remember(fingerprint, learnt)
+                started = time.perf_counter()
+                question_service.extract_questions_from_text(text)
+                elapsed.append((time.perf_counter() - started) * 1000)
+            timings[label] = min(elapsed)
+
+        # Whatever plan is remembered, the questions must be the cascade's
+        wrong = []
+        for plan in [*range(len(question_service._QUESTION_PATTERNS)), PARAGRAPHS]:
+            cache.remember(fingerprint, plan)
+            if question_service.extract_questions_from_text(text) != cascade:
+                wrong.append(plan)
+        failed |= bool(wrong)
+        print(f"{' / '.join(template):36} {len(cascade):4} questions, plan {learnt}: "
+              f"cascade {timings['cascade']:.1f}ms, planned {timings['planned']:.1f}ms, "
+              f"different questions with plans: {wrong or 'none'}")
+    return 1 if failed else 0
+
+
+def _synthetic_paragraphs(count, seed):
+    """Labelled (text, is question) paragraphs: question stems and plain prose about the same topics"""
+    rng = random.Random(seed)
+    topics = ["the stack", "a pointer", "the compiler", "photosynthesis", "the array", "an interface",
+              "the mitochondria", "the loop", "recursion", "the database index", "a linked list"]
+    verbs = ["stores", "describes", "returns", "uses", "changes", "holds", "allocates", "controls"]
+    openers = ["What", "Which of the following", "How", "Why", "When", "Which statement"]
+    for _ in range(count):
+        topic, other, verb = rng.choice(topics), rng.choice(topics), rng.choice(verbs)
+        if rng.random() < 0.5:
+            yield f"{rng.choice(openers)} {verb} {topic} when it is used with {other}?", 1
+        else:
+            yield (f"In this chapter {topic} {verb} {other}, and the examples below show it "
+                   f"in more detail for the exercises."), 0
+
+
+def question_scorer(args):
+    """Time batch paragraph scoring against the regex rules"""
+    from services.question_scorer import train_question_scorer
+    from services.question_service import is_question_text
+
+    train_texts, train_labels = zip(*_synthetic_paragraphs(args.paragraphs, seed=1))
+    scorer = train_question_scorer(list(train_texts), list(train_labels))
+    texts, labels = zip(*_synthetic_paragraphs(args.paragraphs, seed=2))
+    texts = list(texts)
+
+    started = time.perf_counter()
+    ruled = [is_question_text(text) for text in texts]
+    rules_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    scored = scorer.probabilities(texts) >= 0.5
+    scorer_ms = (time.perf_counter() - started) * 1000
+
+    def agreement(predicted):
+        return sum(int(p) == label for p, label in zip(predicted, labels)) / len(labels)
+
+    print(f"{len(texts)} paragraphs: rules {rules_ms:.0f}ms (agree {agreement(ruled):.1%}), "
+          f"batch scorer {scorer_ms:.0f}ms (agree {agreement(scored):.1%})")
+    return 0
+
+
+def export_memory(args):
+    """Peak traced memory of streaming a small and a large exam's results"""
+    import tracemalloc
+    from models import db, Exam, Question, Student, StudentAnswer
+    from services.results_export import csv_chunks, xlsx_chunks
+
+    rng = random.Random(11)
+    with _scratch_db():
+        db.session.execute(Student.__table__.insert(), [
+            {"roll_number": f"R{i:07d}", "name": f"Student {i}", "email": f"s{i}@example.edu"}
+            for i in range(args.students)
+        ])
+        student_ids = [student_id for (student_id,) in db.session.query(Student.id)]
+        cohorts = {}
+        for students in (max(1, args.students // 10), args.students):
+            exam = Exam(title=f"{students} students")
+            db.session.add(exam)
+            db.session.flush()
+            questions = [Question(exam_id=exam.id, question_text=question["question"],
+                                  options=question["options"], correct_answer=question["correctAnswer"])
+                         for question in _synthetic_questions(20)]
+            db.session.add_all(questions)
+            db.session.flush()
+            db.session.execute(StudentAnswer.__table__.insert(), [
+                {"student_id": student_id, "question_id": question.id,
+                 "answer": rng.choice(question.options)}
+                for student_id in student_ids[:students] for question in questions
+            ])
+            cohorts[students] = exam.id
+        db.session.commit()
+
+        failed = False
+        for name, chunks in (("csv", csv_chunks), ("xlsx", xlsx_chunks)):
+            peaks = {}
+            for students, exam_id in cohorts.items():
+                tracemalloc.start()
+                started = time.perf_counter()
+                size = sum(len(chunk) for chunk in chunks(exam_id))
+                elapsed = time.perf_counter() - started
+                _, peaks[students] = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"{name}, {students} students: {size / 1024 / 1024:.1f}MB in {elapsed:.1f}s, "
+                      f"peak {peaks[students] / 1024 / 1024:.1f}MB")
+            growth_kb = (peaks[args.students] - min(peaks.values())) / 1024
+            print(f"{name}: peak grows {growth_kb:.0f}KB with the cohort (budget {args.budget_kb:.0f}KB)")
+            failed |= growth_kb > args.budget_kb
+    if failed:
+        print("FAIL: export memory grows with the number of answers")
+        return 1
+    return 0
+
+
+def item_stats(args):
+    """Check and time incrementally maintained item statistics against a rebuild"""
+    from models import db, Exam, Question, Student, StudentAnswer
+    from services.item_statistics import exam_statistics, rebuild_item_statistics, record_answer
+
+    rng = random.Random(17)
+    with _scratch_db():
+        exam = Exam(title="Item statistics")
+        db.session.add(exam)
+        db.session.flush()
+        questions = [Question(exam_id=exam.id, question_text=question["question"],
+                              options=question["options"], correct_answer=question["options"][0])
+                     for question in _synthetic_questions(args.questions)]
+        students = [Student(roll_number=f"R{i:07d}", name=f"Student {i}") for i in range(args.students)]
+        db.session.add_all(questions + students)
+        db.session.commit()
+
+        # Stronger students pick the correct option more often
+        ability = {student.id: rng.random() for student in students}
+
+        def answer(student, question):
+            if rng.random() < 0.05:
+                return rng.choice([None, "", "something else"])
+            if rng.random() < ability[student.id]:
+                return question.options[0].upper()
+            return rng.choice(question.options)
+
+        started = time.perf_counter()
+        for student in students:
+            for question in questions:
+                record_answer(student.id, question.id, answer(student, question))
+            db.session.commit()
+        initial_ms = (time.perf_counter() - started) * 1000
+        writes = args.students * args.questions
+
+        started = time.perf_counter()
+        for _ in range(args.changes):
+            student, question = rng.choice(students), rng.choice(questions)
+            if rng.random() < 0.1:
+                row = StudentAnswer.query.filter_by(student_id=student.id, question_id=question.id).first()
+                if row is not None:
+                    db.session.delete(row)
+            else:
+                record_answer(student.id, question.id, answer(student, question))
+            db.session.commit()
+        change_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        incremental = exam_statistics(exam.id)
+        read_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        answers = rebuild_item_statistics()
+        rebuild_ms = (time.perf_counter() - started) * 1000
+        rebuilt = exam_statistics(exam.id)
+
+    print(f"{writes} answers at {initial_ms / writes:.2f}ms each, {args.changes} changes and deletes "
+          f"at {change_ms / max(1, args.changes):.2f}ms each (commit included)")
+    print(f"statistics of {args.questions} questions read in {read_ms:.1f}ms, "
+          f"rebuilt from {answers} answers in {rebuild_ms:.0f}ms")
+    discriminations = [item["discrimination"] for item in rebuilt["questions"] if item["discrimination"] is not None]
+    if discriminations:
+        print(f"discrimination {min(discriminations):.2f} to {max(discriminations):.2f}, "
+              f"mean score {rebuilt['meanScore']:.2f} of {args.questions}")
+    if incremental != rebuilt:
+        print("FAIL: incrementally maintained statistics differ from a rebuild")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EyeQ backend benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    tp = commands.add_parser('throughput', help="compare serve worker models under load")
+    tp.add_argument('--models', nargs='+', default=['sync', 'threaded', 'gevent'])
+    tp.add_argument('--duration', type=float, default=10)
+    tp.add_argument('--upload-clients', type=int, default=4)
+    tp.add_argument('--health-clients', type=int, default=4)
+    tp.add_argument('--pdf', default=WARMUP_PDF)
+    tp.set_defaults(func=throughput)
+
+    cs = commands.add_parser('cold-start', help="check import + first health check against a budget")
+    cs.add_argument('--app', default='app')
+    cs.add_argument('--budget-ms', type=float, default=COLD_START_BUDGET_MS)
+    cs.add_argument('--runs', type=int, default=3)
+    cs.set_defaults(func=cold_start)
+
+    qp = commands.add_parser('question-parts', help="compare question option/answer/stem parsing with a reference revision")
+    qp.add_argument('--blocks', type=int, default=100000)
+    qp.add_argument('--reference', default=QUESTION_PARTS_REFERENCE)
+    qp.add_argument('--seed', type=int, default=0)
+    qp.add_argument('--examples', type=int, default=3)
+    qp.set_defaults(func=question_parts)
+
+    qb = commands.add_parser('question-bank', help="time question bank search and duplicate checks")
+    qb.add_argument('--size', type=int, default=100000)
+    qb.add_argument('--queries', type=int, default=200)
+    qb.set_defaults(func=question_bank)
+
+    pf = commands.add_parser('profiles', help="compare extraction profiles on the same PDFs")
+    pf.add_argument('--pdf', nargs='+', default=[WARMUP_PDF])
+    pf.add_argument('--rounds', type=int, default=5)
+    pf.set_defaults(func=profiles)
+
+    rt = commands.add_parser('roster', help="compare the roster table builder with pdfplumber tables")
+    rt.add_argument('--pdf', nargs='+', required=True)
+    rt.add_argument('--rounds', type=int, default=3)
+    rt.add_argument('--profile', default='balanced')
+    rt.set_defaults(func=roster)
+
+    rv = commands.add_parser('roster-validation', help="time roster validation against saved students")
+    rv.add_argument('--size', type=int, default=50000)
+    rv.set_defaults(func=roster_validation)
+
+    rl = commands.add_parser('roster-lookup', help="time spoken student lookups against the roster index")
+    rl.add_argument('--size', type=int, default=10000)
+    rl.add_argument('--queries', type=int, default=500)
+    rl.set_defaults(func=roster_lookup)
+
+    rs = commands.add_parser('responses', help="time JSON encoding and response compression")
+    rs.add_argument('--size', type=int, default=5000)
+    rs.add_argument('--rounds', type=int, default=10)
+    rs.set_defaults(func=responses)
+
+    pm = commands.add_parser('page-memory', help="check peak memory of text extraction per page")
+    pm.add_argument('--pages', type=int, default=500)
+    pm.add_argument('--budget-kb', type=float, default=PAGE_MEMORY_BUDGET_KB)
+    pm.set_defaults(func=page_memory)
+
+    pp = commands.add_parser('parse-plans', help="compare question parsing with and without a remembered plan")
+    pp.add_argument('--questions', type=int, default=300)
+    pp.add_argument('--rounds', type=int, default=5)
+    pp.set_defaults(func=parse_plans)
+
+    qs = commands.add_parser('question-scorer', help="time batch paragraph scoring against the regex rules")
+    qs.add_argument('--paragraphs', type=int, default=5000)
+    qs.set_defaults(func=question_scorer)
+
+    em = commands.add_parser('export-memory', help="check that result exports stream in constant memory")
+    em.add_argument('--students', type=int, default=5000)
+    em.add_argument('--budget-kb', type=float, default=EXPORT_MEMORY_BUDGET_KB)
+    em.set_defaults(func=export_memory)
+
+    ist = commands.add_parser('item-stats', help="check incremental item statistics against a rebuild")
+    ist.add_argument('--students', type=int, default=300)
+    ist.add_argument('--questions', type=int, default=20)
+    ist.add_argument('--changes', type=int, default=2000)
+    ist.set_defaults(func=item_stats)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
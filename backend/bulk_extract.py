@@ -0,0 +1,184 @@
+"""
+Offline bulk extraction of archived PDFs
+
+    python -m bulk_extract PATH [PATH ...] --out results.jsonl [--kind questions|students]
+                           [--workers N] [--profile fast] [--report timings.csv] [--manifest FILE]
+
+PATH is a PDF, a directory (searched recursively for *.pdf) or a glob.
+Files are extracted in a process pool without the Flask app, and each one
+becomes a JSONL line {"file", "sha256", "kind", "count", "seconds", and
+"questions" or "students", or "error"}; its timing also goes to a CSV
+report. The content hash of every extracted file is appended to a manifest
+(results file + ".manifest" by default) with the kind and profile it was
+extracted as, right after its result is written, so rerunning the same
+command resumes a partial run and skips files, even renamed ones, that were
+already done. The extractors log errors instead of raising them; a file
+whose extraction logged one counts as failed. Failed files stay out of the
+manifest and are retried; the exit status is 1 if any file failed.
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import QUESTION_EXTRACTION_PROFILE, ROSTER_EXTRACTION_PROFILE
+
+# Default extraction profile of each kind, as for the matching upload endpoint
+KINDS = {'questions': QUESTION_EXTRACTION_PROFILE, 'students': ROSTER_EXTRACTION_PROFILE}
+REPORT_FIELDS = ['file', 'sha256', 'kind', 'status', 'count', 'seconds']
+
+
+def find_pdfs(paths):
+    """PDF files named by paths, directories and globs, each once, in a stable order"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(glob.glob(os.path.join(path, '**', '*.pdf'), recursive=True))
+            found.extend(glob.glob(os.path.join(path, '**', '*.PDF'), recursive=True))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            found.extend(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+    return sorted({os.path.abspath(path) for path in found})
+
+
+def load_manifest(path):
+    """(sha256, kind, profile) of the files a previous run finished"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {tuple(line.split()) for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def file_hash(path):
+    from services.pdf_utils import file_content_hash
+
+    with open(path, 'rb') as f:
+        return file_content_hash(f)
+
+
+class _ErrorRecorder(logging.Handler):
+    """Keeps the messages of the ERROR records the extractors log instead of raising"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def extract_file(path, sha256, kind, profile):
+    """Worker: extract one PDF; returns its JSONL record"""
+    from services.logging_setup import PACKAGE_LOGGER
+    from services.question_service import extract_questions_from_pdf
+    from services.student_service import extract_students_from_pdf
+
+    record = {"file": path, "sha256": sha256, "kind": kind}
+    errors = _ErrorRecorder()
+    services_logger = logging.getLogger(PACKAGE_LOGGER)
+    services_logger.addHandler(errors)
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            if kind == 'questions':
+                record["questions"] = extract_questions_from_pdf(f, profile)
+            else:
+                record["students"] = list(extract_students_from_pdf(f, profile))
+        if errors.messages:
+            raise RuntimeError("; ".join(errors.messages))
+        record["count"] = len(record[kind])
+    except Exception as e:
+        record.pop(kind, None)
+        record["error"] = f"{type(e).__name__}: {e}"
+        record["count"] = 0
+    finally:
+        services_logger.removeHandler(errors)
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract questions or students from archived PDFs")
+    parser.add_argument('paths', nargs='+', help="PDF files, directories or globs")
+    parser.add_argument('--out', required=True, help="JSONL file results are appended to")
+    parser.add_argument('--kind', choices=KINDS, default='questions')
+    parser.add_argument('--profile', help="extraction profile (see EXTRACTION_PROFILES in services/pdf_utils.py)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--report', help="per-file timing CSV (default: results file + '.timings.csv')")
+    parser.add_argument('--manifest', help="hashes of finished files (default: results file + '.manifest')")
+    parser.add_argument('--max-tasks-per-child', type=int, default=50,
+                        help="restart a worker after this many files to bound its memory")
+    args = parser.parse_args(argv)
+
+    from services.pdf_utils import resolve_extraction_profile
+    profile, error_message = resolve_extraction_profile(args.profile, KINDS[args.kind])
+    if error_message:
+        parser.error(error_message)
+    report_path = args.report or args.out + '.timings.csv'
+    manifest_path = args.manifest or args.out + '.manifest'
+
+    files = find_pdfs(args.paths)
+    done = load_manifest(manifest_path)
+    pending = {}
+    for path in files:
+        sha256 = file_hash(path)
+        if (sha256, args.kind, profile) not in done and sha256 not in pending.values():
+            pending[path] = sha256
+    print(f"{len(files)} PDFs found, {len(files) - len(pending)} already done or duplicates, "
+          f"{len(pending)} to extract with {args.workers} workers")
+    if not pending:
+        return 0
+
+    new_report = not os.path.exists(report_path)
+    seconds, failed = [], 0
+    started = time.perf_counter()
+    with open(args.out, 'a', encoding='utf-8') as out, \
+            open(report_path, 'a', newline='', encoding='utf-8') as report_file, \
+            open(manifest_path, 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=args.workers, max_tasks_per_child=args.max_tasks_per_child) as pool:
+        report = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+        if new_report:
+            report.writeheader()
+        futures = [pool.submit(extract_file, path, sha256, args.kind, profile) for path, sha256 in pending.items()]
+        for finished, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            report.writerow({
+                "file": record["file"], "sha256": record["sha256"], "kind": record["kind"],
+                "status": "error" if "error" in record else "ok",
+                "count": record["count"], "seconds": record["seconds"],
+            })
+            report_file.flush()
+            # Only failed files are retried by a rerun
+            if "error" not in record:
+                manifest.write(f"{record['sha256']} {record['kind']} {profile}\n")
+                manifest.flush()
+            else:
+                failed += 1
+                print(f"FAILED {record['file']}: {record['error']}")
+            seconds.append(record["seconds"])
+            if finished % 100 == 0:
+                print(f"{finished}/{len(futures)} files done")
+
+    elapsed = time.perf_counter() - started
+    print(f"extracted {len(seconds) - failed} files ({failed} failed) in {elapsed:.1f}s, "
+          f"{len(seconds) / elapsed:.1f} files/s; per file p50 {_percentile(seconds, 50):.2f}s, "
+          f"p95 {_percentile(seconds, 95):.2f}s, max {max(seconds):.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
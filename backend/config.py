@@ -1,4 +1,5 @@
 # Configuration settings for the Flask application
+import os
 
 # CORS settings
 CORS_ORIGINS = [
@@ -13,7 +14,131 @@ CORS_ORIGINS = [
 MAX_FILE_SIZE_MB = 10
 ALLOWED_EXTENSIONS = ['.pdf']
 
+# Database settings
+DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///eyeq.db')
+
+# Question bank near-duplicate detection (MinHash LSH over word shingles)
+MINHASH_BANDS = 16
+MINHASH_ROWS_PER_BAND = 4
+DUPLICATE_SIMILARITY_THRESHOLD = 0.8
+# (band, bucket) pairs per lookup query: two bound parameters each, under
+# SQLite's limit of 32766
+DUPLICATE_LOOKUP_CHUNK_SIZE = 10000
+
+# Previous extractions kept for incremental re-uploads
+EXTRACTION_CACHE_DIR = os.environ.get(
+    'EYEQ_EXTRACTION_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'extractions')
+)
+EXTRACTION_CACHE_MAX_ENTRIES = 500
+
+# Resumable chunked uploads (services/chunked_uploads.py) are assembled here
+# and removed once extracted, or after UPLOAD_EXPIRY_HOURS without a chunk
+UPLOAD_DIR = os.environ.get(
+    'EYEQ_UPLOAD_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'uploads')
+)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # suggested to clients when an upload is created
+UPLOAD_MAX_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_EXPIRY_HOURS = 24
+# Uploads created but not yet extracted or expired; more are refused with 429
+UPLOAD_MAX_OPEN = 100
+
+# Extraction profile per endpoint (see EXTRACTION_PROFILES in services/pdf_utils.py);
+# a request can pick another one with a "profile" form field or query parameter
+QUESTION_EXTRACTION_PROFILE = 'fast'
+ROSTER_EXTRACTION_PROFILE = 'fast'
+
+# Question format detection: the segmentation pattern that parsed a question
+# template is remembered for up to PARSE_PLAN_CACHE_MAX_ENTRIES templates
+PARSE_PLAN_CACHE_MAX_ENTRIES = 256
+
+# Paragraph fallback of question extraction: with trained weights installed
+# here (python -m train_question_scorer), paragraphs are scored as a batch;
+# scores within QUESTION_SCORE_MARGIN of 0.5 are settled by the regex rules
+QUESTION_SCORER_WEIGHTS = os.environ.get(
+    'EYEQ_QUESTION_SCORER',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'question_scorer.npz')
+)
+QUESTION_SCORE_MARGIN = 0.15
+
+# Result exports (services/results_export.py) and item statistics rebuilds
+# (services/item_statistics.py) fetch this many answer rows at a time from a
+# server-side cursor
+EXPORT_BATCH_ROWS = 1000
+
+# Roster imports check roll numbers and emails against existing students in
+# IN queries of this many values (SQLite allows 32766 bound parameters)
+ROSTER_VALIDATION_CHUNK_SIZE = 10000
+
+# Spoken student verification: a name match needs this trigram similarity
+# (0-1); up to VERIFICATION_CANDIDATES closest students are returned
+VERIFICATION_NAME_MIN_SCORE = 0.6
+VERIFICATION_CANDIDATES = 3
+
+# Spoken answers: lowest confidence (0-1) at which a transcript selects an option
+ANSWER_MATCH_MIN_CONFIDENCE = 0.5
+
+# Decoding maps for "(cid:N)" glyphs, kept per (file hash, font name)
+CID_MAP_CACHE_MAX_FONTS = 256
+
+# Response compression (services/responses.py): JSON and text bodies of at
+# least COMPRESSION_MIN_BYTES are gzip-encoded, or brotli-encoded when the
+# optional 'brotli' package is installed; the optional 'orjson' package
+# speeds up JSON encoding. Precompressed payloads (the exam) are encoded
+# once at the higher levels
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+PRECOMPRESSED_GZIP_LEVEL = 9
+PRECOMPRESSED_BROTLI_QUALITY = 11
+PRECOMPRESSED_CACHE_MAX_ENTRIES = 64
+
+# Service logging (services/logging_setup.py): records go to a background
+# thread through a queue. EYEQ_LOG_LEVELS overrides single stages, e.g.
+# "question_service=DEBUG,pdf_utils=WARNING"
+LOG_LEVEL = os.environ.get('EYEQ_LOG_LEVEL', 'INFO')
+LOG_STAGE_LEVELS = os.environ.get('EYEQ_LOG_LEVELS', '')
+# Log lines marked logging_setup.SAMPLED (written per question, option set or
+# student) keep 1 in N per call site
+LOG_DEBUG_SAMPLE_EVERY = int(os.environ.get('EYEQ_LOG_DEBUG_SAMPLE_EVERY', '100'))
+
 # Server settings
-DEBUG = True
+DEBUG = os.environ.get('EYEQ_DEBUG', 'true').lower() in ('1', 'true', 'yes')
 HOST = '0.0.0.0'
-PORT = 5000
\ No newline at end of file
+PORT = 5000
+
+# Admission control for PDF extraction endpoints
+# Extraction requests (running or queued) may never hold more than
+# WORKER_THREADS - RESERVED_LIGHT_WORKERS threads, so health checks and
+# exam routes always have workers left to run on. python -m serve sizes the
+# gate from its --threads instead (WORKER_THREADS is its default).
+WORKER_THREADS = 8
+RESERVED_LIGHT_WORKERS = 2
+MAX_CONCURRENT_EXTRACTIONS = 2
+MAX_EXTRACTION_QUEUE = 4
+EXTRACTION_QUEUE_TIMEOUT_S = 20
+MAX_EXTRACTIONS_PER_CLIENT = 2
+# Reverse proxies in front of the app whose X-Forwarded-For entries are
+# trusted for the per-client limit; 0 = use the socket address
+TRUSTED_PROXY_HOPS = int(os.environ.get('EYEQ_TRUSTED_PROXY_HOPS', '0'))
+
+
+# Production serving (python -m serve)
+SERVE_WORKER_MODEL = os.environ.get('EYEQ_WORKER_MODEL', 'threaded')  # sync, threaded or gevent
+WARMUP_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'quiz1.pdf')
+# Roster PDF the roster extractor is warmed with; not warmed when unset
+WARMUP_ROSTER_PDF = os.environ.get('EYEQ_WARMUP_ROSTER_PDF')
+WARMUP_ROUNDS = 2
+
+# Cold-start budget for importing the app and answering /api/health
+# (checked by python -m bench cold-start)
+COLD_START_BUDGET_MS = 1000
+
+# Growth of peak memory per additional page when extracting text
+# (checked by python -m bench page-memory)
+PAGE_MEMORY_BUDGET_KB = 64
+
+# Growth of peak memory allowed between exporting the results of a tenth of a
+# cohort and of all of it (checked by python -m bench export-memory)
+EXPORT_MEMORY_BUDGET_KB = 1024
@@ -28,11 +28,54 @@ class Question(db.Model):
     options = db.Column(db.JSON, nullable=False)  # List of options
     correct_answer = db.Column(db.String(500))  # Correct answer text
     question_type = db.Column(db.String(50), default='multiple-choice')
+    speech_text = db.Column(db.Text)  # Read-aloud rendering of question_text, set when saved
+    speech_options = db.Column(db.JSON)  # Read-aloud rendering of each option
 
 class StudentAnswer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
-    answer = db.Column(db.String(500))  # Selected answer
+    # active_history: item statistics need the previous values when these change
+    student_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False, index=True), active_history=True
+    )
+    question_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False, index=True), active_history=True
+    )
+    answer = db.column_property(db.Column(db.String(500)), active_history=True)  # Selected answer
     is_flagged = db.Column(db.Boolean, default=False)
     answered_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ItemStatistic(db.Model):
+    """Running answer counts of a question (services/item_statistics.py)"""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    # Sum of the exam scores of the students who answered it correctly
+    correct_score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+
+class OptionStatistic(db.Model):
+    """How many students gave an answer (stripped, lower-cased) to a question"""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    answer = db.Column(db.String(500), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class StudentExamScore(db.Model):
+    """Answers given and answers correct of a student in an exam"""
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    answered = db.Column(db.Integer, nullable=False, default=0)
+    score = db.Column(db.Integer, nullable=False, default=0)
+
+class ExamStatistic(db.Model):
+    """Number of students who answered an exam and the sums of their scores"""
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    students = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    score_square_sum = db.Column(db.BigInteger, nullable=False, default=0)
+
+class QuestionBandHash(db.Model):
+    """MinHash LSH band buckets of a question, for near-duplicate lookup"""
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False, index=True)
+    band = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    __table_args__ = (db.Index('ix_question_band_bucket', 'band', 'bucket'),)
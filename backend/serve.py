@@ -0,0 +1,134 @@
+"""
+Production server entry point
+
+    python -m serve [--workers sync|threaded|gevent] [--threads N] [--app app]
+
+Builds the Flask app once, preloads the PDF stack and runs warm-up
+extractions before accepting traffic, so the first real upload does not
+pay the cold-start cost. Warm-up calls the extractors directly, so nothing
+is written to the extraction cache; the roster extractor is only warmed
+with a roster PDF (EYEQ_WARMUP_ROSTER_PDF). Debug mode is always off here.
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+from config import (
+    HOST, PORT, WORKER_THREADS, SERVE_WORKER_MODEL, WARMUP_PDF, WARMUP_ROSTER_PDF, WARMUP_ROUNDS,
+    QUESTION_EXTRACTION_PROFILE, ROSTER_EXTRACTION_PROFILE,
+)
+
+WORKER_MODELS = ('sync', 'threaded', 'gevent')
+
+
+def preload_modules():
+    """Import the heavy PDF dependencies up front"""
+    started = time.perf_counter()
+    import pdfplumber  # noqa: F401
+    import pdfminer.layout  # noqa: F401
+    import pdfminer.converter  # noqa: F401
+    import PIL.Image  # noqa: F401
+    print(f"Preloaded PDF modules in {time.perf_counter() - started:.2f}s")
+
+
+def warm_up(app, pdf_path=WARMUP_PDF, roster_path=WARMUP_ROSTER_PDF, rounds=WARMUP_ROUNDS):
+    """Run the extractors on sample PDFs so their code paths are hot; nothing is stored"""
+    from services.question_service import extract_questions_from_pdf
+    from services.student_service import extract_students_from_pdf
+
+    started = time.perf_counter()
+    for path, extract, profile in ((pdf_path, extract_questions_from_pdf, QUESTION_EXTRACTION_PROFILE),
+                                   (roster_path, extract_students_from_pdf, ROSTER_EXTRACTION_PROFILE)):
+        if not path:
+            continue
+        if not os.path.exists(path):
+            print(f"Warm-up skipped: {path} not found")
+            continue
+        for _ in range(rounds):
+            with open(path, 'rb') as f:
+                if not extract(f, profile):
+                    print(f"Warm-up extraction found nothing in {path}")
+    app.test_client().get("/api/health")
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+def make_server(app, worker_model, host, port, threads):
+    """Create a server for the chosen worker model; returns an object with serve_forever()"""
+    if worker_model == 'gevent':
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        return WSGIServer((host, port), app, spawn=Pool(threads), log=None)
+
+    from werkzeug.serving import BaseWSGIServer
+
+    if worker_model == 'sync':
+        return BaseWSGIServer(host, port, app)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    class PooledWSGIServer(BaseWSGIServer):
+        """Werkzeug server that hands each connection to a fixed-size thread pool"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='eyeq-worker')
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self._process_request_thread, request, client_address)
+
+        def _process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    return PooledWSGIServer(host, port, app)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the EyeQ backend in production mode")
+    parser.add_argument('--workers', choices=WORKER_MODELS, default=SERVE_WORKER_MODEL,
+                        help="worker model (default: %(default)s)")
+    parser.add_argument('--threads', type=int, default=WORKER_THREADS,
+                        help="worker threads/greenlets for threaded and gevent models")
+    parser.add_argument('--app', default='app', help="module holding the Flask app")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--no-warmup', action='store_true', help="skip warm-up extractions")
+    args = parser.parse_args(argv)
+
+    if args.workers == 'gevent':
+        try:
+            from gevent import monkey
+        except ImportError:
+            parser.error("the gevent worker model needs the 'gevent' package installed")
+        # Must run before the app and its dependencies are imported
+        monkey.patch_all()
+
+    preload_modules()
+    module = importlib.import_module(args.app)
+    if hasattr(module, 'init_db'):
+        module.init_db()
+    app = module.app
+    app.debug = False
+    # Size the extraction gate from the workers this server really runs
+    from services.admission import extraction_gate
+    extraction_gate.resize(1 if args.workers == 'sync' else args.threads)
+    if not args.no_warmup:
+        warm_up(app)
+
+    server = make_server(app, args.workers, args.host, args.port, args.threads)
+    print(f"Serving {args.app}:app on {args.host}:{args.port} with {args.workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Admission control for the expensive PDF extraction endpoints
+"""
+import math
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from flask import request, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from config import (
+    WORKER_THREADS, RESERVED_LIGHT_WORKERS, MAX_CONCURRENT_EXTRACTIONS,
+    MAX_EXTRACTION_QUEUE, EXTRACTION_QUEUE_TIMEOUT_S, MAX_EXTRACTIONS_PER_CLIENT, TRUSTED_PROXY_HOPS
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Caps concurrent extractions with a bounded FIFO wait queue.
+
+    Every admitted or queued request is also counted against its client,
+    so a single caller cannot fill the queue on its own.
+    """
+
+    def __init__(self, max_active, max_queue, queue_timeout, per_client_limit, worker_threads=WORKER_THREADS):
+        self.queue_timeout = queue_timeout
+        self.per_client_limit = per_client_limit
+        self._max_active = max_active
+        self._max_queue = max_queue
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiters = deque()
+        self._per_client = {}
+        self._avg_duration = 5.0  # seconds, refined from observed extractions
+        self.resize(worker_threads)
+
+    def resize(self, worker_threads):
+        """Fit the caps to the number of worker threads the server really runs"""
+        with self._cond:
+            # Never let extraction work take the threads reserved for light routes
+            budget = max(1, worker_threads - RESERVED_LIGHT_WORKERS)
+            self.max_active = max(1, min(self._max_active, budget))
+            self.max_queue = max(0, min(self._max_queue, budget - self.max_active))
+            self._cond.notify_all()
+
+    def acquire(self, client):
+        """Wait for an extraction slot or raise AdmissionRejected"""
+        with self._cond:
+            if self._per_client.get(client, 0) >= self.per_client_limit:
+                raise AdmissionRejected(
+                    "Too many extraction requests from this client. Please wait for your earlier uploads to finish.",
+                    self._retry_after(),
+                )
+
+            if self._active < self.max_active and not self._waiters:
+                self._admit(client)
+                return
+
+            if len(self._waiters) >= self.max_queue:
+                raise AdmissionRejected(
+                    "The server is busy processing other files. Please try again shortly.",
+                    self._retry_after(),
+                )
+
+            ticket = object()
+            self._waiters.append(ticket)
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._waiters[0] is not ticket or self._active >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected(
+                            "Timed out waiting for a free processing slot. Please try again shortly.",
+                            self._retry_after(),
+                        )
+                    self._cond.wait(remaining)
+            except AdmissionRejected:
+                self._waiters.remove(ticket)
+                self._release_client(client)
+                self._cond.notify_all()
+                raise
+
+            self._waiters.popleft()
+            self._active += 1
+            self._cond.notify_all()
+
+    def release(self, client, duration=None):
+        """Free the slot held by client and wake the next waiter"""
+        with self._cond:
+            self._active -= 1
+            self._release_client(client)
+            if duration is not None:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._cond.notify_all()
+
+    def stats(self):
+        """Current gate occupancy (for health reporting)"""
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "maxActive": self.max_active,
+                "maxQueue": self.max_queue,
+            }
+
+    def _admit(self, client):
+        self._active += 1
+        self._per_client[client] = self._per_client.get(client, 0) + 1
+
+    def _release_client(self, client):
+        count = self._per_client.get(client, 0) - 1
+        if count > 0:
+            self._per_client[client] = count
+        else:
+            self._per_client.pop(client, None)
+
+    def _retry_after(self):
+        # Rough estimate of how long the current backlog takes to drain
+        backlog = self._active + len(self._waiters)
+        return max(1, math.ceil(self._avg_duration * backlog / self.max_active))
+
+
+extraction_gate = AdmissionGate(
+    MAX_CONCURRENT_EXTRACTIONS,
+    MAX_EXTRACTION_QUEUE,
+    EXTRACTION_QUEUE_TIMEOUT_S,
+    MAX_EXTRACTIONS_PER_CLIENT,
+)
+
+
+def init_client_identity(app, trusted_proxy_hops=TRUSTED_PROXY_HOPS):
+    """
+    Behind trusted_proxy_hops reverse proxies, take the client address from
+    the X-Forwarded-For entry the outermost of them added; with none the
+    header is ignored, since any caller can set it
+    """
+    if trusted_proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxy_hops)
+
+
+def client_identity():
+    """Identify the caller by its address (see init_client_identity)"""
+    return request.remote_addr or 'unknown'
+
+
+def admission_controlled(view):
+    """Route decorator that runs the view only once the extraction gate admits it"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Preflight requests are cheap and never queued
+        if request.method == "OPTIONS":
+            return view(*args, **kwargs)
+
+        client = client_identity()
+        try:
+            extraction_gate.acquire(client)
+        except AdmissionRejected as rejected:
+            response = jsonify({"error": rejected.message, "retryAfter": rejected.retry_after})
+            return response, 429, {"Retry-After": str(rejected.retry_after)}
+
+        started = time.monotonic()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            extraction_gate.release(client, time.monotonic() - started)
+    return wrapper
@@ -0,0 +1,198 @@
+"""
+Spoken-answer matching for the voice-only exam flow
+Every option of an exam's questions is indexed once: the letter, number and
+ordinal it can be called by, its normalized words, a phonetic key per word
+and the trigrams of its sound-folded text. A transcript is then scored against a
+question's options without any per-request text processing of the options.
+Indexes are cached per exam and dropped when one of its questions changes
+"""
+import re
+import threading
+
+from config import ANSWER_MATCH_MIN_CONFIDENCE
+from models import Question
+from .session_events import invalidate_after_commit
+from .spoken import words, spelled_tokens
+
+_ORDINALS = ["first", "second", "third", "fourth", "fifth", "sixth"]
+
+# Words that introduce an option by position: "option bee", "answer two"
+_REFERENCE_WORDS = {"option", "letter", "answer", "number", "choice"}
+# Words around a spoken answer that say nothing about which option it is
+_FILLER_WORDS = {
+    "option", "answer", "letter", "number", "choice", "is", "the", "my", "it",
+    "its", "choose", "select", "pick", "go", "with", "think", "say", "please",
+    "um", "uh", "of", "and", "in", "a", "an", "i", "ll", "to", "for", "this", "that",
+}
+
+_SOUNDEX_CODES = {}
+for _letters, _code in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6")):
+    _SOUNDEX_CODES.update(dict.fromkeys(_letters, _code))
+_NOT_LETTER = re.compile(r'[^a-z]')
+
+# Spellings that sound alike, folded before comparing trigrams ("kondria" ~ "chondria")
+_SOUND_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r'ph', 'f'), (r'gh', ''), (r'(?<=[^aeiou])h', ''), (r'ck', 'k'), (r'[cq]', 'k'),
+    (r'z', 's'), (r'x', 'ks'), (r'y', 'i'), (r'(.)\1', r'\1'),
+)]
+
+
+def phonetic_key(word):
+    """Soundex code of a word ('mitochondria' -> 'M325'), '' for words without letters"""
+    word = _NOT_LETTER.sub('', word.lower())
+    if not word:
+        return ''
+    key = word[0].upper()
+    previous = _SOUNDEX_CODES.get(word[0], '')
+    for char in word[1:]:
+        code = _SOUNDEX_CODES.get(char, '')
+        if code and code != previous:
+            key += code
+            if len(key) == 4:
+                break
+        if char not in 'hw':
+            previous = code
+    return key.ljust(4, '0')
+
+
+def _sound_trigrams(text):
+    """Trigrams of a run-together text after folding similar-sounding spellings"""
+    for pattern, replacement in _SOUND_RULES:
+        text = pattern.sub(replacement, text)
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _content_words(text):
+    # Single letters stay: they tell "Vitamin A" from "Vitamin B"
+    return [word for word in words(text) if word not in _FILLER_WORDS or len(word) == 1]
+
+
+def build_option_index(options):
+    """
+    Precomputed features of a question's options
+    Returns: list of {"text", "aliases", "words", "keys", "trigrams"} aligned with options
+    """
+    index = []
+    for position, option in enumerate(options):
+        option_words = set(_content_words(option))
+        aliases = {chr(ord('a') + position), str(position + 1)}
+        if position < len(_ORDINALS):
+            aliases.add(_ORDINALS[position])
+        index.append({
+            "text": option,
+            "aliases": aliases,
+            "words": option_words,
+            "keys": {phonetic_key(word) for word in option_words} - {''},
+            "trigrams": _sound_trigrams(''.join(_content_words(option))),
+        })
+    return index
+
+
+def _content_score(option, spoken_words, spoken_keys, spoken_trigrams):
+    """Share of the option's words heard (exactly or by sound), or trigram similarity of the run-together texts"""
+    best = 0.0
+    if option["words"]:
+        heard = len(option["words"] & spoken_words)
+        sounded = len(option["keys"] & spoken_keys)
+        best = (heard + 0.8 * max(0, sounded - heard)) / len(option["words"])
+    if option["trigrams"] and spoken_trigrams:
+        shared = len(option["trigrams"] & spoken_trigrams)
+        best = max(best, 2 * shared / (len(option["trigrams"]) + len(spoken_trigrams)))
+    return min(best, 1.0)
+
+
+def _position_word(word):
+    """Whether a word can only be naming an option by position ("b", "two", "second")"""
+    return word in _ORDINALS or len(spelled_tokens(word)[0]) == 1
+
+
+def match_answer(option_index, transcript):
+    """
+    Pick the option a transcript refers to
+    "option bee", "b", "two", "second" select by position, unless the
+    transcript also says an option's text, which wins. Only real letters,
+    digits and ordinals are positions: in "the answer to this is ribosome"
+    "to" is a word. Text is scored against the options; confidence is the
+    best score less half the runner-up's, so close calls come back unsure
+    Returns: {"optionIndex", "option", "confidence", "matchedBy"}; optionIndex
+    and option are None when nothing reaches ANSWER_MATCH_MIN_CONFIDENCE
+    """
+    tokens = spelled_tokens(transcript)
+    # The word after "option"/"answer"/..., else a transcript that is nothing but the reference
+    referenced = [following for word, following in zip(tokens, tokens[1:]) if word in _REFERENCE_WORDS]
+    remaining = [token for token in tokens if token not in _FILLER_WORDS or len(token) == 1]
+    if len(remaining) == 1:
+        referenced.append(remaining[0])
+    by_position = None
+    for token in referenced:
+        by_position = next((position for position, option in enumerate(option_index) if token in option["aliases"]), None)
+        if by_position is not None:
+            break
+
+    spoken = _content_words(transcript)
+    position_only = all(_position_word(word) for word in spoken)
+    if by_position is not None and position_only:
+        return {"optionIndex": by_position, "option": option_index[by_position]["text"], "confidence": 1.0,
+                "matchedBy": "position"}
+
+    spoken_words = set(spoken)
+    spoken_keys = {phonetic_key(word) for word in spoken} - {''}
+    spoken_trigrams = _sound_trigrams(''.join(spoken)) if spoken else set()
+    scores = [_content_score(option, spoken_words, spoken_keys, spoken_trigrams) for option in option_index]
+    if not scores:
+        return {"optionIndex": None, "option": None, "confidence": 0.0, "matchedBy": None}
+
+    ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+    runner_up = scores[ranked[1]] if len(ranked) > 1 else 0.0
+    confidence = round(max(0.0, scores[ranked[0]] - runner_up / 2), 3)
+    if confidence >= ANSWER_MATCH_MIN_CONFIDENCE:
+        best = ranked[0]
+        return {"optionIndex": best, "option": option_index[best]["text"], "confidence": confidence, "matchedBy": "content"}
+    # Words that match no option do not overrule a clear reference
+    if by_position is not None:
+        return {"optionIndex": by_position, "option": option_index[by_position]["text"], "confidence": 1.0,
+                "matchedBy": "position"}
+    return {"optionIndex": None, "option": None, "confidence": confidence, "matchedBy": None}
+
+
+class ExamOptionIndexes:
+    """Option indexes of every question of an exam, built on first use and cached"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exams = {}  # exam id -> {question id: option index}
+        self._generation = 0  # bumped by invalidate, so indexes built meanwhile are not stored
+
+    def for_question(self, exam_id, question_id):
+        """Option index of one question of an exam, or None if it is not part of it"""
+        with self._lock:
+            questions = self._exams.get(exam_id)
+            generation = self._generation
+        if questions is None:
+            questions = {
+                question.id: build_option_index(question.options or [])
+                for question in Question.query.filter_by(exam_id=exam_id).all()
+            }
+            with self._lock:
+                if generation == self._generation:
+                    self._exams[exam_id] = questions
+        return questions.get(question_id)
+
+    def invalidate(self, exam_ids):
+        with self._lock:
+            self._generation += 1
+            for exam_id in exam_ids:
+                self._exams.pop(exam_id, None)
+
+
+exam_option_indexes = ExamOptionIndexes()
+
+
+def _changed_exams(session):
+    """Exams whose questions were added, edited or removed; they are indexed again on next use"""
+    return (obj.exam_id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+            if isinstance(obj, Question))
+
+
+invalidate_after_commit('changed_exam_ids', _changed_exams, exam_option_indexes.invalidate)
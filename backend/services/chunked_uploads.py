@@ -0,0 +1,255 @@
+"""
+Resumable chunked uploads of PDFs
+A client creates an upload with the file's name and size, sends the file in
+chunks at the last confirmed offset (each with the SHA-256 of its bytes) and
+finalizes it once complete. Chunks are written straight into the file being
+assembled on local disk, and only verified chunks move the confirmed offset,
+so an interrupted upload resumes where it stopped. The finalized file is
+then opened in place by the extraction endpoints (uploadId instead of file).
+At most UPLOAD_MAX_OPEN uploads are kept until they are extracted or expire
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from werkzeug.datastructures import FileStorage
+
+from config import UPLOAD_DIR, UPLOAD_MAX_CHUNK_SIZE, UPLOAD_EXPIRY_HOURS, UPLOAD_MAX_OPEN, MAX_FILE_SIZE_MB
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+_COPY_BLOCK = 64 * 1024
+
+# Upload id -> lock held while a chunk of it is written or it is finalized
+_upload_locks = {}
+_upload_locks_guard = threading.Lock()
+# Held while open uploads are counted and a new one is added
+_create_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """Raised when an upload step cannot be applied; carries the HTTP status"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+    def to_dict(self):
+        body = {"error": self.message}
+        if self.offset is not None:
+            body["offset"] = self.offset
+        return body
+
+
+def _state_path(upload_id):
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.json")
+
+
+def _data_path(upload_id):
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.pdf")
+
+
+def _save_state(state):
+    # Write then rename so a crash never leaves a half-written state behind
+    tmp_path = _state_path(state["uploadId"]) + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(state["uploadId"]))
+
+
+def _load_state(upload_id):
+    if not upload_id or not _ID_PATTERN.match(upload_id):
+        raise UploadError("Unknown upload", 404)
+    try:
+        with open(_state_path(upload_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise UploadError("Unknown upload", 404) from None
+
+
+def _lock_for(upload_id):
+    """
+    Lock of an upload still receiving chunks; unknown and finalized uploads
+    raise UploadError before any lock is made for them
+    """
+    state = _load_state(upload_id)
+    if state["complete"]:
+        raise UploadError("Upload is already finalized", 409, state["offset"])
+    with _upload_locks_guard:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _drop_lock(upload_id):
+    with _upload_locks_guard:
+        _upload_locks.pop(upload_id, None)
+
+
+def _open_upload_count():
+    """Uploads whose files are still in UPLOAD_DIR"""
+    with os.scandir(UPLOAD_DIR) as entries:
+        return sum(1 for entry in entries if entry.name.endswith('.json'))
+
+
+def create_upload(filename, size, sha256=None):
+    """
+    Start an upload of a PDF of `size` bytes; sha256 of the whole file is
+    optional and checked on finalize
+    Returns: upload state {"uploadId", "filename", "size", "offset", "complete", ...}
+    """
+    if not filename or not filename.lower().endswith('.pdf'):
+        raise UploadError("Invalid file type. Please upload a PDF.")
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise UploadError("Expected the file size in bytes")
+    if size > MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise UploadError(f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB.")
+    sha256 = str(sha256).lower() if sha256 else None
+    if sha256 is not None and not _SHA256_PATTERN.match(sha256):
+        raise UploadError("sha256 must be 64 hex digits")
+
+    expire_uploads()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with _create_lock:
+        if _open_upload_count() >= UPLOAD_MAX_OPEN:
+            raise UploadError("Too many uploads in progress. Please try again later.", 429)
+        state = {
+            "uploadId": uuid.uuid4().hex,
+            "filename": os.path.basename(filename),
+            "size": size,
+            "sha256": sha256,
+            "offset": 0,
+            "complete": False,
+            "createdAt": time.time(),
+        }
+        open(_data_path(state["uploadId"]), 'wb').close()
+        _save_state(state)
+    return state
+
+
+def upload_status(upload_id):
+    """Upload state, including the offset the next chunk must start at"""
+    return _load_state(upload_id)
+
+
+def put_chunk(upload_id, offset, stream, length, checksum):
+    """
+    Write `length` bytes read from stream at `offset`
+    The offset must be the confirmed one, and the bytes must hash to
+    checksum (SHA-256 hex); otherwise nothing is confirmed and the
+    UploadError carries the offset to resume from
+    Returns: upload state after the chunk
+    """
+    lock = _lock_for(upload_id)
+    if not lock.acquire(blocking=False):
+        raise UploadError("Another chunk of this upload is being written", 409)
+    try:
+        state = _load_state(upload_id)
+        if state["complete"]:
+            raise UploadError("Upload is already finalized", 409, state["offset"])
+        if offset != state["offset"]:
+            raise UploadError(f"Expected a chunk at offset {state['offset']}", 409, state["offset"])
+        if not checksum or not _SHA256_PATTERN.match(checksum.lower()):
+            raise UploadError("Missing chunk checksum (X-Chunk-Sha256)", 400, state["offset"])
+        if not length or length > UPLOAD_MAX_CHUNK_SIZE:
+            raise UploadError(f"Chunks must be 1 to {UPLOAD_MAX_CHUNK_SIZE} bytes", 400, state["offset"])
+        if offset + length > state["size"]:
+            raise UploadError("Chunk runs past the declared file size", 400, state["offset"])
+
+        digest = hashlib.sha256()
+        received = 0
+        with open(_data_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            while received < length:
+                block = stream.read(min(_COPY_BLOCK, length - received))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                received += len(block)
+            if received != length or digest.hexdigest() != checksum.lower():
+                # Drop what was written past the confirmed offset
+                f.truncate(offset)
+                raise UploadError("Chunk was incomplete or failed its checksum, send it again",
+                                  422, state["offset"])
+            f.flush()
+            os.fsync(f.fileno())
+
+        state["offset"] = offset + length
+        _save_state(state)
+        return state
+    finally:
+        lock.release()
+
+
+def finalize_upload(upload_id):
+    """
+    Check an upload is complete (and matches its sha256, if one was given)
+    Returns: upload state, now marked complete
+    """
+    state = _load_state(upload_id)
+    if state["complete"]:
+        return state
+    with _lock_for(upload_id):
+        state = _load_state(upload_id)
+        if state["complete"]:
+            return state
+        if state["offset"] != state["size"]:
+            raise UploadError(f"Upload is incomplete, {state['offset']} of {state['size']} bytes received",
+                              409, state["offset"])
+        if state["sha256"]:
+            digest = hashlib.sha256()
+            with open(_data_path(upload_id), 'rb') as f:
+                for block in iter(lambda: f.read(_COPY_BLOCK), b''):
+                    digest.update(block)
+            if digest.hexdigest() != state["sha256"]:
+                # The chunks were fine but do not add up to the file; start over
+                state["offset"] = 0
+                with open(_data_path(upload_id), 'r+b') as f:
+                    f.truncate(0)
+                _save_state(state)
+                raise UploadError("Assembled file does not match its sha256, upload it again", 422, 0)
+        state["complete"] = True
+        _save_state(state)
+    # No more chunks can be written to it
+    _drop_lock(upload_id)
+    return state
+
+
+def open_upload(upload_id):
+    """The assembled file of a finalized upload, opened in place as a FileStorage"""
+    state = _load_state(upload_id)
+    if not state["complete"]:
+        raise UploadError("Upload is not finalized", 409, state["offset"])
+    return FileStorage(stream=open(_data_path(upload_id), 'rb'), filename=state["filename"],
+                       content_type="application/pdf")
+
+
+def discard_upload(upload_id):
+    """Remove an upload's files once it has been extracted"""
+    for path in (_data_path(upload_id), _state_path(upload_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    _drop_lock(upload_id)
+
+
+def expire_uploads():
+    """Remove uploads that received nothing for UPLOAD_EXPIRY_HOURS"""
+    cutoff = time.time() - UPLOAD_EXPIRY_HOURS * 3600
+    try:
+        entries = [entry for entry in os.scandir(UPLOAD_DIR) if entry.name.endswith('.json')]
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            expired = entry.stat().st_mtime < cutoff
+        except OSError:
+            continue
+        if expired:
+            discard_upload(entry.name[:-len('.json')])
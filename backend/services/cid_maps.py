@@ -0,0 +1,241 @@
+"""
+Per-font CID-to-Unicode maps for glyphs pdfminer leaves as "(cid:N)"
+Maps are built once per font of an uploaded file and cached, so later pages
+and re-uploads of the same file decode those glyphs without rebuilding them
+"""
+import struct
+import threading
+from collections import Counter, OrderedDict
+
+from config import CID_MAP_CACHE_MAX_FONTS
+
+# Stands in for glyphs no map can decode, so they stay visible for review
+UNRESOLVED_CID = '\ufffd'
+
+# Offset inference needs this many decoded glyphs, mostly agreeing on one offset
+_MIN_OFFSET_SAMPLES = 10
+_MIN_OFFSET_SHARE = 0.8
+
+_cid_maps = OrderedDict()
+_cid_maps_lock = threading.Lock()
+
+
+def _page_fonts(page):
+    """pdfminer font objects of a pdfplumber page, by font name"""
+    from pdfminer.pdftypes import PDFObjRef, resolve1
+
+    fonts = {}
+    for ref in (resolve1(page.page_obj.resources.get('Font')) or {}).values():
+        objid = ref.objid if isinstance(ref, PDFObjRef) else None
+        try:
+            font = page.pdf.rsrcmgr.get_font(objid, resolve1(ref))
+        except Exception:
+            continue
+        fonts[font.fontname] = font
+    return fonts
+
+
+def _sfnt_tables(data):
+    """{tag: (offset, length)} of a TrueType/OpenType font file"""
+    num_tables = struct.unpack_from('>H', data, 4)[0]
+    tables = {}
+    for index in range(num_tables):
+        tag, _, offset, length = struct.unpack_from('>4sIII', data, 12 + 16 * index)
+        tables[tag] = (offset, length)
+    return tables
+
+
+def truetype_cmap(data):
+    """
+    Glyph id -> character from a font's Unicode cmap (formats 4 and 12;
+    pdfminer's own reader gives up on fonts that also carry format 12)
+    """
+    tables = _sfnt_tables(data)
+    if b'cmap' not in tables:
+        return {}
+    cmap = tables[b'cmap'][0]
+    subtable_count = struct.unpack_from('>H', data, cmap + 2)[0]
+    subtables = {}
+    for index in range(subtable_count):
+        platform, encoding, offset = struct.unpack_from('>HHI', data, cmap + 4 + 8 * index)
+        subtables[(platform, encoding)] = cmap + offset
+
+    glyph_chars = {}
+    for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+        subtable = subtables.get(key)
+        if subtable is None:
+            continue
+        cmap_format = struct.unpack_from('>H', data, subtable)[0]
+        if cmap_format == 12:
+            group_count = struct.unpack_from('>I', data, subtable + 12)[0]
+            for index in range(group_count):
+                start, end, glyph = struct.unpack_from('>III', data, subtable + 16 + 12 * index)
+                for code in range(max(start, 0x20), end + 1):
+                    glyph_chars.setdefault(glyph + code - start, chr(code))
+        elif cmap_format == 4:
+            seg_count = struct.unpack_from('>H', data, subtable + 6)[0] // 2
+            ends = struct.unpack_from(f'>{seg_count}H', data, subtable + 14)
+            starts_at = subtable + 16 + 2 * seg_count
+            starts = struct.unpack_from(f'>{seg_count}H', data, starts_at)
+            deltas = struct.unpack_from(f'>{seg_count}H', data, starts_at + 2 * seg_count)
+            range_offsets_at = starts_at + 4 * seg_count
+            range_offsets = struct.unpack_from(f'>{seg_count}H', data, range_offsets_at)
+            for index in range(seg_count):
+                for code in range(max(starts[index], 0x20), min(ends[index], 0xFFFE) + 1):
+                    if range_offsets[index]:
+                        at = range_offsets_at + 2 * index + range_offsets[index] + 2 * (code - starts[index])
+                        glyph = struct.unpack_from('>H', data, at)[0]
+                        glyph = (glyph + deltas[index]) & 0xFFFF if glyph else 0
+                    else:
+                        glyph = (code + deltas[index]) & 0xFFFF
+                    if glyph:
+                        glyph_chars.setdefault(glyph, chr(code))
+        else:
+            continue
+        break
+    return glyph_chars
+
+
+def _coverage_glyphs(data, offset):
+    """Glyph ids of an OpenType coverage table, in coverage index order"""
+    coverage_format, count = struct.unpack_from('>HH', data, offset)
+    if coverage_format == 1:
+        return list(struct.unpack_from(f'>{count}H', data, offset + 4))
+    glyphs = []
+    for index in range(count):
+        start, end, _ = struct.unpack_from('>HHH', data, offset + 4 + 6 * index)
+        glyphs.extend(range(start, end + 1))
+    return glyphs
+
+
+def truetype_ligatures(data):
+    """
+    Ligature glyphs of a font from its GSUB ligature substitutions
+    Returns: {ligature glyph id: [component glyph ids]}
+    """
+    tables = _sfnt_tables(data)
+    if b'GSUB' not in tables:
+        return {}
+    gsub = tables[b'GSUB'][0]
+    lookup_list = gsub + struct.unpack_from('>H', data, gsub + 8)[0]
+    lookup_count = struct.unpack_from('>H', data, lookup_list)[0]
+
+    ligatures = {}
+    for lookup_offset in struct.unpack_from(f'>{lookup_count}H', data, lookup_list + 2):
+        lookup = lookup_list + lookup_offset
+        lookup_type, _, subtable_count = struct.unpack_from('>HHH', data, lookup)
+        for subtable_offset in struct.unpack_from(f'>{subtable_count}H', data, lookup + 6):
+            subtable = lookup + subtable_offset
+            subtable_type = lookup_type
+            if lookup_type == 7:  # Extension: real type and 32-bit offset
+                _, subtable_type, extension_offset = struct.unpack_from('>HHI', data, subtable)
+                subtable += extension_offset
+            if subtable_type != 4:
+                continue
+            _, coverage_offset, set_count = struct.unpack_from('>HHH', data, subtable)
+            first_glyphs = _coverage_glyphs(data, subtable + coverage_offset)
+            set_offsets = struct.unpack_from(f'>{set_count}H', data, subtable + 6)
+            for first_glyph, set_offset in zip(first_glyphs, set_offsets):
+                ligature_set = subtable + set_offset
+                ligature_count = struct.unpack_from('>H', data, ligature_set)[0]
+                for ligature_offset in struct.unpack_from(f'>{ligature_count}H', data, ligature_set + 2):
+                    ligature = ligature_set + ligature_offset
+                    glyph, component_count = struct.unpack_from('>HH', data, ligature)
+                    rest = struct.unpack_from(f'>{component_count - 1}H', data, ligature + 4)
+                    ligatures.setdefault(glyph, [first_glyph, *rest])
+    return ligatures
+
+
+def build_cid_map(font):
+    """
+    Map of a font's CIDs to text from its ToUnicode CMap and embedded TrueType
+    cmap; ligature glyphs (the usual culprits, e.g. "ti") are spelled out from
+    their GSUB components. When most decoded glyphs sit at one fixed offset from
+    their CID (fonts that keep the standard glyph order), that offset is used
+    for the rest
+    Returns: {"known": {cid: text}, "offset": int or None, "span": (low, high)}
+    """
+    from pdfminer.pdffont import PDFCIDFont
+    from pdfminer.pdftypes import stream_value
+
+    known = {}
+    unicode_map = getattr(font, 'unicode_map', None)
+    if unicode_map is not None:
+        known.update(getattr(unicode_map, 'cid2unichr', {}))
+
+    # pdfminer only reads the embedded cmap when there is no ToUnicode at all;
+    # it also covers glyphs a partial ToUnicode leaves out (CID == glyph id)
+    fontfile = (font.descriptor or {}).get('FontFile2')
+    if isinstance(font, PDFCIDFont) and fontfile is not None:
+        try:
+            data = stream_value(fontfile).get_data()
+            for cid, text in truetype_cmap(data).items():
+                known.setdefault(cid, text)
+            for glyph, components in truetype_ligatures(data).items():
+                if glyph not in known and all(component in known for component in components):
+                    known[glyph] = ''.join(known[component] for component in components)
+        except Exception:
+            pass
+
+    codepoints = [(cid, ord(text)) for cid, text in known.items() if len(text) == 1]
+    offset = None
+    if len(codepoints) >= _MIN_OFFSET_SAMPLES:
+        best, count = Counter(point - cid for cid, point in codepoints).most_common(1)[0]
+        if count >= _MIN_OFFSET_SHARE * len(codepoints):
+            offset = best
+    span = (min(point for _, point in codepoints), max(point for _, point in codepoints)) if codepoints else (0, -1)
+    return {"known": known, "offset": offset, "span": span}
+
+
+def _lookup(cid_map, cid):
+    text = cid_map["known"].get(cid)
+    if text:
+        return text
+    if cid_map["offset"] is not None:
+        # Only trust the offset inside the range the font is known to cover
+        low, high = cid_map["span"]
+        point = cid + cid_map["offset"]
+        if low <= point <= high and chr(point).isprintable():
+            return chr(point)
+    return UNRESOLVED_CID
+
+
+def _cached_map(key):
+    with _cid_maps_lock:
+        cid_map = _cid_maps.get(key)
+        if cid_map is not None:
+            _cid_maps.move_to_end(key)
+        return cid_map
+
+
+def _store_map(key, cid_map):
+    with _cid_maps_lock:
+        _cid_maps[key] = cid_map
+        while len(_cid_maps) > CID_MAP_CACHE_MAX_FONTS:
+            _cid_maps.popitem(last=False)
+
+
+def decode_cids(page, file_hash, cids):
+    """
+    Decode (fontname, cid) pairs pdfminer could not map on a page
+    file_hash: content hash of the PDF, part of the cache key since subset
+    fonts reuse names across files; None skips the shared cache
+    Returns: list of strings aligned with cids
+    """
+    fonts = None
+    local_maps = {}
+    texts = []
+    for fontname, cid in cids:
+        cid_map = local_maps.get(fontname)
+        if cid_map is None and file_hash is not None:
+            cid_map = _cached_map((file_hash, fontname))
+        if cid_map is None:
+            if fonts is None:
+                fonts = _page_fonts(page)
+            font = fonts.get(fontname)
+            cid_map = build_cid_map(font) if font is not None else {"known": {}, "offset": None, "span": (0, -1)}
+            if file_hash is not None:
+                _store_map((file_hash, fontname), cid_map)
+        local_maps[fontname] = cid_map
+        texts.append(_lookup(cid_map, cid))
+    return texts
@@ -0,0 +1,43 @@
+"""
+The /api/exam document, encoded and compressed once per exam
+Cached payloads are dropped when the exam or one of its questions changes
+"""
+from models import Exam, Question
+from .responses import PrecompressedCache
+from .session_events import invalidate_after_commit
+
+exam_payloads = PrecompressedCache()
+
+
+def exam_payload(exam):
+    """Exam with its questions as served to students"""
+    return {
+        "id": exam.id,
+        "title": exam.title,
+        "questions": [
+            {
+                "id": question.id,
+                "text": question.question_text,
+                "options": question.options,
+                "speechText": question.speech_text,
+                "speechOptions": question.speech_options,
+            }
+            for question in Question.query.filter_by(exam_id=exam.id).all()
+        ],
+    }
+
+
+def exam_response(exam):
+    return exam_payloads.get(exam.id, lambda: exam_payload(exam)).response()
+
+
+def _changed_exams(session):
+    """Exams changed themselves or through one of their questions"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Question):
+            yield obj.exam_id
+        elif isinstance(obj, Exam):
+            yield obj.id
+
+
+invalidate_after_commit('changed_exam_payloads', _changed_exams, exam_payloads.invalidate)
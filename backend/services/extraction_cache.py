@@ -0,0 +1,77 @@
+"""
+On-disk store of previous question extractions, used for incremental re-uploads
+"""
+import json
+import os
+import re
+import uuid
+
+from config import EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_ENTRIES
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _record_path(extraction_id):
+    return os.path.join(EXTRACTION_CACHE_DIR, f"{extraction_id}.json")
+
+
+def load_extraction(extraction_id):
+    """
+    Load a stored extraction record
+    Returns: dict with "id", "pages" and "questions", or None if unknown
+    """
+    if not extraction_id or not _ID_PATTERN.match(extraction_id):
+        return None
+    try:
+        with open(_record_path(extraction_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_extraction(pages, questions, profile=None):
+    """
+    Store page hashes/texts and the questions parsed from them, along with
+    the extraction profile the pages were laid out with
+    Returns: the new extraction id
+    """
+    os.makedirs(EXTRACTION_CACHE_DIR, exist_ok=True)
+    extraction_id = uuid.uuid4().hex
+    record = {
+        "id": extraction_id,
+        "profile": profile,
+        "pages": [
+            {
+                "hash": page["hash"],
+                "text": page["text"],
+                "code_lines": page.get("code_lines", []),
+                "furniture": page.get("furniture", []),
+            }
+            for page in pages
+        ],
+        "questions": questions,
+    }
+
+    # Write then rename so a concurrent reader never sees a partial file
+    tmp_path = _record_path(extraction_id) + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, _record_path(extraction_id))
+
+    _evict_old_records()
+    return extraction_id
+
+
+def _evict_old_records():
+    try:
+        entries = [entry for entry in os.scandir(EXTRACTION_CACHE_DIR) if entry.name.endswith('.json')]
+    except OSError:
+        return
+    if len(entries) <= EXTRACTION_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - EXTRACTION_CACHE_MAX_ENTRIES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,309 @@
+"""
+Per-question item statistics, maintained as answers are written
+ItemStatistic, OptionStatistic, StudentExamScore and ExamStatistic hold
+running counts and sums. Every flush that adds, changes or deletes
+StudentAnswer rows applies its delta to them in the same transaction, so
+exam_statistics() reads a few rows per question instead of every answer.
+Answers written without the ORM (bulk inserts) and changes to a question's
+correct answer are not seen; rebuild_item_statistics() recomputes the
+tables from StudentAnswer
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from config import EXPORT_BATCH_ROWS
+from models import (
+    db, Exam, ExamStatistic, ItemStatistic, OptionStatistic, Question, StudentAnswer, StudentExamScore
+)
+
+_STATISTIC_MODELS = (OptionStatistic, ItemStatistic, StudentExamScore, ExamStatistic)
+
+
+def normalize_answer(answer):
+    """Answer as it is counted: stripped and lower-cased, or None if blank"""
+    if answer is None:
+        return None
+    return answer.strip().lower() or None
+
+
+def is_correct(answer, correct_answer):
+    """Whether a normalized answer matches a normalized correct answer (the results export uses this too)"""
+    return answer is not None and answer == correct_answer
+
+
+def record_answer(student_id, question_id, answer):
+    """Set a student's answer to a question, replacing an earlier one"""
+    row = (StudentAnswer.query.filter_by(student_id=student_id, question_id=question_id)
+           .order_by(StudentAnswer.id).first())
+    if row is None:
+        row = StudentAnswer(student_id=student_id, question_id=question_id)
+        db.session.add(row)
+    row.answer = answer
+    row.answered_at = datetime.utcnow()
+    return row
+
+
+def _add(connection, model, key, **deltas):
+    """Add deltas to the counters of a statistics row, creating it if missing"""
+    table = model.__table__
+    where = [table.c[column] == value for column, value in key.items()]
+    update = table.update().where(*where).values({column: table.c[column] + delta for column, delta in deltas.items()})
+    if connection.execute(update).rowcount == 0:
+        connection.execute(table.insert().values(**key, **deltas))
+
+
+def _answer_changes(session):
+    """
+    (student_id, question_id, old answer, new answer) of the StudentAnswer rows
+    a flush is about to write, answers normalized; None = no answer
+    """
+    changes = []
+    for row in session.new:
+        if isinstance(row, StudentAnswer):
+            changes.append((row.student_id, row.question_id, None, normalize_answer(row.answer)))
+    for row in session.deleted:
+        if isinstance(row, StudentAnswer):
+            changes.append((row.student_id, row.question_id, normalize_answer(row.answer), None))
+    for row in session.dirty:
+        if not isinstance(row, StudentAnswer) or not session.is_modified(row):
+            continue
+        attrs = inspect(row).attrs
+        old = []
+        for key in ('student_id', 'question_id', 'answer'):
+            history = attrs[key].history
+            old.append(history.deleted[0] if history.deleted else getattr(row, key))
+        new = [row.student_id, row.question_id, row.answer]
+        if old[:2] == new[:2]:
+            changes.append((row.student_id, row.question_id, normalize_answer(old[2]), normalize_answer(row.answer)))
+        else:
+            changes.append((old[0], old[1], normalize_answer(old[2]), None))
+            changes.append((row.student_id, row.question_id, None, normalize_answer(row.answer)))
+    return [change for change in changes if change[2] != change[3]]
+
+
+def _student_correct_counts(connection, student_id, exam_id):
+    """{question id: correct answer rows} of a student in an exam, as currently stored"""
+    rows = connection.execute(
+        select(StudentAnswer.question_id, StudentAnswer.answer, Question.correct_answer)
+        .join(Question, StudentAnswer.question_id == Question.id)
+        .where(StudentAnswer.student_id == student_id, Question.exam_id == exam_id)
+    )
+    return Counter(
+        question_id for question_id, answer, correct_answer in rows
+        if is_correct(normalize_answer(answer), normalize_answer(correct_answer))
+    )
+
+
+def apply_answer_changes(connection, changes):
+    """Update the statistics tables for answer changes already written to the database"""
+    questions = {
+        question_id: (exam_id, normalize_answer(correct_answer))
+        for question_id, exam_id, correct_answer in connection.execute(
+            select(Question.id, Question.exam_id, Question.correct_answer)
+            .where(Question.id.in_({change[1] for change in changes}))
+        )
+    }
+    # Per (student, exam): change in answered rows and in correct rows per question
+    students = defaultdict(lambda: [0, Counter()])
+    for student_id, question_id, old, new in changes:
+        if question_id not in questions:
+            continue
+        exam_id, correct_answer = questions[question_id]
+        answered = (new is not None) - (old is not None)
+        correct = is_correct(new, correct_answer) - is_correct(old, correct_answer)
+        _add(connection, ItemStatistic, {"question_id": question_id}, responses=answered, correct=correct)
+        if old is not None:
+            _add(connection, OptionStatistic, {"question_id": question_id, "answer": old}, count=-1)
+            connection.execute(delete(OptionStatistic).where(
+                OptionStatistic.question_id == question_id, OptionStatistic.answer == old, OptionStatistic.count <= 0
+            ))
+        if new is not None:
+            _add(connection, OptionStatistic, {"question_id": question_id, "answer": new}, count=1)
+        student = students[student_id, exam_id]
+        student[0] += answered
+        student[1][question_id] += correct
+
+    for (student_id, exam_id), (answered_delta, correct_deltas) in students.items():
+        key = {"student_id": student_id, "exam_id": exam_id}
+        previous = connection.execute(
+            select(StudentExamScore.answered, StudentExamScore.score).filter_by(**key)
+        ).first() or (0, 0)
+        answered, score = previous[0] + answered_delta, previous[1] + sum(correct_deltas.values())
+        _add(connection, StudentExamScore, key, answered=answered_delta, score=score - previous[1])
+        _add(connection, ExamStatistic, {"exam_id": exam_id},
+             students=(answered > 0) - (previous[0] > 0),
+             score_sum=score - previous[1],
+             score_square_sum=score * score - previous[1] * previous[1])
+
+        # Every question this student got right counts their score, which just changed
+        current = _student_correct_counts(connection, student_id, exam_id)
+        for question_id in current.keys() | correct_deltas.keys():
+            before = current[question_id] - correct_deltas[question_id]
+            delta = current[question_id] * score - before * previous[1]
+            if delta:
+                _add(connection, ItemStatistic, {"question_id": question_id}, correct_score_sum=delta)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_answer_changes(session, flush_context, instances):
+    changes = _answer_changes(session)
+    if changes:
+        session.info.setdefault('answer_changes', []).extend(changes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_answer_changes(session, flush_context):
+    changes = session.info.pop('answer_changes', None)
+    if changes:
+        apply_answer_changes(session.connection(), changes)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_answer_changes(session, previous_transaction):
+    session.info.pop('answer_changes', None)
+
+
+def _exam_answers(exam_id):
+    """(student_id, question_id, answer, correct answer) of an exam, normalized, streamed"""
+    result = db.session.execute(
+        select(StudentAnswer.student_id, StudentAnswer.question_id, StudentAnswer.answer, Question.correct_answer)
+        .join(Question, StudentAnswer.question_id == Question.id)
+        .where(Question.exam_id == exam_id)
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_ROWS)
+    )
+    for student_id, question_id, answer, correct_answer in result:
+        yield student_id, question_id, normalize_answer(answer), normalize_answer(correct_answer)
+
+
+def _rebuild_exam(exam_id):
+    """Statistics rows of one exam from its answers, in two passes over them"""
+    responses, correct, options = Counter(), Counter(), Counter()
+    answered, scores = Counter(), Counter()
+    count = 0
+    for student_id, question_id, answer, correct_answer in _exam_answers(exam_id):
+        count += 1
+        if answer is None:
+            continue
+        responses[question_id] += 1
+        options[question_id, answer] += 1
+        answered[student_id] += 1
+        if is_correct(answer, correct_answer):
+            correct[question_id] += 1
+            scores[student_id] += 1
+
+    correct_score_sum = Counter()
+    if correct:
+        for student_id, question_id, answer, correct_answer in _exam_answers(exam_id):
+            if is_correct(answer, correct_answer):
+                correct_score_sum[question_id] += scores[student_id]
+
+    session = db.session
+    if responses:
+        session.execute(ItemStatistic.__table__.insert(), [
+            {"question_id": question_id, "responses": responses[question_id], "correct": correct[question_id],
+             "correct_score_sum": correct_score_sum[question_id]}
+            for question_id in responses
+        ])
+        session.execute(OptionStatistic.__table__.insert(), [
+            {"question_id": question_id, "answer": answer, "count": total}
+            for (question_id, answer), total in options.items()
+        ])
+        session.execute(StudentExamScore.__table__.insert(), [
+            {"student_id": student_id, "exam_id": exam_id, "answered": total, "score": scores[student_id]}
+            for student_id, total in answered.items()
+        ])
+        session.execute(ExamStatistic.__table__.insert().values(
+            exam_id=exam_id, students=len(answered), score_sum=sum(scores.values()),
+            score_square_sum=sum(score * score for score in scores.values()),
+        ))
+    return count
+
+
+def rebuild_item_statistics():
+    """
+    Recompute every statistics table from StudentAnswer
+    Returns: number of answers read
+    """
+    for model in _STATISTIC_MODELS:
+        db.session.execute(delete(model))
+    count = sum(_rebuild_exam(exam_id) for (exam_id,) in db.session.execute(select(Exam.id)).all())
+    db.session.commit()
+    return count
+
+
+def ensure_item_statistics():
+    """Build the statistics of answers saved before the tables existed"""
+    if db.session.query(StudentExamScore.student_id).first() is None \
+            and db.session.query(StudentAnswer.id).first() is not None:
+        rebuild_item_statistics()
+
+
+def _discrimination(correct, correct_score_sum, students, mean, sd):
+    """
+    Point-biserial correlation between answering correctly and the exam
+    score, over the students who answered the exam (no answer = incorrect)
+    """
+    if not correct or correct >= students or not sd:
+        return None
+    share = correct / students
+    return (correct_score_sum / correct - mean) / sd * math.sqrt(share / (1 - share))
+
+
+def exam_statistics(exam_id):
+    """Score summary and difficulty, discrimination and answer distribution of each question"""
+    exam = db.session.get(ExamStatistic, exam_id)
+    students = exam.students if exam else 0
+    mean = exam.score_sum / students if students else None
+    sd = math.sqrt(max(0.0, exam.score_square_sum / students - mean * mean)) if students else None
+
+    exam_questions = select(Question.id).where(Question.exam_id == exam_id)
+    answer_counts = defaultdict(dict)
+    for question_id, answer, count in db.session.execute(
+        select(OptionStatistic.question_id, OptionStatistic.answer, OptionStatistic.count)
+        .where(OptionStatistic.question_id.in_(exam_questions))
+    ):
+        answer_counts[question_id][answer] = count
+
+    items = []
+    for question, responses, correct, correct_score_sum in db.session.execute(
+        select(Question, func.coalesce(ItemStatistic.responses, 0), func.coalesce(ItemStatistic.correct, 0),
+               func.coalesce(ItemStatistic.correct_score_sum, 0))
+        .outerjoin(ItemStatistic, ItemStatistic.question_id == Question.id)
+        .where(Question.exam_id == exam_id)
+        .order_by(Question.id)
+    ):
+        counts = answer_counts.get(question.id, {})
+        correct_answer = normalize_answer(question.correct_answer)
+        options = []
+        for option in question.options or []:
+            answer = normalize_answer(option)
+            count = counts.pop(answer, 0)
+            options.append({
+                "option": option,
+                "count": count,
+                "share": round(count / responses, 4) if responses else None,
+                "correct": is_correct(answer, correct_answer),
+            })
+        discrimination = _discrimination(correct, correct_score_sum, students, mean, sd)
+        items.append({
+            "questionId": question.id,
+            "question": question.question_text,
+            "responses": responses,
+            "correct": correct,
+            "difficulty": round(correct / responses, 4) if responses else None,
+            "discrimination": round(discrimination, 4) if discrimination is not None else None,
+            "options": options,
+            "otherAnswers": sum(counts.values()),
+        })
+
+    return {
+        "examId": exam_id,
+        "students": students,
+        "meanScore": round(mean, 4) if mean is not None else None,
+        "scoreSd": round(sd, 4) if sd is not None else None,
+        "questions": items,
+    }
@@ -0,0 +1,86 @@
+"""
+Logging for the services package
+Records are handed to a background thread through a queue, so request
+threads never wait on log I/O. Each stage (service module) can have its own
+level, and DEBUG lines written once per question, option set or student are
+marked with extra=SAMPLED and sampled per call site so large uploads stay
+readable
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+from config import LOG_LEVEL, LOG_STAGE_LEVELS, LOG_DEBUG_SAMPLE_EVERY
+
+PACKAGE_LOGGER = 'services'
+
+# extra= of the log calls made once per record (question, option set, student)
+SAMPLED = {'sampled': True}
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class DebugSampler(logging.Filter):
+    """Let through one in every `every` records marked SAMPLED per call site; other records always pass"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._seen = {}
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        # Unlocked on purpose: a lost count under contention only shifts the sample
+        seen = self._seen.get(site, 0)
+        self._seen[site] = seen + 1
+        return seen % self.every == 0
+
+
+def parse_stage_levels(spec):
+    """
+    "question_service=DEBUG,pdf_utils=WARNING" -> {logger name: level}
+    Unknown level names raise ValueError
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        stage, _, level = item.partition('=')
+        name = level.strip().upper()
+        if not isinstance(logging.getLevelName(name), int):
+            raise ValueError(f"Unknown log level '{level}' for stage '{stage}'")
+        levels[f"{PACKAGE_LOGGER}.{stage.strip()}"] = name
+    return levels
+
+
+def configure_logging(level=LOG_LEVEL, stage_levels=LOG_STAGE_LEVELS, sample_every=LOG_DEBUG_SAMPLE_EVERY):
+    """
+    Send services logs through a queue to stderr and apply the stage levels
+    Safe to call more than once; only the first call starts the listener
+    """
+    global _listener
+
+    package = logging.getLogger(PACKAGE_LOGGER)
+    package.setLevel(level.upper())
+    for name, stage_level in parse_stage_levels(stage_levels).items():
+        logging.getLogger(name).setLevel(stage_level)
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(log_queue)
+        handler.addFilter(DebugSampler(sample_every))
+
+        output = logging.StreamHandler()
+        output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        _listener = logging.handlers.QueueListener(log_queue, output)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        package.addHandler(handler)
+        # The queue is the only way out, or root handlers would write synchronously too
+        package.propagate = False
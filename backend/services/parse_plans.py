@@ -0,0 +1,46 @@
+"""
+Remembered parse plans of question templates
+A plan records which question segmentation pattern (or the paragraph
+fallback) parsed a document, keyed by the fingerprint of its format (see
+question_service.format_fingerprint). Later uploads of the same template run
+that pattern alone instead of the whole cascade, as long as the questions and
+options it finds add up to what the fingerprint scan predicts
+"""
+import threading
+from collections import OrderedDict
+
+from config import PARSE_PLAN_CACHE_MAX_ENTRIES
+
+# Plan of documents split into paragraphs rather than by a pattern
+PARAGRAPHS = "paragraphs"
+
+
+class ParsePlanCache:
+    """Most recently used plans by template fingerprint"""
+
+    def __init__(self, max_entries=PARSE_PLAN_CACHE_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, fingerprint):
+        """Segmentation pattern index (or PARAGRAPHS) remembered for a fingerprint, or None"""
+        with self._lock:
+            plan = self._plans.get(fingerprint)
+            if plan is not None:
+                self._plans.move_to_end(fingerprint)
+            return plan
+
+    def remember(self, fingerprint, plan):
+        with self._lock:
+            self._plans[fingerprint] = plan
+            self._plans.move_to_end(fingerprint)
+            while len(self._plans) > self._max_entries:
+                self._plans.popitem(last=False)
+
+    def forget(self, fingerprint):
+        with self._lock:
+            self._plans.pop(fingerprint, None)
+
+
+parse_plans = ParsePlanCache()
@@ -1,9 +1,61 @@
 """
 Common PDF processing utilities
 """
-import pdfplumber
-import traceback
+import hashlib
+import logging
+import re
 from config import MAX_FILE_SIZE_MB
+from .cid_maps import decode_cids, UNRESOLVED_CID
+
+logger = logging.getLogger(__name__)
+
+# Font names that say monospace; subset fonts with generic names are caught by glyph widths
+_MONOSPACE_FONT_PATTERN = re.compile(r'mono|courier|consol|menlo|typewriter|fixedsys', re.IGNORECASE)
+_MIN_GLYPHS_FOR_WIDTH_CHECK = 5
+_CODE_LINE_MIN_MONOSPACE = 0.8
+
+# Page furniture: lines in the top/bottom band of a page that repeat on at
+# least this share of the document's pages. Page numbers match whatever their
+# digits; lines starting like a question, option or answer never count
+_EDGE_ZONE = 0.1
+_FURNITURE_MIN_PAGE_SHARE = 0.5
+_DIGIT_RUN = re.compile(r'\d+')
+_PAGE_NUMBER_LINE = re.compile(r'^\W*(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?\W*$', re.IGNORECASE)
+_QUESTION_PART_LINE = re.compile(r'^\s*(?:\d+\s*[.)]|[A-D]\s*[.)]|answer\s*:)', re.IGNORECASE)
+
+# Extraction profiles trade speed for fidelity in the pdfplumber pass. pdfplumber
+# lays lines out from the glyphs itself, so pdfminer's layout analysis (LAParams)
+# changes nothing here and is never run
+#   dedupe_chars: drop glyphs drawn twice on top of each other (fake bold, shadows)
+#   x_tolerance / y_tolerance: gaps (pt) that still join glyphs into words / lines;
+#       the tighter ones keep the spacing of code lines apart
+#   tables: whether roster extraction falls back to pdfplumber's table finder
+#       when the roster table builder finds no table; question extraction never
+#       looks for tables
+#   table_strategies: table finder strategies tried in order
+EXTRACTION_PROFILES = {
+    "fast": {
+        "dedupe_chars": False,
+        "x_tolerance": 3,
+        "y_tolerance": 3,
+        "tables": False,
+        "table_strategies": ("lines",),
+    },
+    "balanced": {
+        "dedupe_chars": True,
+        "x_tolerance": 3,
+        "y_tolerance": 3,
+        "tables": True,
+        "table_strategies": ("lines",),
+    },
+    "accurate": {
+        "dedupe_chars": True,
+        "x_tolerance": 1.5,
+        "y_tolerance": 2,
+        "tables": True,
+        "table_strategies": ("lines", "text"),
+    },
+}
 
 def validate_pdf_file(file):
     """
@@ -28,57 +80,289 @@ def validate_pdf_file(file):
     
     return True, None
 
-def extract_text_from_pdf(pdf_file_stream):
+def resolve_extraction_profile(name, default):
+    """
+    Pick the extraction profile for a request
+    Returns: (profile_name, error_message)
+    """
+    name = (name or default).strip().lower()
+    if name not in EXTRACTION_PROFILES:
+        return None, f"Unknown extraction profile '{name}'. Use one of: {', '.join(EXTRACTION_PROFILES)}."
+    return name, None
+
+def extract_text_from_pdf(pdf_file_stream, profile="fast"):
     """
     Extract all text from PDF file stream with improved character handling
     Returns: extracted text as string
     """
-    all_text = ""
+    pages = extract_page_texts(pdf_file_stream, profile=profile)
+
+    final_text = "\n".join(page["text"] for page in pages if page["text"]).strip()
+    logger.info("PDF extraction complete: %d characters extracted", len(final_text))
+    return final_text
+
+def extract_page_texts(pdf_file_stream, reuse=None, profile="fast"):
+    """
+    Extract cleaned text page by page, tagging each page with a content hash
+    reuse: optional {page_hash: page} from a previous extraction; pages whose
+    hash is found there are not laid out again
+    profile: name of the EXTRACTION_PROFILES entry to lay pages out with
+    Returns: list of {"hash", "text", "code_lines", "furniture", "reused"} dicts
+    in page order; code_lines holds the stripped lines the layout pass marked as
+    code, furniture the keys of the repeated header/footer lines dropped from it
+    """
+    # pdfplumber pulls in pdfminer and PIL; load it on first extraction only
+    import pdfplumber
+
+    settings = EXTRACTION_PROFILES[profile]
+    reuse = reuse or {}
+    pages = []
     try:
+        file_hash = file_content_hash(pdf_file_stream)
+
         # Reset file pointer to beginning
         pdf_file_stream.seek(0)
         
         with pdfplumber.open(pdf_file_stream) as pdf:
+            laid_out = []
             for page_num, page in enumerate(pdf.pages, 1):
-                try:
-                    text = page.extract_text()
-                    if text:
-                        # Log original text issues for debugging (first 200 chars)
-                        original_preview = text[:200] if len(text) > 200 else text
-                        
-                        # Clean up problematic Unicode characters
-                        cleaned_text = clean_pdf_text(text)
-                        
-                        # Log if significant changes were made
-                        if original_preview != cleaned_text[:200]:
-                            print(f"Page {page_num}: Cleaned text encoding issues")
-                            # Log specific issues found (for debugging)
-                            if 'Ɵ' in original_preview or '(cid:' in original_preview:
-                                print(f"  Found encoding issues: {original_preview[:100]}...")
-                        
-                        all_text += cleaned_text + "\n"
-                except Exception as page_error:
-                    print(f"Error processing page {page_num}: {page_error}")
+                page_hash = page_content_hash(page)
+                if page_hash in reuse:
+                    cached = reuse[page_hash]
+                    pages.append({
+                        "hash": page_hash,
+                        "text": cached["text"],
+                        "code_lines": cached.get("code_lines", []),
+                        "furniture": cached.get("furniture", []),
+                        "reused": True,
+                    })
+                    page.close()
                     continue
+                layout_page = page.dedupe_chars() if settings["dedupe_chars"] else page
+                laid_out.append((len(pages), page_num, _layout_page(layout_page, page_num, file_hash, settings)))
+                pages.append({"hash": page_hash, "reused": False})
+                # Only the laid out lines are needed from here on; drop the page's
+                # parsed objects and layout instead of keeping every page alive
+                # until the document is closed
+                layout_page.close()
+                page.close()
+
+            # Header/footer lines only show up as furniture across pages, so they
+            # are dropped between layout and cleaning
+            furniture = repeated_furniture(
+                [[key for _, key in edge_lines] for _, _, (_, _, edge_lines) in laid_out]
+                + [page["furniture"] for page in pages if page["reused"]],
+                len(pages),
+            )
+            dropped_count = 0
+            for index, page_num, (lines, code_lines, edge_lines) in laid_out:
+                dropped = {line_index: key for line_index, key in edge_lines if key in furniture}
+                dropped_count += len(dropped)
+                text = "\n".join(line for line_index, line in enumerate(lines) if line_index not in dropped)
+                text, code_lines = _clean_page_text(text, code_lines, page_num)
+                pages[index].update(text=text, code_lines=code_lines, furniture=sorted(set(dropped.values())))
+            if dropped_count:
+                logger.info("Dropped %d repeated header/footer lines", dropped_count)
                     
     except Exception as e:
-        print(f"Error processing PDF: {e}")
-        traceback.print_exc()
-        return ""
+        logger.exception("Error processing PDF: %s", e)
+        return []
 
-    final_text = all_text.strip()
-    print(f"PDF extraction complete: {len(final_text)} characters extracted")
-    return final_text
+    return pages
+
+def file_content_hash(pdf_file_stream):
+    """sha256 of the whole uploaded file"""
+    digest = hashlib.sha256()
+    pdf_file_stream.seek(0)
+    for chunk in iter(lambda: pdf_file_stream.read(1 << 20), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def page_content_hash(page):
+    """
+    Fingerprint a pdfplumber page from its content stream(s), size and rotation
+    """
+    from pdfminer.pdftypes import resolve1
+
+    digest = hashlib.sha256()
+    page_obj = page.page_obj
+    digest.update(repr((page_obj.mediabox, page_obj.rotate)).encode())
+    for stream_ref in page_obj.contents:
+        try:
+            digest.update(resolve1(stream_ref).get_data())
+        except Exception:
+            # Unreadable stream: make the hash unique so the page is re-extracted
+            digest.update(repr(stream_ref).encode())
+    return digest.hexdigest()
+
+def _monospace_fonts(font_glyphs):
+    """
+    Names of the fonts that are monospaced, from {fontname: {glyph: width/size}}
+    """
+    monospace = set()
+    for fontname, glyphs in font_glyphs.items():
+        if _MONOSPACE_FONT_PATTERN.search(fontname):
+            monospace.add(fontname)
+        elif len(glyphs) >= _MIN_GLYPHS_FOR_WIDTH_CHECK and len(set(glyphs.values())) == 1:
+            monospace.add(fontname)
+    return monospace
+
+def _indent_code_block(block):
+    """Rebuild the indentation of consecutive code lines from their x offsets"""
+    left = min(x0 for x0, _, _ in block)
+    return [
+        " " * max(0, round((x0 - left) / cell_width)) + text
+        for x0, text, cell_width in block
+    ]
+
+def furniture_key(text, zone):
+    """
+    Key under which a header/footer line repeats across pages: case and
+    spacing ignored, and digits too for page numbers
+    Returns: the key, or None for lines that are never furniture
+    """
+    if _QUESTION_PART_LINE.match(text):
+        return None
+    if _PAGE_NUMBER_LINE.match(text):
+        text = _DIGIT_RUN.sub('#', text)
+    return f"{zone}:{' '.join(text.lower().split())}"
+
+def repeated_furniture(page_edge_keys, page_count):
+    """
+    Keys of header/footer lines repeated across the document
+    page_edge_keys: one list of edge line keys per page (repeats within a page count once)
+    """
+    if page_count < 2:
+        return set()
+    min_pages = max(2, _FURNITURE_MIN_PAGE_SHARE * page_count)
+    counts = {}
+    for keys in page_edge_keys:
+        for key in set(keys):
+            counts[key] = counts.get(key, 0) + 1
+    return {key for key, count in counts.items() if key and count >= min_pages}
+
+def layout_page_lines(page, file_hash=None, x_tolerance=3, y_tolerance=3):
+    """
+    Lay out the lines of a page and mark its code lines in one pass over the characters
+    A line is code when most of its glyphs are set in a monospace font; code
+    lines get their indentation back from their x position. Glyphs pdfminer
+    could not decode ("(cid:N)") are looked up in per-font maps
+    Returns: (lines, code_lines, edge_lines) where code_lines is a list of
+    stripped code lines and edge_lines holds (line index, furniture key) for
+    the lines in the page's header and footer bands
+    """
+    lines = []
+    font_glyphs = {}
+    cids = []
+    for line in page.extract_text_lines(return_chars=True, x_tolerance=x_tolerance, y_tolerance=y_tolerance):
+        fonts = {}
+        for char in line["chars"]:
+            if char["text"].isspace():
+                continue
+            if char["text"].startswith("(cid:"):
+                cids.append((len(lines), char["fontname"], int(char["text"][5:-1])))
+            count, _ = fonts.get(char["fontname"], (0, 0))
+            fonts[char["fontname"]] = (count + 1, char["width"])
+            if char["size"]:
+                font_glyphs.setdefault(char["fontname"], {})[char["text"]] = round(char["width"] / char["size"], 2)
+        lines.append((line, fonts))
+
+    line_texts = [line["text"] for line, _ in lines]
+    if cids:
+        decoded = decode_cids(page, file_hash, [(fontname, cid) for _, fontname, cid in cids])
+        for (index, _, cid), text in zip(cids, decoded):
+            line_texts[index] = line_texts[index].replace(f"(cid:{cid})", text, 1)
+
+    header_limit = page.height * _EDGE_ZONE
+    footer_limit = page.height * (1 - _EDGE_ZONE)
+    edge_lines = []
+    for index, ((line, _), text) in enumerate(zip(lines, line_texts)):
+        if line["bottom"] <= header_limit:
+            key = furniture_key(text, "header")
+        elif line["top"] >= footer_limit:
+            key = furniture_key(text, "footer")
+        else:
+            continue
+        if key:
+            edge_lines.append((index, key))
+
+    monospace = _monospace_fonts(font_glyphs)
+    out = []
+    code_lines = []
+    block = []
+    for (line, fonts), text in zip(lines, line_texts):
+        glyph_count = sum(count for count, _ in fonts.values())
+        mono = [(count, width) for fontname, (count, width) in fonts.items() if fontname in monospace]
+        if glyph_count and sum(count for count, _ in mono) >= glyph_count * _CODE_LINE_MIN_MONOSPACE:
+            block.append((line["x0"], text, mono[0][1] or 1))
+            code_lines.append(text.strip())
+            continue
+        if block:
+            out.extend(_indent_code_block(block))
+            block = []
+        out.append(text)
+    if block:
+        out.extend(_indent_code_block(block))
+
+    return out, code_lines, edge_lines
+
+def _layout_page(page, page_num, file_hash, settings):
+    """layout_page_lines with a profile's tolerances; returns an empty page on failure"""
+    try:
+        return layout_page_lines(page, file_hash, settings["x_tolerance"], settings["y_tolerance"])
+    except Exception as page_error:
+        logger.warning("Error processing page %d: %s", page_num, page_error)
+        return [], [], []
+
+def _clean_page_text(text, code_lines, page_num):
+    """
+    Clean the laid out text of a single page
+    Returns: (text, code_lines), ("", []) on failure
+    """
+    try:
+        if not text:
+            return "", []
+
+        # Clean up problematic Unicode characters
+        cleaned_text, code_lines = clean_marked_pdf_text(text, code_lines)
+
+        # Log if significant changes were made (first 200 chars, for debugging)
+        if logger.isEnabledFor(logging.DEBUG) and text[:200] != cleaned_text[:200]:
+            logger.debug("Page %d: Cleaned text encoding issues", page_num)
+            if 'Ɵ' in text[:200] or UNRESOLVED_CID in text[:200]:
+                logger.debug("  Found encoding issues: %s...", text[:100])
+        
+        return cleaned_text, code_lines
+    except Exception as page_error:
+        logger.warning("Error processing page %d: %s", page_num, page_error)
+        return "", []
 
 def clean_pdf_text(text):
     """
     Clean up common PDF text extraction issues with comprehensive character mapping
     This handles various PDF encoding issues users might encounter
     """
+    return _clean_pdf_text(text, None)[0]
+
+def clean_marked_pdf_text(text, code_lines):
+    """
+    clean_pdf_text for text whose code lines were marked by the layout pass
+    Marked lines keep their indentation and spacing instead of being guessed from keywords
+    Returns: (cleaned text, the marked code lines as they read after cleaning)
+    """
+    return _clean_pdf_text(text, set(code_lines))
+
+def _clean_pdf_text(text, code_lines):
+    # Character replacements below never add or remove line breaks, so the
+    # marks can be taken per line up front
+    code_flags = None
+    if code_lines is not None:
+        code_flags = [line.strip() in code_lines for line in text.split('\n')]
+
     # Comprehensive character replacements for PDF extraction issues (multi-language support)
     char_replacements = {
-        # Common Unicode substitutions
-        'Ɵ': 't', 'ƞ': 'n', 'Ɨ': 'i', 'ƒ': 'f', 'Ş': 'S', 'ş': 's',
+        # Common Unicode substitutions ('Ɵ' and 'ƞ' are how the ti/tf ligatures of some fonts decode)
+        'Ɵ': 'ti', 'ƞ': 'tf', 'Ɨ': 'i', 'ƒ': 'f', 'Ş': 'S', 'ş': 's',
         'Ğ': 'G', 'ğ': 'g', 'İ': 'I', 'ı': 'i', 'Ö': 'O', 'ö': 'o',
         'Ü': 'U', 'ü': 'u', 'Ç': 'C', 'ç': 'c',
         
@@ -126,54 +410,22 @@ def clean_pdf_text(text):
     for old_char, new_char in char_replacements.items():
         text = text.replace(old_char, new_char)
     
-    # Handle CID font mapping issues (more comprehensive)
-    import re
-    
-    # Remove CID font references with flexible numbers
-    text = re.sub(r'\(cid:\d+\)', 't', text)  # Default to 't' as it's most common
-    
-    # Handle specific CID mappings if we can identify patterns
-    cid_patterns = {
-        r'\(cid:41[0-9]\)': 't',  # 410-419 range often maps to 't'
-        r'\(cid:42[0-9]\)': 'n',  # 420-429 range often maps to 'n'
-        r'\(cid:43[0-9]\)': 'i',  # 430-439 range often maps to 'i'
-        r'\(cid:44[0-9]\)': 'o',  # 440-449 range often maps to 'o'
-        r'\(cid:45[0-9]\)': 'a',  # 450-459 range often maps to 'a'
-    }
-    
-    for pattern, replacement in cid_patterns.items():
-        text = re.sub(pattern, replacement, text)
-    
-    # Handle garbled text patterns that commonly occur
-    garbled_patterns = {
-        r'func\S*on': 'function',  # funcƟon, funcƞon, etc.
-        r'quest\S*on': 'question', # questƟon, etc.
-        r'opera\S*on': 'operation', # operaƟon, etc.
-        r'implementa\S*on': 'implementation', # implementaƟon, etc.
-        r'informa\S*on': 'information', # informaƟon, etc.
-        r'condi\S*on': 'condition', # condiƟon, etc.
-        r'sec\S*on': 'section', # secƟon, etc.
-        r'por\S*on': 'portion', # porƟon, etc.
-        r'posi\S*on': 'position', # posiƟon, etc.
-        r'op\S*on': 'option', # opƟon, etc.
-        r'wri\S*ng': 'writing', # wriƟng, etc.
-        r'prin\S*\(': 'printf(',  # prinƞ(, prinƟ(, etc.
-        r'sta\S*c': 'static', # staƟc, etc.
-        r'vola\S*le': 'volatile', # volaƟle, etc.
-    }
-    
-    for pattern, replacement in garbled_patterns.items():
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-    
     # Preserve code block structure - don't collapse code formatting
     # Identify potential code blocks and preserve their formatting
     lines = text.split('\n')
     processed_lines = []
     in_code_block = False
     
-    for line in lines:
+    for index, line in enumerate(lines):
         stripped_line = line.strip()
         
+        if code_flags is not None:
+            if code_flags[index]:
+                processed_lines.append(line.rstrip())
+            else:
+                processed_lines.append(re.sub(r' +', ' ', stripped_line))
+            continue
+        
         # Detect start of code block
         if (any(keyword in stripped_line.lower() for keyword in ['public class', 'public static', '#include', 'int main', 'void main']) or
             stripped_line.endswith('{') or
@@ -198,78 +450,29 @@ def clean_pdf_text(text):
     text = '\n'.join(processed_lines)
     
     # Clean up whitespace issues (but preserve code structure)
-    text = re.sub(r' +', ' ', text)  # Multiple spaces to single space (except in code)
+    if code_flags is None:
+        text = re.sub(r' +', ' ', text)  # Multiple spaces to single space (except in code)
     text = re.sub(r'\n{3,}', '\n\n', text)  # Limit consecutive newlines
     
-    # Fix common programming syntax issues in code snippets (multi-language support)
-    code_fixes = {
-        # C/C++ patterns
-        r'#include\s*<\s*stdio\.h\s*>': '#include <stdio.h>',
-        r'#include\s*<\s*stdlib\.h\s*>': '#include <stdlib.h>',
-        r'#include\s*<\s*string\.h\s*>': '#include <string.h>',
-        r'#include\s*<\s*math\.h\s*>': '#include <math.h>',
-        r'#include\s*<\s*iostream\s*>': '#include <iostream>',
-        r'#include\s*<\s*vector\s*>': '#include <vector>',
-        r'int\s+main\s*\(\s*\)': 'int main()',
-        r'return\s+0\s*;': 'return 0;',
-        r'using\s+namespace\s+std\s*;': 'using namespace std;',
-        
-        # Java patterns
-        r'public\s+static\s+void\s+main': 'public static void main',
-        r'public\s+class\s+': 'public class ',
-        r'System\.out\.print': 'System.out.print',
-        # Note: Do NOT change printf to println for C/C++ code!
-        
-        # Python patterns
-        r'def\s+main\s*\(\s*\)': 'def main():',
-        r'if\s+__name__\s*==\s*["\']__main__["\']\s*:': 'if __name__ == "__main__":',
-        r'print\s*\(\s*': 'print(',
-        
-        # JavaScript patterns
-        r'function\s+main\s*\(\s*\)': 'function main()',
-        r'console\.log\s*\(': 'console.log(',
-        r'let\s+': 'let ',
-        r'const\s+': 'const ',
-        r'var\s+': 'var ',
-        
-        # General programming fixes
-        r'AN\d+\)': 'AND)',  # Fix truncated "AND" in bitwise operations
-        r'OR\d+\)': 'OR)',   # Fix truncated "OR" in bitwise operations
-        r'XOR\d+\)': 'XOR)', # Fix truncated "XOR" in bitwise operations
-        
-        # Common OCR errors in programming contexts
-        r'automatcally': 'automatically',
-        r'exceptons': 'exceptions',
-        r'collecton': 'collection',
-        r'primitve': 'primitive',
-        r'Compilaton': 'Compilation',
-        r'utl': 'util',
-        r'functon': 'function',
-        r'retum': 'return',
-        r'pnnt': 'print',
-        r'prmt': 'print',
-        r'vanable': 'variable',
-        r'declaraton': 'declaration',
-        r'intializaton': 'initialization',
-        r'iteraton': 'iteration',
-        r'condton': 'condition',
-        r'comparson': 'comparison',
-        r'operaton': 'operation',
-        r'allocaton': 'allocation',
-        r'implementaton': 'implementation',
-    }
-    
-    for pattern, replacement in code_fixes.items():
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-    
-    return text.strip()
+    if code_flags is None:
+        return text.strip(), None
 
-def extract_tables_from_pdf(pdf_file_stream):
+    # Lines are only trimmed or dropped when blank, so the marks carry over
+    text = text.strip('\n').rstrip()
+    return text, [line.strip() for line, flag in zip(processed_lines, code_flags) if flag and line.strip()]
+
+def extract_tables_from_pdf(pdf_file_stream, profile="fast"):
     """
     Extract all tables from PDF file stream
-    Returns: list of tables from all pages
+    Each page tries the profile's table strategies in order until one finds tables
+    Returns: list of tables from all pages; none for profiles without tables
     """
+    import pdfplumber
+
+    settings = EXTRACTION_PROFILES[profile]
     all_tables = []
+    if not settings["tables"]:
+        return all_tables
     
     try:
         # Reset file pointer to beginning
@@ -277,18 +480,32 @@ def extract_tables_from_pdf(pdf_file_stream):
         
         with pdfplumber.open(pdf_file_stream) as pdf:
             for page_num, page in enumerate(pdf.pages):
+                table_page = page
                 try:
-                    tables = page.extract_tables()
+                    if settings["dedupe_chars"]:
+                        table_page = page.dedupe_chars()
+                    for strategy in settings["table_strategies"]:
+                        tables = table_page.extract_tables({
+                            "vertical_strategy": strategy,
+                            "horizontal_strategy": strategy,
+                            "text_x_tolerance": settings["x_tolerance"],
+                            "text_y_tolerance": settings["y_tolerance"],
+                        })
+                        if tables:
+                            break
                     if tables:
-                        print(f"Found {len(tables)} tables on page {page_num + 1}")
+                        logger.debug("Found %d tables on page %d", len(tables), page_num + 1)
                         all_tables.extend(tables)
                 except Exception as page_error:
-                    print(f"Error processing page {page_num + 1}: {page_error}")
+                    logger.warning("Error processing page %d: %s", page_num + 1, page_error)
                     continue
+                finally:
+                    # Release the page's parsed objects as soon as it is done
+                    table_page.close()
+                    page.close()
                     
     except Exception as e:
-        print(f"Error extracting tables from PDF: {e}")
-        traceback.print_exc()
+        logger.exception("Error extracting tables from PDF: %s", e)
         return []
 
     return all_tables
\ No newline at end of file
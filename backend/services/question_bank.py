@@ -0,0 +1,287 @@
+"""
+Persistent question bank: full-text search and near-duplicate detection
+over saved Question rows
+The FTS table and the MinHash band rows follow the Question table: session
+events index questions as they are inserted, re-index them when their text
+or options change and drop them when they are deleted, in the same
+transaction; ensure_search_index() reconciles rows written outside the ORM
+"""
+import hashlib
+import random
+import re
+
+from sqlalchemy import bindparam, delete, event, func, inspect, literal_column, select, table, text, tuple_
+from sqlalchemy.orm import Session
+
+from config import (
+    MINHASH_BANDS, MINHASH_ROWS_PER_BAND, DUPLICATE_SIMILARITY_THRESHOLD, DUPLICATE_LOOKUP_CHUNK_SIZE
+)
+from models import db, Exam, Question, QuestionBandHash
+from .speech_text import render_question_speech
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUM_PERMUTATIONS = MINHASH_BANDS * MINHASH_ROWS_PER_BAND
+
+# Fixed seed: signatures must be comparable across processes and restarts
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(_NUM_PERMUTATIONS)
+]
+
+
+def _stable_hash(data):
+    """63-bit hash that is identical in every process (unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big') >> 1
+
+
+def question_shingles(question_text, options=()):
+    """Set of hashed word 3-grams over the stem and options"""
+    tokens = _TOKEN_PATTERN.findall(" ".join([question_text, *options]).lower())
+    if len(tokens) < 3:
+        return {_stable_hash(" ".join(tokens).encode())} if tokens else set()
+    return {
+        _stable_hash(f"{tokens[i]} {tokens[i + 1]} {tokens[i + 2]}".encode())
+        for i in range(len(tokens) - 2)
+    }
+
+
+def minhash_bands(shingles):
+    """LSH band buckets of the MinHash signature: list of (band, bucket)"""
+    if not shingles:
+        return []
+    signature = [
+        min((a * shingle + b) % _MERSENNE_PRIME for shingle in shingles)
+        for a, b in _PERMUTATIONS
+    ]
+    bands = []
+    for band in range(MINHASH_BANDS):
+        rows = signature[band * MINHASH_ROWS_PER_BAND:(band + 1) * MINHASH_ROWS_PER_BAND]
+        bands.append((band, _stable_hash(",".join(map(str, rows)).encode())))
+    return bands
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _uses_fts(bind=None):
+    return (bind or db.engine).dialect.name == 'sqlite'
+
+
+def ensure_search_index():
+    """
+    Create the FTS5 table backing question search (SQLite only) and bring
+    the search and duplicate indexes in line with the Question table
+    """
+    connection = db.session.connection()
+    if _uses_fts():
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts "
+            "USING fts5(question_text, options_text, tokenize='porter unicode61')"
+        ))
+        connection.execute(text("DELETE FROM question_fts WHERE rowid NOT IN (SELECT id FROM question)"))
+    connection.execute(delete(QuestionBandHash).where(QuestionBandHash.question_id.not_in(select(Question.id))))
+
+    unindexed = Question.id.not_in(select(QuestionBandHash.question_id))
+    if _uses_fts():
+        unindexed |= Question.id.not_in(select(literal_column("rowid")).select_from(table("question_fts")))
+    rows = connection.execute(
+        select(Question.id, Question.question_text, Question.options).where(unindexed)
+    ).all()
+    if rows:
+        _unindex_questions(connection, [row.id for row in rows])
+        _index_questions(connection, rows)
+    db.session.commit()
+
+
+def ensure_speech_columns():
+    """
+    Add the speech columns to a question table created before they existed
+    and render them for the rows saved without them
+    """
+    columns = {column["name"] for column in inspect(db.engine).get_columns(Question.__tablename__)}
+    for column in (Question.speech_text, Question.speech_options):
+        if column.name not in columns:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f"ALTER TABLE {Question.__tablename__} ADD COLUMN {column.name} {column_type}"))
+    db.session.commit()
+
+    for question in Question.query.filter(Question.speech_text.is_(None)):
+        render_question_speech(question)
+    db.session.commit()
+
+
+def _index_questions(connection, questions):
+    """Add (id, question_text, options) rows to the full-text and duplicate indexes"""
+    bands = [
+        {"question_id": question_id, "band": band, "bucket": bucket}
+        for question_id, question_text, options in questions
+        for band, bucket in minhash_bands(question_shingles(question_text, options or []))
+    ]
+    if bands:
+        connection.execute(QuestionBandHash.__table__.insert(), bands)
+    if _uses_fts(connection) and questions:
+        connection.execute(
+            text("INSERT INTO question_fts(rowid, question_text, options_text) VALUES (:id, :q, :o)"),
+            [{"id": question_id, "q": question_text, "o": " ".join(options or [])}
+             for question_id, question_text, options in questions],
+        )
+
+
+def _unindex_questions(connection, question_ids):
+    """Remove questions from the full-text and duplicate indexes"""
+    connection.execute(delete(QuestionBandHash).where(QuestionBandHash.question_id.in_(question_ids)))
+    if _uses_fts(connection):
+        connection.execute(
+            text("DELETE FROM question_fts WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(question_ids)},
+        )
+
+
+def _text_changed(question):
+    attrs = inspect(question).attrs
+    return attrs.question_text.history.has_changes() or attrs.options.history.has_changes()
+
+
+@event.listens_for(Session, 'before_flush')
+def _unindex_removed_questions(session, flush_context, instances):
+    """Drop deleted and edited questions from the indexes before their rows change"""
+    removed = [question.id for question in session.deleted if isinstance(question, Question) and question.id]
+    edited = [question for question in session.dirty
+              if isinstance(question, Question) and question.id and _text_changed(question)]
+    if removed or edited:
+        _unindex_questions(session.connection(), removed + [question.id for question in edited])
+    if edited:
+        session.info.setdefault('reindexed_questions', []).extend(edited)
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_written_questions(session, flush_context):
+    """Index questions inserted by this flush and those edited before it"""
+    questions = [question for question in session.new if isinstance(question, Question)]
+    questions += session.info.pop('reindexed_questions', [])
+    if questions:
+        _index_questions(session.connection(), [
+            (question.id, question.question_text, question.options) for question in questions
+        ])
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_reindexed_questions(session, previous_transaction):
+    session.info.pop('reindexed_questions', None)
+
+
+def find_near_duplicates(questions, threshold=DUPLICATE_SIMILARITY_THRESHOLD, chunk_size=DUPLICATE_LOOKUP_CHUNK_SIZE):
+    """
+    Look up extracted questions (API dicts) in the bank
+    Looks the LSH buckets of the whole batch up in queries of chunk_size
+    pairs, then verifies candidates with exact shingle Jaccard similarity
+    Returns: list aligned with questions, each None or
+    {"questionId", "examId", "similarity"} for the closest bank match
+    """
+    shingle_sets = [question_shingles(q.get("question", ""), q.get("options", [])) for q in questions]
+    band_sets = [minhash_bands(shingles) for shingles in shingle_sets]
+
+    all_bands = {band for bands in band_sets for band in bands}
+    if not all_bands:
+        return [None] * len(questions)
+
+    bucket_hits = {}
+    all_bands = sorted(all_bands)
+    for start in range(0, len(all_bands), chunk_size):
+        chunk = all_bands[start:start + chunk_size]
+        rows = db.session.query(QuestionBandHash.band, QuestionBandHash.bucket, QuestionBandHash.question_id) \
+            .filter(tuple_(QuestionBandHash.band, QuestionBandHash.bucket).in_(chunk))
+        for band, bucket, question_id in rows:
+            bucket_hits.setdefault((band, bucket), set()).add(question_id)
+
+    candidate_ids = sorted(set().union(*bucket_hits.values())) if bucket_hits else []
+    candidates = {}
+    for start in range(0, len(candidate_ids), chunk_size):
+        chunk = candidate_ids[start:start + chunk_size]
+        for question in Question.query.filter(Question.id.in_(chunk)):
+            candidates[question.id] = (
+                question.exam_id,
+                question_shingles(question.question_text, question.options or []),
+            )
+
+    matches = []
+    for shingles, bands in zip(shingle_sets, band_sets):
+        best = None
+        for candidate_id in set().union(*(bucket_hits.get(band, set()) for band in bands)):
+            # Band rows can outlive a question deleted outside the ORM
+            if candidate_id not in candidates:
+                continue
+            exam_id, candidate_shingles = candidates[candidate_id]
+            similarity = _jaccard(shingles, candidate_shingles)
+            if similarity >= threshold and (best is None or similarity > best["similarity"]):
+                best = {"questionId": candidate_id, "examId": exam_id, "similarity": round(similarity, 3)}
+        matches.append(best)
+    return matches
+
+
+def search_questions(query, limit=20):
+    """Full-text search over the bank; returns Question rows, best match first"""
+    tokens = _TOKEN_PATTERN.findall(query.lower())
+    if not tokens:
+        return []
+
+    if not _uses_fts():
+        like = Question.query
+        for token in tokens:
+            like = like.filter(func.lower(Question.question_text).contains(token))
+        return like.limit(limit).all()
+
+    # Quote every token so user input cannot inject FTS5 query syntax
+    match_expr = " ".join(f'"{token}"' for token in tokens)
+    ids = [row[0] for row in db.session.execute(
+        text("SELECT rowid FROM question_fts WHERE question_fts MATCH :match ORDER BY bm25(question_fts) LIMIT :limit"),
+        {"match": match_expr, "limit": limit},
+    )]
+    by_id = {question.id: question for question in Question.query.filter(Question.id.in_(ids)).all()}
+    return [by_id[question_id] for question_id in ids if question_id in by_id]
+
+
+def add_questions_to_bank(questions, exam_id=None, exam_title=None):
+    """
+    Save reviewed questions (API dicts) under an exam and index them
+    Returns: (exam, saved Question rows)
+    """
+    exam = db.session.get(Exam, exam_id) if exam_id else None
+    if exam is None:
+        exam = Exam(title=exam_title or "Untitled Exam")
+        db.session.add(exam)
+        db.session.flush()
+
+    saved = []
+    for q in questions:
+        question = Question(
+            exam_id=exam.id,
+            question_text=q["question"],
+            options=q.get("options", []),
+            correct_answer=q.get("correctAnswer", ""),
+            question_type=q.get("type", "multiple-choice"),
+        )
+        render_question_speech(question)
+        db.session.add(question)
+        saved.append(question)
+    # Indexed for search and duplicates as they are flushed
+    db.session.commit()
+    return exam, saved
+
+
+def serialize_question(question):
+    return {
+        "id": question.id,
+        "examId": question.exam_id,
+        "question": question.question_text,
+        "options": question.options,
+        "correctAnswer": question.correct_answer,
+        "type": question.question_type,
+        "speechText": question.speech_text,
+        "speechOptions": question.speech_options,
+    }
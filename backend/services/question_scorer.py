@@ -0,0 +1,123 @@
+"""
+Batch question-likelihood scorer for candidate paragraphs
+All candidates are turned into hashed word n-gram features in one pass and
+scored together by a logistic model. The weights are trained offline on a
+labelled corpus (python -m train_question_scorer) and loaded from
+QUESTION_SCORER_WEIGHTS; without that file there is no scorer and callers
+keep using the is_question_text rules
+"""
+import logging
+import os
+import re
+import threading
+import zlib
+
+from config import QUESTION_SCORER_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|\?")
+# Leading words carry most of the signal; long paragraphs are cut here
+_MAX_TOKENS = 64
+
+_scorer = None
+_scorer_loaded = False
+_scorer_lock = threading.Lock()
+
+
+def text_features(text):
+    """Feature strings of a paragraph: words, word bigrams, its first word and how it ends"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())[:_MAX_TOKENS]
+    features = {f"w:{token}" for token in tokens}
+    features.update(f"b:{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    if tokens:
+        features.add(f"first:{tokens[0]}")
+    features.add("end:?" if text.rstrip().endswith("?") else "end:other")
+    return features
+
+
+def hashed_features(texts, dim, np):
+    """
+    Sparse hashed feature matrix of texts, built in one pass
+    Returns: (rows, cols) index arrays of its non-zero entries
+    """
+    rows = []
+    cols = []
+    for row, text in enumerate(texts):
+        hashed = {zlib.crc32(feature.encode()) % dim for feature in text_features(text)}
+        rows.extend([row] * len(hashed))
+        cols.extend(hashed)
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+
+def _row_scale(rows, count, np):
+    """Value of every feature of a row: 1/sqrt(number of its features)"""
+    sizes = np.bincount(rows, minlength=count)
+    return 1 / np.sqrt(np.maximum(sizes, 1))
+
+
+class QuestionScorer:
+    """Logistic model over hashed n-gram features"""
+
+    def __init__(self, weights, bias):
+        self.weights = weights
+        self.bias = float(bias)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["weights"].astype(np.float64), data["bias"])
+
+    def save(self, path):
+        import numpy as np
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, weights=self.weights.astype(np.float32), bias=np.float64(self.bias))
+
+    def probabilities(self, texts):
+        """Probability that each text is a question, as a NumPy array aligned with texts"""
+        import numpy as np
+
+        rows, cols = hashed_features(texts, len(self.weights), np)
+        scale = _row_scale(rows, len(texts), np)
+        logits = np.bincount(rows, weights=self.weights[cols] * scale[rows], minlength=len(texts)) + self.bias
+        return 1 / (1 + np.exp(-logits))
+
+
+def train_question_scorer(texts, labels, dim=1 << 16, epochs=300, learning_rate=2.0, l2=1e-4):
+    """
+    Fit a QuestionScorer to labelled paragraphs (label 1 = question) with
+    full-batch gradient descent on the logistic loss
+    """
+    import numpy as np
+
+    labels = np.asarray(labels, dtype=np.float64)
+    rows, cols = hashed_features(texts, dim, np)
+    values = _row_scale(rows, len(texts), np)[rows]
+    weights = np.zeros(dim)
+    bias = 0.0
+    for _ in range(epochs):
+        logits = np.bincount(rows, weights=weights[cols] * values, minlength=len(texts)) + bias
+        errors = 1 / (1 + np.exp(-logits)) - labels
+        gradient = np.bincount(cols, weights=errors[rows] * values, minlength=dim) / len(texts)
+        weights -= learning_rate * (gradient + l2 * weights)
+        bias -= learning_rate * errors.mean()
+    return QuestionScorer(weights, bias)
+
+
+def load_question_scorer():
+    """The scorer trained for this deployment, or None if no weights are installed"""
+    global _scorer, _scorer_loaded
+    with _scorer_lock:
+        if not _scorer_loaded:
+            _scorer_loaded = True
+            if os.path.exists(QUESTION_SCORER_WEIGHTS):
+                try:
+                    _scorer = QuestionScorer.load(QUESTION_SCORER_WEIGHTS)
+                    logger.info("Loaded question scorer with %d features", len(_scorer.weights))
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning("Could not load question scorer weights %s: %s", QUESTION_SCORER_WEIGHTS, e)
+        return _scorer
@@ -1,158 +1,325 @@
 """
 Question PDF processing service with enhanced text extraction and code formatting
 """
+import hashlib
 import re
 import logging
-from .pdf_utils import extract_text_from_pdf, clean_pdf_text
+from config import QUESTION_SCORE_MARGIN
+from .pdf_utils import extract_page_texts, clean_pdf_text, clean_marked_pdf_text
+from .extraction_cache import load_extraction, save_extraction
+from .logging_setup import SAMPLED
+from .question_scorer import load_question_scorer
+from .parse_plans import parse_plans, PARAGRAPHS
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Handlers and levels come from logging_setup.configure_logging
 logger = logging.getLogger(__name__)
 
-def extract_questions_from_pdf(file):
+def extract_questions_from_pdf(file, profile="fast"):
     """
     Enhanced question extraction with better code block handling and question boundary detection
     Returns list of question dictionaries directly (new API format)
     """
     try:
-        text_content = extract_text_from_pdf(file)
+        text_content, code_lines = join_page_texts(extract_page_texts(file, profile=profile))
         
         if not text_content:
             logger.error("No text content extracted from PDF")
             return []
         
-        logger.info(f"Raw text length: {len(text_content)} characters")
+        return extract_questions_from_text(text_content, code_lines)
         
-        # Clean the text with comprehensive character mapping
-        cleaned_text = clean_pdf_text(text_content)
-        logger.info(f"Cleaned text length: {len(cleaned_text)} characters")
+    except Exception as e:
+        logger.exception("Error in question extraction: %s", e)
+        return []
+
+def extract_questions_incremental(file, previous_extraction_id=None, profile="fast"):
+    """
+    Extract questions from a (re-)uploaded PDF, laying out only the pages whose
+    content stream changed since the previous extraction of the same quiz
+    (pages are only reused when they were laid out with the same profile)
+    Returns: (questions, info) where info holds the new "extractionId" and the
+    1-based "changedPages"; with a known previous extraction every question
+    also gets a "changeStatus" of "new", "changed" or "unchanged". A PDF that
+    cannot be read gives ([], {}), as extract_questions_from_pdf gives []
+    """
+    try:
+        previous = load_extraction(previous_extraction_id)
+        reuse = None
+        if previous and previous.get("profile", "fast") == profile:
+            reuse = {page["hash"]: page for page in previous["pages"]}
+
+        pages = extract_page_texts(file, reuse=reuse, profile=profile)
+        text_content, code_lines = join_page_texts(pages)
+        if text_content:
+            questions = extract_questions_from_text(text_content, code_lines)
+        else:
+            logger.error("No text content extracted from PDF")
+            questions = []
+
+        info = {
+            "extractionId": save_extraction(pages, questions, profile),
+            "changedPages": [page_num for page_num, page in enumerate(pages, 1) if not page["reused"]],
+        }
+        logger.info("Re-extracted %d of %d pages", len(info['changedPages']), len(pages))
+
+        if previous:
+            mark_question_changes(questions, previous["questions"])
+        return questions, info
+
+    except Exception as e:
+        logger.exception("Error in question extraction: %s", e)
+        return [], {}
+
+def join_page_texts(pages):
+    """
+    Returns: (full text of the extracted pages, set of their marked code lines)
+    """
+    text_content = "\n".join(page["text"] for page in pages if page["text"]).strip()
+    code_lines = {line for page in pages for line in page.get("code_lines", ())}
+    return text_content, code_lines
+
+def mark_question_changes(questions, previous_questions):
+    """
+    Tag each question with "changeStatus" relative to the previous extraction:
+    unchanged (identical question found), changed (same stem with new options or
+    answer, or a replacement at the same position) or new
+    """
+    def question_key(q):
+        return (q["question"], tuple(q["options"]), q["correctAnswer"])
+
+    previous_keys = [question_key(q) for q in previous_questions]
+    previous_key_set = set(previous_keys)
+    previous_stems = {q["question"] for q in previous_questions}
+    current_keys = {question_key(q) for q in questions}
+
+    for index, question in enumerate(questions):
+        key = question_key(question)
+        if key in previous_key_set:
+            question["changeStatus"] = "unchanged"
+        elif question["question"] in previous_stems:
+            question["changeStatus"] = "changed"
+        elif index < len(previous_keys) and previous_keys[index] not in current_keys:
+            question["changeStatus"] = "changed"
+        else:
+            question["changeStatus"] = "new"
+
+# Question segmentation patterns, in priority order; the first one that yields
+# valid questions is used
+_QUESTION_PATTERNS = [re.compile(pattern, re.DOTALL | re.IGNORECASE) for pattern in (
+    # Pattern 1: Numbered questions with parentheses - 1) 2) 3) 4) (highest priority for your new format)
+    r'(?:^|\n)\s*(\d+)\)\s*(.+?)(?=(?:^|\n)\s*\d+\)|$)',
+
+    # Pattern 2: Numbered questions with dots - 1. 2. 3. 4. (previous format)
+    r'(?:^|\n)\s*(\d+)\.\s*(.+?)(?=(?:^|\n)\s*\d+\.|$)',
+
+    # Pattern 3: Explicit question numbering 
+    r'(?:^|\n)\s*(?:Q\.?|Question|Problem)\s*\d+[\.\):]\s*(.+?)(?=(?:^|\n)\s*(?:Q\.?|Question|Problem)\s*\d+[\.\):]|(?:^|\n)\s*(?:A\.?|Answer|Solution)\s*\d+|$)',
+
+    # Pattern 4: Simple numbering with flexible spacing (fallback)
+    r'(?:^|\n)\s*(\d+)[\.\)]\s*(.+?)(?=(?:^|\n)\s*\d+[\.\)]|$)',
+
+    # Pattern 5: Question-like sentences (lower priority)
+    r'(?:^|\n)\s*([A-Z][\w\s]{10,}(?:below|following|code|program|output|result)[\w\s]*\?)(?=(?:^|\n)|$)',
+)]
+
+# Question numbering and option markers at line starts, and "Answer:" labels
+# anywhere, found in one scan to fingerprint a document's template
+_FORMAT_STYLE_PATTERN = re.compile(
+    r'^[ \t]*(?:(?P<number>(?:Q\.?|Question|Problem)\s*\d+[.):]|\d+[.)])|(?P<option>[A-D][.)]))'
+    r'|(?P<answer>answer:)\s*(?P<answer_letter>[A-D])?(?P<answer_sign>[.)])?',
+    re.IGNORECASE | re.MULTILINE
+)
+
+def format_fingerprint(text):
+    """
+    Template hash of a document's question format: every question numbering,
+    option marker and answer label style found in it ("9)", "q9.", "A)",
+    "a.", "Answer: A)" ...)
+    Returns: (fingerprint, predicted (questions, options)), predicting one
+    question per answer label and one option per option marker
+    """
+    styles = set()
+    answers = 0
+    options = 0
+    for match in _FORMAT_STYLE_PATTERN.finditer(text):
+        if match.group('number'):
+            styles.add(re.sub(r'\s*\d+', '9', match.group('number').lower()))
+        elif match.group('option'):
+            options += 1
+            option = match.group('option')
+            styles.add(('A' if option[0].isupper() else 'a') + option[1])
+        else:
+            answers += 1
+            letter = match.group('answer_letter')
+            if letter:
+                letter = 'A' if letter.isupper() else 'a'
+            styles.add('answer:' + (letter or '') + (match.group('answer_sign') or ''))
+    fingerprint = hashlib.sha1('|'.join(sorted(styles)).encode()).hexdigest()[:16]
+    return fingerprint, (answers, options)
+
+def _parse_counts(questions):
+    return len(questions), sum(len(question["options"]) for question in questions)
+
+def _answer_text(correct_answer_letter, options):
+    """Map the answer letter to the actual option text"""
+    if correct_answer_letter and len(options) >= 4:
+        # Map A->0, B->1, C->2, D->3
+        answer_index_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+        if correct_answer_letter.upper() in answer_index_map:
+            index = answer_index_map[correct_answer_letter.upper()]
+            if index < len(options):
+                return options[index]
+    return ""
+
+def _build_question(block, code_lines):
+    """Question dict from a question block"""
+    # Better code block extraction and preservation
+    formatted_question = format_question_with_code(block, code_lines)
+
+    # Extract options and clean question text
+    clean_question_text, options, correct_answer_letter = parse_question_parts(formatted_question, code_lines)
+    correct_answer_text = _answer_text(correct_answer_letter, options)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Added question with %d options, correct answer: %s -> '%s...': %s...",
+                     len(options), correct_answer_letter, correct_answer_text[:30], clean_question_text[:100],
+                     extra=SAMPLED)
+
+    # Create question object in expected format
+    return {
+        "question": clean_question_text,
+        "options": options,
+        "correctAnswer": correct_answer_text,
+        "type": "multiple-choice"
+    }
+
+def _pattern_questions(cleaned_text, pattern_index, code_lines):
+    """Questions found by one segmentation pattern"""
+    questions = []
+    matches = _QUESTION_PATTERNS[pattern_index].findall(cleaned_text)
+    if matches:
+        logger.debug("Pattern %d found %d questions", pattern_index + 1, len(matches))
+
+    for match in matches:
+        # Handle different match formats (tuple vs string)
+        if isinstance(match, tuple):
+            if len(match) >= 2 and match[0].isdigit():
+                # Format: (number, question) from Pattern 2
+                question_text = match[1].strip()
+            else:
+                # Take the longest non-empty element
+                question_text = max((m for m in match if m.strip()), key=len, default='').strip()
+        else:
+            question_text = match.strip()
+
+        # Skip if too short or likely not a question
+        if len(question_text) < 10:
+            continue
+
+        # Enhanced question validation
+        if is_question_text(question_text):
+            questions.append(_build_question(question_text, code_lines))
+    return questions
+
+def question_paragraphs(candidates):
+    """
+    Candidates that read as questions, in their order
+    With a trained question scorer all candidates are scored in one batch and
+    only the unsure ones go through is_question_text; without one every
+    candidate does
+    """
+    scorer = load_question_scorer()
+    if scorer is None or not candidates:
+        return [para for para in candidates if is_question_text(para)]
+
+    probabilities = scorer.probabilities(candidates)
+    return [
+        para for para, probability in zip(candidates, probabilities)
+        if probability >= 0.5 + QUESTION_SCORE_MARGIN
+        or (probability > 0.5 - QUESTION_SCORE_MARGIN and is_question_text(para))
+    ]
+
+def _paragraph_questions(cleaned_text, code_lines):
+    """Fallback: split by double newlines and look for question-like content"""
+    paragraphs = [p.strip() for p in cleaned_text.split('\n\n') if p.strip()]
+    return [
+        _build_question(para, code_lines)
+        for para in question_paragraphs([para for para in paragraphs if len(para) > 20])
+    ]
+
+def _cascade_questions(cleaned_text, code_lines):
+    """
+    Questions of the first segmentation pattern that finds valid ones, else
+    of the paragraph fallback
+    Returns: (pattern index or PARAGRAPHS, questions)
+    """
+    for pattern_index in range(len(_QUESTION_PATTERNS)):
+        questions = _pattern_questions(cleaned_text, pattern_index, code_lines)
+        if questions:
+            return pattern_index, questions  # Use first pattern that finds valid questions
+
+    logger.info("No pattern matches, trying paragraph-based extraction")
+    return PARAGRAPHS, _paragraph_questions(cleaned_text, code_lines)
+
+def extract_questions_from_text(text_content, code_lines=None):
+    """
+    Parse questions out of already extracted PDF text
+    code_lines: stripped lines the layout pass marked as code; without them
+    code is recognised by keyword heuristics
+    Returns list of question dictionaries
+    """
+    try:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        logger.debug("Raw text length: %d characters", len(text_content))
         
+        # Clean the text with comprehensive character mapping
+        if code_lines is None:
+            cleaned_text = clean_pdf_text(text_content)
+        else:
+            cleaned_text, code_lines = clean_marked_pdf_text(text_content, code_lines)
+            code_lines = set(code_lines)
+        logger.debug("Cleaned text length: %d characters", len(cleaned_text))
+
         # Debug: Log a sample of the text to see structure
-        logger.info(f"Text sample (first 1000 chars): {cleaned_text[:1000]}")
-        logger.info(f"Text sample (last 1000 chars): {cleaned_text[-1000:]}")
-        
-        # Split into potential questions using improved patterns
-        questions = []
-        
-        # Enhanced question detection patterns with priority order
-        question_patterns = [
-            # Pattern 1: Numbered questions with parentheses - 1) 2) 3) 4) (highest priority for your new format)
-            r'(?:^|\n)\s*(\d+)\)\s*(.+?)(?=(?:^|\n)\s*\d+\)|$)',
-            
-            # Pattern 2: Numbered questions with dots - 1. 2. 3. 4. (previous format)
-            r'(?:^|\n)\s*(\d+)\.\s*(.+?)(?=(?:^|\n)\s*\d+\.|$)',
-            
-            # Pattern 3: Explicit question numbering 
-            r'(?:^|\n)\s*(?:Q\.?|Question|Problem)\s*\d+[\.\):]\s*(.+?)(?=(?:^|\n)\s*(?:Q\.?|Question|Problem)\s*\d+[\.\):]|(?:^|\n)\s*(?:A\.?|Answer|Solution)\s*\d+|$)',
-            
-            # Pattern 4: Simple numbering with flexible spacing (fallback)
-            r'(?:^|\n)\s*(\d+)[\.\)]\s*(.+?)(?=(?:^|\n)\s*\d+[\.\)]|$)',
-            
-            # Pattern 5: Question-like sentences (lower priority)
-            r'(?:^|\n)\s*([A-Z][\w\s]{10,}(?:below|following|code|program|output|result)[\w\s]*\?)(?=(?:^|\n)|$)',
-        ]
-        
-        # Try each pattern with priority
-        for i, pattern in enumerate(question_patterns):
-            matches = re.findall(pattern, cleaned_text, re.DOTALL | re.IGNORECASE)
-            if matches:
-                logger.info(f"Pattern {i+1} found {len(matches)} questions")
-                
-                for match in matches:
-                    # Handle different match formats (tuple vs string)
-                    if isinstance(match, tuple):
-                        if len(match) >= 2 and match[0].isdigit():
-                            # Format: (number, question) from Pattern 2
-                            question_text = match[1].strip()
-                        else:
-                            # Take the longest non-empty element
-                            question_text = max((m for m in match if m.strip()), key=len, default='').strip()
-                    else:
-                        question_text = match.strip()
-                    
-                    # Skip if too short or likely not a question
-                    if len(question_text) < 10:
-                        continue
-                    
-                    # Enhanced question validation
-                    if is_question_text(question_text):
-                        # Better code block extraction and preservation
-                        formatted_question = format_question_with_code(question_text)
-                        
-                        # Extract options and clean question text
-                        options = extract_options_from_text(formatted_question)
-                        correct_answer_letter = extract_correct_answer_from_text(formatted_question)
-                        clean_question_text = separate_question_from_options(formatted_question, options)
-                        
-                        # Map the answer letter to the actual option text
-                        correct_answer_text = ""
-                        if correct_answer_letter and len(options) >= 4:
-                            # Map A->0, B->1, C->2, D->3
-                            answer_index_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-                            if correct_answer_letter.upper() in answer_index_map:
-                                index = answer_index_map[correct_answer_letter.upper()]
-                                if index < len(options):
-                                    correct_answer_text = options[index]
-                        
-                        # Create question object in expected format
-                        question_obj = {
-                            "question": clean_question_text,
-                            "options": options,
-                            "correctAnswer": correct_answer_text,
-                            "type": "multiple-choice"
-                        }
-                        questions.append(question_obj)
-                        logger.info(f"Added question with {len(options)} options, correct answer: {correct_answer_letter} -> '{correct_answer_text[:30]}...': {clean_question_text[:100]}...")
-                
-                if questions:
-                    break  # Use first pattern that finds valid questions
-        
-        # Fallback: Split by double newlines and look for question-like content
-        if not questions:
-            logger.info("No pattern matches, trying paragraph-based extraction")
-            paragraphs = [p.strip() for p in cleaned_text.split('\n\n') if p.strip()]
-            
-            for para in paragraphs:
-                if len(para) > 20 and is_question_text(para):
-                    formatted_question = format_question_with_code(para)
-                    
-                    # Extract options and clean question text
-                    options = extract_options_from_text(formatted_question)
-                    correct_answer_letter = extract_correct_answer_from_text(formatted_question)
-                    clean_question_text = separate_question_from_options(formatted_question, options)
-                    
-                    # Map the answer letter to the actual option text
-                    correct_answer_text = ""
-                    if correct_answer_letter and len(options) >= 4:
-                        # Map A->0, B->1, C->2, D->3
-                        answer_index_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-                        if correct_answer_letter.upper() in answer_index_map:
-                            index = answer_index_map[correct_answer_letter.upper()]
-                            if index < len(options):
-                                correct_answer_text = options[index]
-                    
-                    question_obj = {
-                        "question": clean_question_text,
-                        "options": options,
-                        "correctAnswer": correct_answer_text,
-                        "type": "multiple-choice"
-                    }
-                    questions.append(question_obj)
-                    logger.info(f"Added paragraph question with {len(options)} options, correct answer: {correct_answer_letter} -> '{correct_answer_text[:30]}...': {clean_question_text[:100]}...")
+        if debug:
+            logger.debug("Text sample (first 1000 chars): %s", cleaned_text[:1000])
+            logger.debug("Text sample (last 1000 chars): %s", cleaned_text[-1000:])
+
+        # A template seen before runs the segmentation it was parsed with; when
+        # that finds other counts than predicted, the cascade decides
+        fingerprint, predicted = format_fingerprint(cleaned_text)
+        plan = parse_plans.get(fingerprint)
+        questions = None
+        if plan is not None:
+            if plan == PARAGRAPHS:
+                questions = _paragraph_questions(cleaned_text, code_lines)
+            else:
+                questions = _pattern_questions(cleaned_text, plan, code_lines)
+            if not questions or _parse_counts(questions) != predicted:
+                logger.debug("Template %s: plan %s found %s questions/options, expected %s",
+                             fingerprint, plan, _parse_counts(questions), predicted)
+                parse_plans.forget(fingerprint)
+                questions = None
+
+        if questions is None:
+            plan, questions = _cascade_questions(cleaned_text, code_lines)
+            # Only templates whose counts the fingerprint predicts get a plan
+            if questions and _parse_counts(questions) == predicted:
+                parse_plans.remember(fingerprint, plan)
         
         # Validate and clean up questions
         validated_questions = validate_extracted_questions(questions)
         
-        logger.info(f"Successfully extracted {len(validated_questions)} questions")
+        logger.info("Successfully extracted %d questions", len(validated_questions))
         return validated_questions
         
     except Exception as e:
-        logger.error(f"Error in question extraction: {str(e)}")
+        logger.exception("Error in question extraction: %s", e)
         return []
 
-def format_question_with_code(question_text):
+def format_question_with_code(question_text, code_lines=None):
     """Format question text preserving code blocks with proper structure - Multi-language support"""
-    import re
+    if code_lines is not None:
+        return _format_marked_code(question_text, code_lines)
     
     # Identify and preserve code blocks
     lines = question_text.split('\n')
@@ -242,6 +409,28 @@ def format_question_with_code(question_text):
     
     return formatted_text.strip()
 
+def _format_marked_code(question_text, code_lines):
+    """format_question_with_code using the layout pass's code marks"""
+    formatted_lines = []
+    in_code_block = False
+    for line in question_text.split('\n'):
+        stripped = line.strip()
+        if stripped and stripped in code_lines:
+            # Blank line around each code block, indentation kept as laid out
+            if not in_code_block and formatted_lines and formatted_lines[-1]:
+                formatted_lines.append('')
+            in_code_block = True
+            formatted_lines.append(line.rstrip())
+            continue
+        if in_code_block:
+            formatted_lines.append('')
+            in_code_block = False
+        if stripped:
+            formatted_lines.append(stripped)
+    
+    formatted_text = re.sub(r'\n{3,}', '\n\n', '\n'.join(formatted_lines))
+    return formatted_text.strip('\n').rstrip()
+
 def is_question_text(text):
     """
     Enhanced question detection with multi-language programming support
@@ -365,131 +554,201 @@ def is_question_text(text):
     
     return False
 
-def extract_options_from_text(question_text):
-    """Extract answer options from question text if present"""
-    options = []
+# Line-start option markers ("A)", "b.") and "Answer:" labels, found in one scan.
+# The lookahead records the answer letter without consuming a marker that follows it.
+_QUESTION_TOKEN_PATTERN = re.compile(
+    r'^\s*(?P<letter>[A-D])(?P<sign>[.)])'
+    r'|answer:(?=\s*(?:(?P<answer_letter>[A-D])(?P<answer_sign>[.)])?)?)',
+    re.IGNORECASE | re.MULTILINE
+)
+
+_WHITESPACE_RUN = re.compile(r'\s*')
+
+# Inline option formats, only tried when the block has fewer than two
+# line-start "A)" options
+_INLINE_OPTION_PATTERNS = [re.compile(pattern, re.IGNORECASE | re.MULTILINE | re.DOTALL) for pattern in (
+    # More flexible A) pattern
+    r'([A-D])\)\s*([^A-D\)]+?)(?=\s*[A-D]\)|Answer:|$)',
     
-    # Multiple patterns to catch different option formats
-    option_patterns = [
-        # Pattern 1: Uppercase letters with parentheses - A) B) C) D) (for your current format)
-        r'(?:^|\n)\s*([A-D])\)\s*([^\n\r]+?)(?=\s*(?:^|\n)\s*[A-D]\)|Answer:|$)',
-        
-        # Pattern 2: More flexible A) pattern
-        r'([A-D])\)\s*([^A-D\)]+?)(?=\s*[A-D]\)|Answer:|$)',
-        
-        # Pattern 3: Uppercase letters with dots - A. B. C. D. 
-        r'(?:^|\n)\s*([A-D])\.\s*([^\n\r]+?)(?=\s*(?:^|\n)\s*[A-D]\.|Answer:|$)',
-        
-        # Pattern 4: Find all A. B. C. D. options in sequence
-        r'([A-D])\.\s*([^A-D\n]+?)(?=\s*[A-D]\.|Answer:|$)',
-        
-        # Pattern 5: Lowercase letters with parentheses - a) b) c) d)
-        r'([a-d])\)\s*([^\n\r]+?)(?=\s*[a-d]\)|Answer:|$)',
-    ]
+    # Uppercase letters with dots - A. B. C. D. 
+    r'(?:^|\n)\s*([A-D])\.\s*([^\n\r]+?)(?=\s*(?:^|\n)\s*[A-D]\.|Answer:|$)',
     
-    # Try each pattern
-    for i, pattern in enumerate(option_patterns):
-        matches = re.findall(pattern, question_text, re.IGNORECASE | re.MULTILINE | re.DOTALL)
-        
-        if matches and len(matches) >= 2:
-            # Clean up matches and filter out empty ones
-            clean_options = []
-            for match in matches:
-                if len(match) == 2:  # (letter, text) tuple
-                    letter, text = match
-                    cleaned = text.strip()
-                else:
-                    cleaned = match.strip() if isinstance(match, str) else str(match).strip()
-                
-                # Remove newlines within the option and normalize whitespace
-                cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-                
-                # Remove trailing punctuation and clean up
-                cleaned = re.sub(r'[,\s]*$', '', cleaned)
-                
-                # Must have actual content - be more lenient for short options like "Au", "K2"
-                if cleaned and len(cleaned) >= 1:  # Changed from > 2 to >= 1
-                    clean_options.append(cleaned)
-            
-            # Only accept if we have at least 2 valid options (preferably 4 for MCQ)
-            if len(clean_options) >= 2:
-                options = clean_options[:4]  # Limit to 4 options max
-                logger.info(f"Pattern {i+1} extracted {len(options)} options: {[opt[:30] + '...' if len(opt) > 30 else opt for opt in options]}")
-                break
+    # Find all A. B. C. D. options in sequence
+    r'([A-D])\.\s*([^A-D\n]+?)(?=\s*[A-D]\.|Answer:|$)',
     
-    return options
+    # Lowercase letters with parentheses - a) b) c) d)
+    r'([a-d])\)\s*([^\n\r]+?)(?=\s*[a-d]\)|Answer:|$)',
+)]
+
+def tokenize_question(question_text):
+    """
+    Scan a question block once for option markers and answer labels
+    Returns dict with:
+      "markers": [(letter_pos, sign)] for options starting a line ("A)" / "a.")
+      "answers": [(pos, letter, sign)] for every "Answer:" label
+    """
+    markers = []
+    answers = []
+    for match in _QUESTION_TOKEN_PATTERN.finditer(question_text):
+        if match.group('letter'):
+            markers.append((match.start('letter'), match.group('sign')))
+        else:
+            answers.append((match.start(), match.group('answer_letter'), match.group('answer_sign')))
+    return {"markers": markers, "answers": answers}
+
+def _line_end(text, pos):
+    """Index of the next line break (\\n or \\r) at or after pos"""
+    newline = text.find('\n', pos)
+    carriage = text.find('\r', pos)
+    if newline == -1:
+        return carriage if carriage != -1 else len(text)
+    return newline if carriage == -1 else min(newline, carriage)
+
+def _starts_new_line(text, letter_pos, resume):
+    """True if a newline separates the marker at letter_pos from already consumed text"""
+    newline = text.rfind('\n', 0, letter_pos)
+    return newline >= resume if newline != -1 else resume == 0
+
+def _clean_option(text):
+    # Collapse whitespace and drop trailing commas
+    return ' '.join(text.split()).rstrip(', ')
+
+def _line_start_paren_options(text, tokens):
+    """
+    Options from line-start "A)" markers: each runs to the end of its line or to an
+    "Answer:" label; a marker with nothing after it on its line takes the next line
+    Returns: (number of markers matched, cleaned non-empty options, offset of the first marker)
+    """
+    answer_positions = [pos for pos, _, _ in tokens["answers"]]
+    length = len(text)
+    resume = 0
+    matched = 0
+    options = []
+    first = length
+
+    for letter_pos, sign in tokens["markers"]:
+        if sign != ')' or not _starts_new_line(text, letter_pos, resume):
+            continue
+
+        start = _WHITESPACE_RUN.match(text, letter_pos + 2).end()
+        if start == length:
+            # Only whitespace left; a space or tab ending a line still counts as an (empty) option
+            if any(line.rsplit('\r', 1)[-1] for line in text[letter_pos + 2:].split('\n')):
+                matched += 1
+                first = min(first, letter_pos)
+            break
+
+        stop = _line_end(text, start)
+        end = next((pos for pos in answer_positions if start < pos < stop), None)
+        if end is None:
+            if stop < length and text[stop] == '\r':
+                # A bare \r only ends an option when another "A)" line follows it
+                after = _WHITESPACE_RUN.match(text, stop).end()
+                followed_by_option = (
+                    '\n' in text[stop:after] and after + 1 < length
+                    and text[after] in 'ABCDabcd' and text[after + 1] == ')'
+                )
+                if not followed_by_option:
+                    continue
+            end = stop
+
+        matched += 1
+        first = min(first, letter_pos)
+        cleaned = _clean_option(text[start:end])
+        if cleaned:
+            options.append(cleaned)
+        resume = end
+
+    return matched, options, first
+
+def _inline_options(text):
+    """
+    Fallback for options written inline or with "A." markers
+    Returns: (pattern number, cleaned options, offset of the first match)
+    """
+    for i, pattern in enumerate(_INLINE_OPTION_PATTERNS, 2):
+        matches = list(pattern.finditer(text))
+        if len(matches) < 2:
+            continue
+        clean_options = [cleaned for cleaned in (_clean_option(match.group(2)) for match in matches) if cleaned]
+        if len(clean_options) >= 2:
+            return i, clean_options, matches[0].start()
+    return None, [], len(text)
+
+def _options_from_tokens(question_text, tokens):
+    """Returns: (options, offset where the options start, or the text length if there are none)"""
+    matched, options, start = _line_start_paren_options(question_text, tokens)
+    pattern_number = 1
+    if matched < 2 or len(options) < 2:
+        pattern_number, options, start = _inline_options(question_text)
+
+    options = options[:4]  # Limit to 4 options max
+    if options and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Pattern %d extracted %d options: %s", pattern_number, len(options),
+                     [opt[:30] + '...' if len(opt) > 30 else opt for opt in options], extra=SAMPLED)
+    return options, start
+
+def _answer_from_tokens(tokens):
+    # Prefer "Answer: B)", then "Answer: B.", then any "Answer: B"
+    for wanted_sign in (')', '.', None):
+        for _, letter, sign in tokens["answers"]:
+            if letter and (wanted_sign is None or sign == wanted_sign):
+                return letter.upper()
+    return ""
+
+def _answer_cut(text, tokens):
+    """Offset where the answer section starts (everything after it is dropped)"""
+    cut = len(text)
+    for wanted_sign in (')', '.', None):
+        for pos, letter, sign in tokens["answers"]:
+            if not letter or (wanted_sign is not None and sign != wanted_sign):
+                continue
+            letter_pos = _WHITESPACE_RUN.match(text, pos + len('answer:')).end()
+            # The whole label must survive earlier cuts
+            if letter_pos + (1 if wanted_sign is None else 2) <= cut:
+                cut = pos
+                break
+    return cut
+
+def _question_stem(question_text, tokens, options_start, code_lines=None):
+    """Question text before its options and answer section, one trimmed line per non-empty line"""
+    stem = question_text[:min(options_start, _answer_cut(question_text, tokens))]
+    lines = []
+    for line in stem.split('\n'):
+        stripped = line.strip()
+        if stripped:
+            # Marked code keeps its indentation
+            lines.append(line.rstrip() if code_lines and stripped in code_lines else stripped)
+    return '\n'.join(lines)
+
+def parse_question_parts(question_text, code_lines=None):
+    """
+    Split a formatted question block into its parts from a single token scan
+    code_lines: marked code lines whose indentation is kept in the question text
+    Returns: (clean question text, options, correct answer letter)
+    """
+    tokens = tokenize_question(question_text)
+    options, options_start = _options_from_tokens(question_text, tokens)
+    correct_letter = _answer_from_tokens(tokens)
+    if correct_letter:
+        logger.debug("Found correct answer: %s", correct_letter, extra=SAMPLED)
+    return _question_stem(question_text, tokens, options_start, code_lines), options, correct_letter
+
+def extract_options_from_text(question_text):
+    """Extract answer options from question text if present"""
+    return _options_from_tokens(question_text, tokenize_question(question_text))[0]
 
 def extract_correct_answer_from_text(question_text):
     """Extract the correct answer from question text if present"""
-    
-    # Patterns to find "Answer: X" where X is the correct option
-    answer_patterns = [
-        r'Answer:\s*([A-D])\)\s*[^A-D]*',  # Answer: A) some text (prioritize this format)
-        r'Answer:\s*([A-D])\)',           # Answer: A)
-        r'Answer:\s*([A-D])\.\s*[^A-D]*',  # Answer: A. some text
-        r'Answer:\s*([A-D])\s*[^A-D]*',    # Answer: A some text  
-        r'Answer:\s*([A-D])',             # Answer: A
-    ]
-    
-    for pattern in answer_patterns:
-        match = re.search(pattern, question_text, re.IGNORECASE)
-        if match:
-            correct_letter = match.group(1).upper()
-            logger.info(f"Found correct answer: {correct_letter}")
-            return correct_letter
-    
-    return ""
+    return _answer_from_tokens(tokenize_question(question_text))
 
 def separate_question_from_options(question_text, options):
     """
     Remove extracted options and answer from the question text to get clean question
     """
-    clean_question = question_text
-    
-    # Remove the answer section first (everything from "Answer:" to end)
-    answer_patterns = [
-        r'Answer:\s*[A-D]\).*$',     # Answer: A) explanation (prioritize this)
-        r'Answer:\s*[A-D]\..*$',     # Answer: A. explanation
-        r'Answer:\s*[A-D]\s*.*$',   # Answer: A explanation
-        r'Answer:\s*[A-D]$',        # Answer: A (at end)
-    ]
-    
-    for pattern in answer_patterns:
-        clean_question = re.sub(pattern, '', clean_question, flags=re.IGNORECASE | re.MULTILINE | re.DOTALL)
-    
-    # Remove all option lines - handle both A. and A) formats
-    # More aggressive approach: remove complete lines that start with option letters
-    option_line_patterns = [
-        r'(?:^|\n)\s*[A-D]\.\s*[^\n\r]*',   # Lines starting with A. B. C. D.
-        r'(?:^|\n)\s*[A-D]\)\s*[^\n\r]*',   # Lines starting with A) B) C) D)
-        r'(?:^|\n)\s*[a-d]\)\s*[^\n\r]*',   # Lines starting with a) b) c) d)
-    ]
-    
-    for pattern in option_line_patterns:
-        clean_question = re.sub(pattern, '', clean_question, flags=re.MULTILINE | re.IGNORECASE)
-    
-    # Also remove each individual option text if it still exists (fallback)
-    for option in options:
-        if option and len(option) > 3:  # Only remove substantial text to avoid removing single words
-            # Create pattern to match the option (escape special regex chars)
-            option_pattern = re.escape(option)
-            clean_question = re.sub(option_pattern, '', clean_question, flags=re.IGNORECASE)
-    
-    # Clean up extra whitespace and newlines
-    clean_question = re.sub(r'\n{3,}', '\n\n', clean_question)  # Limit consecutive newlines
-    clean_question = re.sub(r'[ \t]+\n', '\n', clean_question)  # Remove trailing spaces
-    clean_question = re.sub(r'\n[ \t]+', '\n', clean_question)  # Remove leading spaces
-    clean_question = re.sub(r'^\s+|\s+$', '', clean_question, flags=re.MULTILINE)  # Trim lines
-    
-    # Remove empty lines
-    lines = [line.strip() for line in clean_question.split('\n') if line.strip()]
-    clean_question = '\n'.join(lines)
-    
-    # Fix specific issues like truncated words
-    clean_question = re.sub(r'AN\d+', 'AND)', clean_question)  # Fix "AN4" -> "AND)"
-    clean_question = re.sub(r'OR\d+', 'OR)', clean_question)   # Fix "OR4" -> "OR)"
-    
-    return clean_question.strip()
+    tokens = tokenize_question(question_text)
+    options_start = _options_from_tokens(question_text, tokens)[1] if options else len(question_text)
+    return _question_stem(question_text, tokens, options_start)
 
 def validate_extracted_questions(questions):
     """
@@ -505,7 +764,7 @@ def validate_extracted_questions(questions):
         
         # Skip invalid questions
         if not question_text or len(question_text) < 10:
-            logger.warning(f"Skipping question {i}: Too short")
+            logger.debug("Skipping question %d: Too short", i, extra=SAMPLED)
             continue
         
         # Clean up the question structure
@@ -518,5 +777,5 @@ def validate_extracted_questions(questions):
         
         validated.append(clean_question)
     
-    logger.info(f"Validated {len(validated)} out of {len(questions)} questions")
+    logger.debug("Validated %d out of %d questions", len(validated), len(questions))
     return validated
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Response layer shared by both apps
+JSON is encoded with orjson when it is installed (the same sorted, compact
+documents Flask's default provider writes otherwise), and bodies of at least
+COMPRESSION_MIN_BYTES are brotli- or gzip-encoded for clients that accept
+it, streamed bodies included. Payloads served unchanged to many clients are
+kept in a PrecompressedCache with their encoded variants next to the plain
+document, so they are not compressed again per request
+"""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+from config import (
+    COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY,
+    PRECOMPRESSED_GZIP_LEVEL, PRECOMPRESSED_BROTLI_QUALITY, PRECOMPRESSED_CACHE_MAX_ENTRIES,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_COMPACT = {"separators": (",", ":")}
+_COMPRESSIBLE_TYPES = {"application/json", "text/plain", "text/html", "text/csv"}
+# Preferred first when the client weighs them equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson for compact output
+    Pretty-printed (debug) output, objects orjson cannot encode and
+    installs without orjson go through the stdlib encoder
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or (kwargs and kwargs != _COMPACT):
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(
+                obj,
+                default=self.default,
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            ).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+
+def negotiate_encoding():
+    """Best content coding the current request accepts, or None for identity"""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding, gzip_level=COMPRESSION_GZIP_LEVEL, brotli_quality=COMPRESSION_BROTLI_QUALITY):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def _compressed_stream(chunks, encoding):
+    """Compress a streamed body chunk by chunk, without buffering all of it"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        # wbits 31: zlib stream with a gzip header and trailer
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = process(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def compress_response(response):
+    """after_request hook: encode compressible bodies the client accepts compressed"""
+    if (request.method == "HEAD" or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or "Content-Encoding" in response.headers
+            or response.mimetype not in _COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compressed_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_BYTES:
+            return response
+        response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_responses(app):
+    """Install the JSON provider and response compression on an app"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
+
+
+class PrecompressedPayload:
+    """A JSON document encoded once, with every content coding of it"""
+    __slots__ = ("body", "variants")
+
+    def __init__(self, obj):
+        self.body = current_app.json.response(obj).get_data()
+        self.variants = {}
+        if len(self.body) >= COMPRESSION_MIN_BYTES:
+            self.variants = {
+                encoding: compress(self.body, encoding, PRECOMPRESSED_GZIP_LEVEL, PRECOMPRESSED_BROTLI_QUALITY)
+                for encoding in ENCODINGS
+            }
+
+    def response(self):
+        """The variant the current request accepts, as a response"""
+        encoding = negotiate_encoding() if self.variants else None
+        response = current_app.response_class(self.variants.get(encoding, self.body), mimetype="application/json")
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class PrecompressedCache:
+    """Most recently used PrecompressedPayloads by key"""
+
+    def __init__(self, max_entries=PRECOMPRESSED_CACHE_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._payloads = OrderedDict()
+        self._max_entries = max_entries
+        self._generation = 0  # bumped by invalidate, so payloads built meanwhile are not stored
+
+    def get(self, key, build):
+        """Cached payload for key, or PrecompressedPayload(build()) stored under it"""
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                return payload
+            generation = self._generation
+        payload = PrecompressedPayload(build())
+        with self._lock:
+            if generation != self._generation:
+                return payload
+            self._payloads[key] = payload
+            while len(self._payloads) > self._max_entries:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def invalidate(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._payloads.pop(key, None)
@@ -0,0 +1,204 @@
+"""
+Streaming export of exam results
+Answers of an exam are read from a server-side cursor over StudentAnswer
+joined with Student and Question, EXPORT_BATCH_ROWS at a time, and written
+out as CSV or XLSX chunk by chunk, so memory stays flat however large the
+cohort. Rows come ordered by student; whether an answer is correct is
+decided by item_statistics' rule, and a student's rows are held only until
+their score is known
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func, select
+
+from config import EXPORT_BATCH_ROWS
+from models import db, Question, Student, StudentAnswer
+from .item_statistics import is_correct, normalize_answer
+
+# Column headings, in the order of the rows of result_batches()
+RESULT_COLUMNS = (
+    "Roll Number", "Student Name", "Email", "Question ID", "Question", "Answer", "Correct Answer",
+    "Correct", "Answered At", "Score", "Answered", "Total Questions", "Percentage",
+)
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Characters XML 1.0 does not allow; PDF text can carry form feeds and the like
+_INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def ensure_results_index():
+    """Create the StudentAnswer indexes on a table created before they existed"""
+    for index in StudentAnswer.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+def results_query(exam_id):
+    """One row per answer to a question of the exam, grouped by student"""
+    return (
+        select(
+            Student.roll_number, Student.name, Student.email,
+            Question.id, Question.question_text, StudentAnswer.answer, Question.correct_answer,
+            StudentAnswer.answered_at, StudentAnswer.student_id,
+        )
+        .join(Student, StudentAnswer.student_id == Student.id)
+        .join(Question, StudentAnswer.question_id == Question.id)
+        .where(Question.exam_id == exam_id)
+        .order_by(Student.roll_number, Student.id, Question.id)
+    )
+
+
+def _student_rows(answers, total):
+    """Export rows of one student's answers, with their score"""
+    correct = [int(is_correct(normalize_answer(row[5]), normalize_answer(row[6]))) for row in answers]
+    score = sum(correct)
+    percentage = round(100.0 * score / total, 1) if total else None
+    return [
+        (*row[:7], flag, row[7], score, len(answers), total, percentage)
+        for row, flag in zip(answers, correct)
+    ]
+
+
+def result_batches(exam_id, batch_rows=EXPORT_BATCH_ROWS):
+    """Result rows in lists of about batch_rows (whole students), fetched as they are needed"""
+    total = db.session.execute(select(func.count(Question.id)).where(Question.exam_id == exam_id)).scalar()
+    result = db.session.execute(
+        results_query(exam_id).execution_options(stream_results=True, yield_per=batch_rows)
+    )
+    batch, answers = [], []
+    try:
+        for row in result:
+            if answers and row.student_id != answers[-1].student_id:
+                batch.extend(_student_rows(answers, total))
+                answers = []
+                if len(batch) >= batch_rows:
+                    yield batch
+                    batch = []
+            answers.append(row)
+        if answers:
+            batch.extend(_student_rows(answers, total))
+        if batch:
+            yield batch
+    finally:
+        result.close()
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return str(value)
+
+
+def csv_chunks(exam_id):
+    """CSV text of an exam's results: the header, then one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RESULT_COLUMNS)
+    yield buffer.getvalue()
+    for batch in result_batches(exam_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_cell_text(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable file zipfile writes into; the caller drains what was written"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Results" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values):
+    """<row> of inline cells: numbers as numbers, everything else as text"""
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        elif value is not None:
+            text = escape(_INVALID_XML_CHARS.sub("", _cell_text(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        else:
+            cells.append('<c/>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+
+def xlsx_chunks(exam_id):
+    """
+    XLSX workbook of an exam's results, as the bytes of a zip written on the fly
+    Cells are inline strings rather than a shared string table, which would
+    have to be held until the end
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(RESULT_COLUMNS).encode()
+            )
+            for batch in result_batches(exam_id):
+                sheet.write(''.join(map(_xlsx_row, batch)).encode())
+                yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
@@ -0,0 +1,117 @@
+"""
+Columnar container for extracted student rosters
+Rosters of tens of thousands of rows are kept as one list per field instead
+of one dict per student. Department, year, class and division repeat across
+the roster, so each distinct value is stored once and rows hold its index
+"""
+import json
+from array import array
+from json.encoder import encode_basestring_ascii
+
+# Fields of a roster row, in the order Roster.append takes them
+STUDENT_FIELDS = ("rollNumber", "name", "email", "department", "year", "class", "division")
+# The plain-text fallback never reads class or division, so its rows leave them out
+TEXT_STUDENT_FIELDS = ("rollNumber", "name", "email", "department", "year")
+_INTERNED_FIELDS = ("department", "year", "class", "division")
+
+# Rows per chunk of a streamed JSON response
+_JSON_CHUNK_ROWS = 1000
+
+
+class _InternedColumn:
+    """Column of repeating values stored as indexes into a table of distinct values"""
+    __slots__ = ("values", "codes", "_index")
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('I')
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, position):
+        return self.values[self.codes[position]]
+
+
+class Roster:
+    """
+    Students extracted from one roster, stored by column
+    Iterating yields the same dicts the API serves; json_chunks() streams the
+    response body without building them
+    """
+    __slots__ = ("fields", "_columns")
+
+    def __init__(self, fields=STUDENT_FIELDS):
+        self.fields = tuple(fields)
+        self._columns = {
+            field: _InternedColumn() if field in _INTERNED_FIELDS else []
+            for field in self.fields
+        }
+
+    @classmethod
+    def from_records(cls, records, fields=STUDENT_FIELDS):
+        """Roster from student dicts; missing fields are stored as ''"""
+        roster = cls(fields)
+        for record in records:
+            roster.append(*(record.get(field, '') for field in roster.fields))
+        return roster
+
+    def append(self, *values):
+        """Add one student; values in the order of self.fields"""
+        for field, value in zip(self.fields, values):
+            self._columns[field].append(value)
+
+    def __len__(self):
+        return len(self._columns["rollNumber"])
+
+    def column(self, field):
+        """All values of one field, in row order"""
+        column = self._columns[field]
+        if isinstance(column, _InternedColumn):
+            return [column.values[code] for code in column.codes]
+        return column
+
+    def __iter__(self):
+        columns = [(field, self._columns[field]) for field in self.fields]
+        for position in range(len(self)):
+            yield {field: column[position] for field, column in columns}
+
+    def json_chunks(self, **fields):
+        """
+        Stream {"students": [...], **fields} as JSON text chunks, keys sorted
+        like Flask's jsonify so clients see the same document
+        Distinct interned values are encoded once for the whole roster
+        """
+        keys = sorted(self.fields)
+        row_template = '{' + ','.join(json.dumps(key) + ':%s' for key in keys) + '}'
+        columns = []
+        for key in keys:
+            column = self._columns[key]
+            if isinstance(column, _InternedColumn):
+                columns.append(([encode_basestring_ascii(value) for value in column.values], column.codes))
+            else:
+                columns.append((None, column))
+
+        body = dict(fields, students=None)
+        for index, key in enumerate(sorted(body)):
+            yield ('{' if index == 0 else ',') + json.dumps(key) + ':'
+            if key != "students":
+                yield json.dumps(body[key])
+                continue
+
+            yield '['
+            for start in range(0, len(self), _JSON_CHUNK_ROWS):
+                end = start + _JSON_CHUNK_ROWS
+                chunk = [
+                    [values[code] for code in column[start:end]] if values is not None
+                    else list(map(encode_basestring_ascii, column[start:end]))
+                    for values, column in columns
+                ]
+                yield (',' if start else '') + ','.join(map(row_template.__mod__, zip(*chunk)))
+            yield ']'
+        yield '}\n'
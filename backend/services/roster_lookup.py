@@ -0,0 +1,229 @@
+"""
+In-memory roster index for spoken student verification
+Roll numbers are found by exact lookup after normalization, names through a
+character trigram index scored with the Dice coefficient (posting lists are
+counted with NumPy, so a lookup over 10,000 students stays around a
+millisecond). The index is built
+once from the Student table and then kept current incrementally: students
+added since the last lookup are loaded by id, and students changed or
+deleted through the ORM in this process are reloaded once their
+transaction commits
+"""
+import re
+import threading
+
+from sqlalchemy import select
+
+from config import VERIFICATION_NAME_MIN_SCORE, VERIFICATION_CANDIDATES
+from models import db, Student
+from .session_events import invalidate_after_commit
+from .spoken import words, spelled_runs
+
+_NOT_ALNUM = re.compile(r'[^A-Z0-9]')
+
+# Words around a spoken name or roll number that are not part of it
+_FILLER_WORDS = {
+    "my", "name", "is", "i", "am", "im", "this", "it", "its", "the", "roll",
+    "number", "no", "id", "student", "hello", "hi", "here", "speaking",
+    "for", "to", "you", "a", "and", "of", "in", "from", "exam", "present", "please", "me",
+}
+# Words after which homophones ("for", "to") are read as roll number digits
+_ROLL_CUE_WORDS = {"roll", "number"}
+
+
+def normalize_roll_number(value):
+    """'cs-1001 ' -> 'CS1001'"""
+    return _NOT_ALNUM.sub('', (value or '').upper())
+
+
+def normalize_name(value):
+    return ' '.join(words(value))
+
+
+def name_trigrams(name):
+    """Character trigrams of a normalized name, padded so word edges count"""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RosterIndex:
+    """Roll number and name index over Student rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students = {}      # id -> (roll key, trigrams, public dict)
+        self._by_roll = {}       # roll key -> id
+        self._postings = {}      # trigram -> set of ids
+        self._posting_arrays = {}  # trigram -> NumPy array of its ids, rebuilt after changes
+        self._name_sizes = None  # id -> trigram count of the name, NumPy array
+        self._max_id = 0
+        self._stale_ids = set()  # changed or deleted through the ORM since the last refresh
+
+    def _remove(self, student_id):
+        entry = self._students.pop(student_id, None)
+        if entry is None:
+            return
+        roll_key, trigrams, _ = entry
+        if self._by_roll.get(roll_key) == student_id:
+            del self._by_roll[roll_key]
+        for trigram in trigrams:
+            posting = self._postings.get(trigram)
+            if posting is not None:
+                posting.discard(student_id)
+                self._posting_arrays.pop(trigram, None)
+                if not posting:
+                    del self._postings[trigram]
+
+    def _add(self, student):
+        roll_key = normalize_roll_number(student.roll_number)
+        trigrams = name_trigrams(normalize_name(student.name))
+        public = {
+            "id": student.id,
+            "rollNumber": student.roll_number,
+            "name": student.name,
+            "class": student.class_name or '',
+            "division": student.division or '',
+        }
+        self._students[student.id] = (roll_key, trigrams, public)
+        if roll_key:
+            self._by_roll[roll_key] = student.id
+        for trigram in trigrams:
+            self._postings.setdefault(trigram, set()).add(student.id)
+            self._posting_arrays.pop(trigram, None)
+        self._max_id = max(self._max_id, student.id)
+
+    def mark_stale(self, student_ids):
+        """Reload these students on the next refresh (called from session events)"""
+        with self._lock:
+            self._stale_ids.update(student_ids)
+
+    def refresh(self):
+        """Load students added since the last refresh and reload stale ones"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        stale, self._stale_ids = self._stale_ids, set()
+        columns = select(Student.id, Student.roll_number, Student.name, Student.class_name, Student.division)
+        added = db.session.execute(columns.where(Student.id > self._max_id)).all()
+        reloaded = db.session.execute(columns.where(Student.id.in_(stale))).all() if stale else []
+        if not added and not reloaded and not stale:
+            return
+        for student_id in stale:
+            self._remove(student_id)
+        # SQLite hands the ids of deleted top rows out again
+        self._max_id = max(self._students, default=0)
+        for student in added + reloaded:
+            self._remove(student.id)
+            self._add(student)
+        self._name_sizes = None
+
+    def _posting_array(self, trigram, np):
+        array = self._posting_arrays.get(trigram)
+        if array is None:
+            array = self._posting_arrays[trigram] = np.fromiter(self._postings[trigram], dtype=np.int64)
+        return array
+
+    def _sizes(self, np):
+        if self._name_sizes is None or len(self._name_sizes) <= self._max_id:
+            sizes = np.ones(self._max_id + 1)
+            for student_id, (_, trigrams, _) in self._students.items():
+                sizes[student_id] = len(trigrams)
+            self._name_sizes = sizes
+        return self._name_sizes
+
+    def lookup(self, transcript, class_name=None, limit=VERIFICATION_CANDIDATES):
+        """
+        Match a transcript against the roster
+        A roll number spelled out in the transcript wins, at full confidence
+        unless a spoken name disagrees with it; otherwise names are ranked by
+        trigram Dice similarity
+        Returns: {"match": student or None, "matchedBy", "confidence", "candidates"}
+        """
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            return self._lookup(transcript, class_name, limit, np)
+
+    def _roll_number_match(self, runs, in_class):
+        """Id of the student whose roll number is spelled out in the runs, longest match first"""
+        windows = [
+            run[start:start + length]
+            for run in runs for length in range(len(run), 0, -1) for start in range(len(run) - length + 1)
+        ]
+        for window in sorted(windows, key=len, reverse=True):
+            roll_key = normalize_roll_number(''.join(characters for _, characters in window))
+            # A letter alone is a word far more often than a roll number
+            if not any(char.isdigit() for char in roll_key):
+                continue
+            student_id = self._by_roll.get(roll_key)
+            if student_id is not None and in_class(student_id):
+                return student_id
+        return None
+
+    def _name_candidates(self, query, in_class, limit, np):
+        """Students ranked by trigram Dice similarity of their name to the query trigrams"""
+        postings = [self._posting_array(trigram, np) for trigram in query if trigram in self._postings]
+        candidates = []
+        if postings:
+            shared = np.bincount(np.concatenate(postings), minlength=self._max_id + 1)
+            ids = np.flatnonzero(shared)
+            scores = 2 * shared[ids] / (len(query) + self._sizes(np)[ids])
+            for position in np.argsort(-scores, kind='stable'):
+                student_id = int(ids[position])
+                if in_class(student_id):
+                    candidates.append(dict(self._students[student_id][2], score=round(float(scores[position]), 3)))
+                    if len(candidates) == limit:
+                        break
+        return candidates
+
+    def _lookup(self, transcript, class_name, limit, np):
+        def in_class(student_id):
+            return not class_name or self._students[student_id][2]["class"] == class_name
+
+        runs = spelled_runs(transcript, _ROLL_CUE_WORDS)
+        spelled_positions = {position for run in runs for position, _ in run}
+        spoken_name = ' '.join(
+            word for position, word in enumerate(words(transcript))
+            if position not in spelled_positions and word not in _FILLER_WORDS
+        )
+        query = name_trigrams(spoken_name) if spoken_name else set()
+        candidates = self._name_candidates(query, in_class, limit, np) if query else []
+        best = candidates[0] if candidates and candidates[0]["score"] >= VERIFICATION_NAME_MIN_SCORE else None
+
+        student_id = self._roll_number_match(runs, in_class)
+        if student_id is not None:
+            public = self._students[student_id][2]
+            confidence = 1.0
+            if query:
+                trigrams = self._students[student_id][1]
+                name_score = 2 * len(query & trigrams) / (len(query) + len(trigrams))
+                if name_score < VERIFICATION_NAME_MIN_SCORE:
+                    # The spoken name is someone else's: trust the name, else doubt the roll number
+                    if best is not None and best["id"] != student_id:
+                        student_id = None
+                    else:
+                        confidence = round((1 + name_score) / 2, 3)
+            if student_id is not None:
+                return {"match": dict(public), "matchedBy": "rollNumber", "confidence": confidence,
+                        "candidates": [dict(public, score=confidence)]}
+
+        return {
+            "match": {key: value for key, value in best.items() if key != "score"} if best else None,
+            "matchedBy": "name" if best else None,
+            "confidence": best["score"] if best else 0.0,
+            "candidates": candidates,
+        }
+
+
+roster_index = RosterIndex()
+
+
+def _changed_students(session):
+    """Students updated or deleted through the ORM; they are reloaded on the next lookup"""
+    return (obj.id for obj in list(session.dirty) + list(session.deleted)
+            if isinstance(obj, Student) and obj.id is not None)
+
+
+invalidate_after_commit('changed_student_ids', _changed_students, roster_index.mark_stale)
@@ -0,0 +1,205 @@
+"""
+Roster table builder for spreadsheet-style PDFs (Excel/Sheets exports)
+Reads word positions into NumPy arrays, fixes the column boundaries once for
+the whole document and buckets words into rows by their y position, instead
+of running pdfplumber's general table finder on every page
+"""
+import logging
+
+from .pdf_utils import EXTRACTION_PROFILES
+
+logger = logging.getLogger(__name__)
+
+# Rulings closer than this (pt) are the same grid line, as in pdfplumber's snap
+_SNAP_TOLERANCE = 3
+# Drawn lines/rects thinner than this (pt) count as rulings
+_MAX_RULING_THICKNESS = 2
+# Without rulings, a column gutter is a run of x positions covered by at most
+# this share of rows (titles and stray notes may cross it) and at least this
+# many average glyph widths wide
+_MAX_GUTTER_COVERAGE = 0.02
+_MIN_GUTTER_GLYPHS = 1.5
+
+
+def _page_words(page, settings, np):
+    """Words of a page as (texts, x0, x1, top, bottom) arrays"""
+    if settings["dedupe_chars"]:
+        page = page.dedupe_chars()
+    words = page.extract_words(x_tolerance=settings["x_tolerance"], y_tolerance=settings["y_tolerance"])
+    texts = [word["text"] for word in words]
+    boxes = np.array([(word["x0"], word["x1"], word["top"], word["bottom"]) for word in words],
+                     dtype=float).reshape(-1, 4)
+    return texts, boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+
+
+def _page_rulings(page):
+    """x positions of vertical and y positions of horizontal rulings on a page"""
+    vertical, horizontal = [], []
+    for line in page.lines:
+        if abs(line["x1"] - line["x0"]) <= _MAX_RULING_THICKNESS:
+            vertical.append((line["x0"] + line["x1"]) / 2)
+        elif abs(line["bottom"] - line["top"]) <= _MAX_RULING_THICKNESS:
+            horizontal.append((line["top"] + line["bottom"]) / 2)
+    for rect in page.rects:
+        width, height = rect["x1"] - rect["x0"], rect["bottom"] - rect["top"]
+        if width <= _MAX_RULING_THICKNESS and height > _MAX_RULING_THICKNESS:
+            vertical.append((rect["x0"] + rect["x1"]) / 2)
+        elif height <= _MAX_RULING_THICKNESS and width > _MAX_RULING_THICKNESS:
+            horizontal.append((rect["top"] + rect["bottom"]) / 2)
+        elif width > _MAX_RULING_THICKNESS and height > _MAX_RULING_THICKNESS and rect.get("stroke"):
+            # Outlined cells: every side is a ruling
+            vertical.extend((rect["x0"], rect["x1"]))
+            horizontal.extend((rect["top"], rect["bottom"]))
+    return vertical, horizontal
+
+
+def _cluster(positions, np):
+    """Sorted positions merged within _SNAP_TOLERANCE, one mean per grid line"""
+    if not len(positions):
+        return np.empty(0)
+    ordered = np.sort(np.asarray(positions, dtype=float))
+    groups = np.concatenate(([0], np.cumsum(np.diff(ordered) > _SNAP_TOLERANCE)))
+    return np.bincount(groups, weights=ordered) / np.bincount(groups)
+
+
+def _gutter_columns(pages, np):
+    """
+    Column boundaries of an unruled document from the gaps no row's words
+    cover, measured over every page at once so all pages share them
+    """
+    x0 = np.concatenate([page[1] for page in pages])
+    x1 = np.concatenate([page[2] for page in pages])
+    if not len(x0):
+        return None
+    row_count = sum(_bucket_rows(page[3], None, np)[1] for page in pages)
+    glyph_width = np.median((x1 - x0) / np.maximum([len(text) for page in pages for text in page[0]], 1))
+
+    # Coverage per 1pt slot via a difference array over the word spans
+    origin = np.floor(x0.min())
+    starts = (np.floor(x0) - origin).astype(int)
+    ends = (np.ceil(x1) - origin).astype(int)
+    delta = np.zeros(ends.max() + 2, dtype=int)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    coverage = np.cumsum(delta)[:-1]
+
+    open_slot = coverage <= _MAX_GUTTER_COVERAGE * row_count
+    steps = np.diff(np.concatenate(([0], open_slot.astype(int), [0])))
+    gutter_starts, gutter_ends = np.flatnonzero(steps == 1), np.flatnonzero(steps == -1)
+    # Only gaps with text on both sides separate columns
+    interior = (gutter_starts > 0) & (gutter_ends < len(open_slot))
+    gutter_starts, gutter_ends = gutter_starts[interior], gutter_ends[interior]
+    wide = (gutter_ends - gutter_starts) >= _MIN_GUTTER_GLYPHS * glyph_width
+    middles = origin + (gutter_starts[wide] + gutter_ends[wide]) / 2
+    if not len(middles):
+        return None
+    return np.concatenate(([-np.inf], middles, [np.inf]))
+
+
+def _bucket_rows(top, row_lines, np):
+    """
+    Row index per word: between consecutive horizontal rulings when the page
+    has them, otherwise a new row wherever the next line starts lower than
+    the row's own line spacing allows
+    Returns: (row index array, number of rows); -1 marks words outside the grid
+    """
+    if row_lines is not None and len(row_lines) >= 2:
+        rows = np.searchsorted(row_lines, top + _SNAP_TOLERANCE / 2, side='right') - 1
+        rows[rows >= len(row_lines) - 1] = -1
+        return rows, len(row_lines) - 1
+    if not len(top):
+        return np.empty(0, dtype=int), 0
+    order = np.argsort(top, kind='stable')
+    breaks = np.diff(top[order]) > _SNAP_TOLERANCE
+    rows = np.empty(len(top), dtype=int)
+    rows[order] = np.concatenate(([0], np.cumsum(breaks)))
+    return rows, int(rows.max()) + 1
+
+
+def _page_rows(texts, x0, top, column_edges, row_lines, np):
+    """Rows of one page as lists of cell strings (words ' ', lines '\\n')"""
+    column_count = len(column_edges) - 1
+    columns = np.searchsorted(column_edges, x0 + 0.5, side='right') - 1
+    rows, _ = _bucket_rows(top, row_lines, np)
+    inside = (columns >= 0) & (columns < column_count) & (rows >= 0)
+
+    words = np.flatnonzero(inside)
+    words = words[np.lexsort((x0[words], top[words], columns[words], rows[words]))]
+    table = []
+    current_row = previous_column = None
+    line_top = 0.0
+    for word in words:
+        row, column = rows[word], columns[word]
+        if row != current_row:
+            current_row, previous_column = row, None
+            table.append([[] for _ in range(column_count)])
+        cell = table[-1][column]
+        if column != previous_column:
+            line_top = top[word]
+        elif top[word] - line_top > _SNAP_TOLERANCE:
+            cell.append('\n')
+            line_top = top[word]
+        else:
+            cell.append(' ')
+        cell.append(texts[word])
+        previous_column = column
+    return [[''.join(cell) for cell in row] for row in table]
+
+
+def build_roster_table(pages, np):
+    """
+    One table for the whole document from per-page word arrays and rulings
+    pages: list of (texts, x0, x1, top, bottom, vertical_rulings, horizontal_rulings)
+    Returns: list of rows (header first), or [] when the words do not form
+    at least two columns
+    """
+    vertical = [x for page in pages for x in page[5]]
+    column_edges = _cluster(vertical, np) if vertical else None
+    if column_edges is None or len(column_edges) < 3:
+        column_edges = _gutter_columns(pages, np)
+    if column_edges is None or len(column_edges) < 3:
+        return []
+
+    table = []
+    for texts, x0, _, top, _, _, horizontal in pages:
+        row_lines = _cluster(horizontal, np) if horizontal else None
+        table.extend(_page_rows(texts, x0, top, column_edges, row_lines, np))
+
+    # Titles above the header fill a single cell; repeated headers on later
+    # pages are dropped so the table reads as one
+    while table and sum(1 for cell in table[0] if cell) < 2:
+        table.pop(0)
+    if len(table) < 2:
+        return []
+    header = table[0]
+    return [header] + [row for row in table[1:] if row != header]
+
+
+def extract_roster_tables(pdf_file_stream, profile="fast"):
+    """
+    Extract a roster as one table spanning all pages
+    Same row lists as pdfplumber's extract_tables for ruled grids (minus empty
+    rows and repeated headers); unruled exports are split on their gutters
+    Returns: [table] or [] when the PDF does not look tabular
+    """
+    import numpy as np
+    import pdfplumber
+
+    settings = EXTRACTION_PROFILES[profile]
+    try:
+        pdf_file_stream.seek(0)
+        pages = []
+        with pdfplumber.open(pdf_file_stream) as pdf:
+            for page in pdf.pages:
+                pages.append(_page_words(page, settings, np) + _page_rulings(page))
+                # Only the word and ruling arrays are kept; release the page's objects
+                page.close()
+        table = build_roster_table(pages, np)
+    except Exception as e:
+        logger.exception("Error building roster table: %s", e)
+        return []
+
+    if table:
+        logger.info("Built roster table with %d rows and %d columns", len(table), len(table[0]))
+        return [table]
+    return []
@@ -0,0 +1,106 @@
+"""
+Roster validation before students are saved
+Student.roll_number and Student.email are unique, so a roster is checked for
+repeats within the file (hash index per field) and against the Student
+table (a few chunked IN queries) before anything is written
+"""
+from config import ROSTER_VALIDATION_CHUNK_SIZE
+from models import db, Student
+from .roster import Roster, STUDENT_FIELDS
+
+# Roster field -> unique Student column it is saved to
+UNIQUE_FIELDS = {
+    "rollNumber": Student.roll_number,
+    "email": Student.email,
+}
+
+
+def parse_roster(records):
+    """Roster from student dicts of an API request, values as stripped strings"""
+    return Roster.from_records(
+        {field: str(record.get(field) or '').strip() for field in STUDENT_FIELDS}
+        for record in records
+    )
+
+
+def duplicate_rows(values):
+    """
+    Rows repeating a value seen on an earlier row; empty values never clash
+    Returns: {row index: index of the first row with that value}
+    """
+    first_rows = {}
+    duplicates = {}
+    for row, value in enumerate(values):
+        if not value:
+            continue
+        first = first_rows.setdefault(value, row)
+        if first != row:
+            duplicates[row] = first
+    return duplicates
+
+
+def existing_values(column, values, chunk_size=ROSTER_VALIDATION_CHUNK_SIZE):
+    """Subset of values already stored in a Student column, chunk_size per IN query"""
+    wanted = sorted({value for value in values if value})
+    found = set()
+    for start in range(0, len(wanted), chunk_size):
+        chunk = wanted[start:start + chunk_size]
+        found.update(value for (value,) in db.session.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def validate_roster(roster):
+    """
+    Per-row conflicts that would make saving a roster fail
+    Returns: list of {"row", "field", "value", "reason", "firstRow"?} sorted by
+    row, where reason is "missing", "duplicate" (firstRow is the row it repeats)
+    or "exists" (already saved for another student)
+    """
+    conflicts = []
+    for row, (roll_number, name) in enumerate(zip(roster.column("rollNumber"), roster.column("name"))):
+        if not roll_number:
+            conflicts.append({"row": row, "field": "rollNumber", "value": roll_number, "reason": "missing"})
+        if not name:
+            conflicts.append({"row": row, "field": "name", "value": name, "reason": "missing"})
+
+    for field, column in UNIQUE_FIELDS.items():
+        if field not in roster.fields:
+            continue
+        values = roster.column(field)
+        duplicates = duplicate_rows(values)
+        for row, first in duplicates.items():
+            conflicts.append({"row": row, "field": field, "value": values[row],
+                              "reason": "duplicate", "firstRow": first})
+
+        stored = existing_values(column, values)
+        if stored:
+            for row, value in enumerate(values):
+                if value in stored and row not in duplicates:
+                    conflicts.append({"row": row, "field": field, "value": value, "reason": "exists"})
+
+    conflicts.sort(key=lambda conflict: conflict["row"])
+    return conflicts
+
+
+def save_roster(roster):
+    """
+    Insert a validated roster as Student rows in one batch
+    Empty emails are stored as NULL so they do not clash on the unique column
+    Returns: number of students saved
+    """
+    rows = [
+        {
+            "roll_number": student["rollNumber"],
+            "name": student["name"],
+            "email": student.get("email") or None,
+            "department": student.get("department", ""),
+            "year": student.get("year", ""),
+            "class_name": student.get("class", ""),
+            "division": student.get("division", ""),
+        }
+        for student in roster
+    ]
+    if rows:
+        db.session.execute(db.insert(Student), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,32 @@
+"""
+Session listeners that keep in-process caches in step with committed writes
+Keys of the rows each flush writes are collected in session.info and handed
+to the cache once the transaction commits, so a cache never drops or reloads
+entries for changes that are rolled back
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+def invalidate_after_commit(info_key, changed_keys, invalidate):
+    """
+    Call invalidate(keys) after every commit whose flushes wrote rows
+    changed_keys(session) names (it runs after each flush, with the session's
+    new, dirty and deleted objects still in place); info_key is where the
+    keys wait in session.info until then
+    """
+    @event.listens_for(Session, 'after_flush')
+    def _collect_changes(session, flush_context):
+        keys = set(changed_keys(session))
+        if keys:
+            session.info.setdefault(info_key, set()).update(keys)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidate_changes(session):
+        keys = session.info.pop(info_key, None)
+        if keys:
+            invalidate(keys)
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _forget_changes(session, previous_transaction):
+        session.info.pop(info_key, None)
@@ -0,0 +1,136 @@
+"""
+Speech-ready renderings of questions and options
+Produced once when questions are saved, so read-aloud clients get text they
+can hand straight to speech synthesis. Covers the same substitutions as the
+frontend's preprocessTextForSpeech, but in a single regex pass, and reads
+code blocks line by line instead of as one run-on sentence
+"""
+import re
+
+# Operators, replaced wherever they appear (longest first)
+_SYMBOLS = {
+    '===': 'strict equals', '!==': 'strict not equals', '==': 'equals equals',
+    '!=': 'not equals', '<=': 'less than or equal to', '>=': 'greater than or equal to',
+    '&&': 'and', '||': 'or', '++': 'plus plus', '--': 'minus minus',
+    '+=': 'plus equals', '-=': 'minus equals', '*=': 'times equals',
+    '/=': 'divided equals', '%=': 'modulo equals', '=>': 'arrow function',
+    '->': 'arrow', '::': 'double colon', '<<': 'shift left', '>>': 'shift right',
+}
+
+# Terms replaced as whole words, case-insensitively. Single-character
+# operators only count between word characters ("a<b") or between spaces ("a < b")
+_TERMS = {
+    # Programming terms
+    'HTML': 'H T M L', 'CSS': 'C S S', 'JavaScript': 'Java Script', 'JS': 'Java Script',
+    'API': 'A P I', 'URL': 'U R L', 'HTTP': 'H T T P', 'HTTPS': 'H T T P S',
+    'JSON': 'Jason', 'XML': 'X M L', 'SQL': 'S Q L', 'PHP': 'P H P', 'IDE': 'I D E',
+    'UI': 'User Interface', 'UX': 'User Experience', 'DOM': 'D O M', 'AJAX': 'Ajax',
+    'REST': 'Rest', 'CRUD': 'C R U D', 'OOP': 'Object Oriented Programming',
+    # Common abbreviations
+    'e.g.': 'for example', 'i.e.': 'that is', 'etc.': 'etcetera', 'vs.': 'versus', 'vs': 'versus',
+    # Options
+    'Option 1': 'Option number 1', 'Option 2': 'Option number 2',
+    'Option 3': 'Option number 3', 'Option 4': 'Option number 4',
+    # Code keywords
+    'const': 'constant', 'var': 'variable',
+    # Mathematical symbols
+    '+': 'plus', '*': 'times', '/': 'divided by', '%': 'modulo',
+    '<': 'less than', '>': 'greater than', '!': 'not', '=': 'equals',
+    # File extensions
+    '.js': 'dot javascript', '.html': 'dot H T M L', '.css': 'dot C S S',
+    '.json': 'dot jason', '.xml': 'dot X M L', '.txt': 'dot text', '.pdf': 'dot P D F',
+    # Words speech engines mispronounce
+    'cache': 'cash', 'facade': 'fa-sahd', 'queue': 'cue', 'tuple': 'two-pull',
+    'enum': 'ee-num', 'async': 'a-sync', 'await': 'a-wait', 'regex': 'regular expression',
+    'sudo': 'sue-do', 'chmod': 'change mode', 'char': 'care', 'int': 'integer',
+    'bool': 'boolean', 'struct': 'structure', 'malloc': 'mal-lock', 'printf': 'print-f',
+    'scanf': 'scan-f', 'iostream': 'I O stream', 'endl': 'end line',
+    'nullptr': 'null pointer', 'sizeof': 'size of', 'typedef': 'type def',
+    'extern': 'external', 'inline': 'in-line', 'override': 'over-ride',
+    'namespace': 'name space', 'typename': 'type name', 'decltype': 'declare type',
+    'std': 'standard', 'cout': 'see-out', 'cin': 'see-in', 'cerr': 'see-error',
+    # Database terms
+    'MySQL': 'My S Q L', 'PostgreSQL': 'Postgres S Q L', 'MongoDB': 'Mongo D B', 'NoSQL': 'No S Q L',
+}
+
+
+def _term_pattern(term):
+    escaped = re.escape(term)
+    if len(term) == 1:
+        return rf'(?<=\w){escaped}(?=\w)|(?<=\s){escaped}(?=\s)'
+    left = r'\b' if term[0].isalnum() else r'(?<=\w)'
+    if term[-1].isalnum():
+        right = r'\b'
+    elif term.endswith('.'):
+        right = ''
+    else:
+        right = r'(?=\w)'
+    return left + escaped + right
+
+
+_SPOKEN = {key.lower(): value for key, value in {**_TERMS, **_SYMBOLS}.items()}
+_REPLACEMENTS = re.compile('|'.join(
+    re.escape(key) if key in _SYMBOLS else _term_pattern(key)
+    for key in sorted({**_TERMS, **_SYMBOLS}, key=len, reverse=True)
+), re.IGNORECASE)
+
+_PAUSE_AFTER = re.compile(r'([.,:;])(?=[^\s\d])')
+_LEADING_MINUS = re.compile(r'(\s|^)-\s*(\d)')
+_NUMBER_MINUS = re.compile(r'(\d)\s*-\s*(\d)')
+_WHITESPACE = re.compile(r'\s+')
+_SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+(?=[.,:;?!](?:\s|$))')
+_CODE_SIGNS = re.compile(r'[{}();=<>\[\]]|^\s')
+_BRACES = {'{': 'open brace', '}': 'close brace'}
+_CODE_BRACES = re.compile(r'[{}]')
+
+
+def speak_line(text):
+    """One line of text as it should be spoken"""
+    text = _REPLACEMENTS.sub(lambda match: f" {_SPOKEN[match.group(0).lower()]} ", text)
+    text = _PAUSE_AFTER.sub(r'\1 ', text)
+    text = _LEADING_MINUS.sub(r'\1minus \2', text)
+    text = _NUMBER_MINUS.sub(r'\1 minus \2', text)
+    return _SPACE_BEFORE_PUNCTUATION.sub('', _WHITESPACE.sub(' ', text)).strip()
+
+
+def _is_code_block(lines):
+    """Blocks of several lines that look like code are read line by line"""
+    return len(lines) > 1 and sum(1 for line in lines if _CODE_SIGNS.search(line)) * 2 >= len(lines)
+
+
+def speech_text(text):
+    """
+    Speech-ready rendering of a question or option
+    Paragraphs are read as sentences; code blocks (as laid out by
+    format_question_with_code) line by line with their indentation depth
+    """
+    if not text:
+        return ''
+    spoken = []
+    for block in re.split(r'\n\s*\n', text):
+        lines = [line.rstrip() for line in block.split('\n') if line.strip()]
+        if not lines:
+            continue
+        if not _is_code_block(lines):
+            spoken.append(speak_line(' '.join(lines)))
+            continue
+        base = min(len(line) - len(line.lstrip()) for line in lines)
+        spoken.append('Code.')
+        for number, line in enumerate(lines, 1):
+            depth = (len(line) - len(line.lstrip()) - base) // 4
+            prefix = f"Line {number}, indent {depth}:" if depth else f"Line {number}:"
+            line = _CODE_BRACES.sub(lambda match: f" {_BRACES[match.group(0)]} ", line).rstrip('; ')
+            spoken.append(f"{prefix} {speak_line(line)}.")
+        spoken.append('End of code.')
+    return ' '.join(spoken)
+
+
+def speech_options(options):
+    """Speech-ready rendering of each option"""
+    return [speech_text(option) for option in options or []]
+
+
+def render_question_speech(question):
+    """Fill a Question row's speech columns from its text and options"""
+    question.speech_text = speech_text(question.question_text)
+    question.speech_options = speech_options(question.options)
@@ -0,0 +1,108 @@
+"""
+Normalization of speech transcripts for the voice-only flows
+Speech recognizers spell digits and letters out ("c s one zero two",
+"option bee"), so transcripts are reduced to plain tokens before matching.
+Ordinary words that sound like a digit or a letter ("for", "to", "you")
+are only read as one inside a spelled-out run
+"""
+import re
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+NUMBER_WORDS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+}
+
+LETTER_NAMES = {
+    "ay": "a", "bee": "b", "dee": "d", "ee": "e", "eff": "f", "gee": "g",
+    "aitch": "h", "jay": "j", "kay": "k", "el": "l", "ell": "l", "em": "m",
+    "en": "n", "pee": "p", "cue": "q", "queue": "q", "ar": "r", "ess": "s",
+    "tee": "t", "vee": "v", "ex": "x", "zed": "z", "zee": "z",
+}
+
+# Words recognizers return for digits and letters that are also ordinary words
+HOMOPHONES = {
+    "won": "1", "to": "2", "too": "2", "for": "4", "ate": "8",
+    "a": "a", "be": "b", "see": "c", "sea": "c", "eye": "i", "i": "i", "are": "r",
+    "tea": "t", "you": "u", "why": "y",
+}
+
+# Words a cue carries over: "roll number is ..."
+_CUE_LINK_WORDS = {"is", "its"}
+
+# "double five" -> "55"
+_REPEAT_WORDS = {"double": 2, "triple": 3}
+
+
+def words(text):
+    """Lowercase word tokens of a transcript"""
+    return _WORD_PATTERN.findall((text or "").lower())
+
+
+def _spelled(word):
+    """Characters a word spells out for certain, or None"""
+    if any(char.isdigit() for char in word) or len(word) == 1:
+        return word
+    return NUMBER_WORDS.get(word) or LETTER_NAMES.get(word)
+
+
+def spelled_tokens(text):
+    """
+    Transcript tokens with spelled-out digits and letter names replaced by
+    the characters they stand for; other words, homophones included, are
+    kept as they are
+    """
+    tokens = []
+    repeat = 1
+    for word in words(text):
+        if word in _REPEAT_WORDS:
+            repeat = _REPEAT_WORDS[word]
+            continue
+        tokens.extend([_spelled(word) or word] * repeat)
+        repeat = 1
+    return tokens
+
+
+def _homophone_runs(segment, cued):
+    """Split a segment of spelled words and homophones where a homophone is read as a word"""
+    runs, run = [], []
+    spelled = [kind == "spelled" for _, _, kind in segment]
+    for index, (position, characters, kind) in enumerate(segment):
+        keep = (kind == "spelled"
+                or (cued and not any(spelled[:index]))
+                or (any(spelled[:index]) and any(spelled[index + 1:])))
+        if keep:
+            run.append((position, characters))
+        elif run:
+            runs.append(run)
+            run = []
+    if run:
+        runs.append(run)
+    return runs
+
+
+def spelled_runs(text, cue_words=()):
+    """
+    Runs of consecutive spelled-out characters in a transcript ("c s one
+    zero two" -> "c", "s", "1", "0", "2"), each as a list of (word position,
+    characters). A homophone only joins a run between two certainly spelled
+    words, or right after one of cue_words ("roll number is for two" -> "4",
+    "2"); elsewhere it is read as the word it is
+    """
+    runs = []
+    segment, cued = [], False
+    repeat = 1
+    for position, word in enumerate(words(text) + [""]):
+        if word in _REPEAT_WORDS:
+            repeat = _REPEAT_WORDS[word]
+            continue
+        if word in HOMOPHONES:
+            segment.append((position, HOMOPHONES[word] * repeat, "homophone"))
+        elif word and _spelled(word) is not None:
+            segment.append((position, _spelled(word) * repeat, "spelled"))
+        else:
+            runs.extend(_homophone_runs(segment, cued))
+            segment, cued = [], word in cue_words or (cued and word in _CUE_LINK_WORDS)
+        repeat = 1
+    return runs
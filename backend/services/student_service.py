@@ -1,20 +1,35 @@
 """
 Student PDF processing service
 """
-import traceback
+import logging
 from .pdf_utils import extract_tables_from_pdf, extract_text_from_pdf
+from .roster import Roster, TEXT_STUDENT_FIELDS
+from .roster_tables import extract_roster_tables
 
-def extract_students_from_pdf(pdf_file_stream):
+logger = logging.getLogger(__name__)
+
+
+def _cell_text(row, index):
+    """Stripped text of a table cell; '' for empty or missing cells"""
+    cell = row[index] if index < len(row) else None
+    return str(cell).strip() if cell else ''
+
+
+def extract_students_from_pdf(pdf_file_stream, profile="fast"):
     """
     Extracts student information from a PDF file stream.
     Enhanced to handle tabular format PDFs (Excel converted to PDF).
     Supports both table extraction and text-based patterns.
+    profile: extraction profile name (see pdf_utils.EXTRACTION_PROFILES)
+    Returns: Roster of the students found
     """
-    students = []
+    students = Roster()
     
     try:
-        # Method 1: Try to extract tables first (for Excel-converted PDFs)
-        tables = extract_tables_from_pdf(pdf_file_stream)
+        # Method 1: Try to extract tables first (for Excel-converted PDFs);
+        # the roster builder handles spreadsheet grids, pdfplumber's table
+        # finder anything it cannot split into columns
+        tables = extract_roster_tables(pdf_file_stream, profile) or extract_tables_from_pdf(pdf_file_stream, profile)
         
         if tables:
             for table_index, table in enumerate(tables):
@@ -23,7 +38,7 @@ def extract_students_from_pdf(pdf_file_stream):
                     
                 # Get headers (first row)
                 headers = [str(cell).strip().lower() if cell else '' for cell in table[0]]
-                print(f"Table {table_index + 1} headers: {headers}")
+                logger.debug("Table %d headers: %s", table_index + 1, headers)
                 
                 # Map common header variations to standard fields
                 header_mapping = {}
@@ -47,115 +62,55 @@ def extract_students_from_pdf(pdf_file_stream):
                     elif any(keyword in header for keyword in ['div', 'division', 'section']):
                         header_mapping['division'] = i
                 
-                print(f"Header mapping: {header_mapping}")
+                logger.debug("Header mapping: %s", header_mapping)
                 
                 # Extract student data from remaining rows
-                for row_index, row in enumerate(table[1:], start=1):
+                for row in table[1:]:
                     if not row or all(not cell or str(cell).strip() == '' for cell in row):
                         continue  # Skip empty rows
-                    
-                    student = {}
-                    
-                    # Extract data based on header mapping
-                    if 'rollNumber' in header_mapping:
-                        roll_cell = row[header_mapping['rollNumber']]
-                        if roll_cell:
-                            student['rollNumber'] = str(roll_cell).strip()
-                    
-                    # Handle separate first/last name columns
+
+                    def mapped(field):
+                        return _cell_text(row, header_mapping[field]) if field in header_mapping else ''
+
+                    # If no header mapping worked, fall back to positional extraction
+                    roll_number = mapped('rollNumber') or _cell_text(row, 0)
+
+                    # Separate first/last name columns, else a single name column,
+                    # else assume positions: roll_no, first_name, last_name
                     if 'firstName' in header_mapping and 'lastName' in header_mapping:
-                        first_cell = row[header_mapping['firstName']] if header_mapping['firstName'] < len(row) else None
-                        last_cell = row[header_mapping['lastName']] if header_mapping['lastName'] < len(row) else None
-                        
-                        first_name = str(first_cell).strip() if first_cell else ''
-                        last_name = str(last_cell).strip() if last_cell else ''
-                        
-                        if first_name or last_name:
-                            student['name'] = f"{first_name} {last_name}".strip()
-                    
-                    # Handle single name column (fallback)
-                    elif 'name' in header_mapping and not student.get('name'):
-                        name_cell = row[header_mapping['name']]
-                        if name_cell:
-                            student['name'] = str(name_cell).strip()
-                    
-                    # Handle other fields
-                    if 'email' in header_mapping:
-                        email_cell = row[header_mapping['email']]
-                        if email_cell:
-                            student['email'] = str(email_cell).strip()
-                    
-                    if 'department' in header_mapping:
-                        dept_cell = row[header_mapping['department']]
-                        if dept_cell:
-                            student['department'] = str(dept_cell).strip()
-                    
-                    if 'year' in header_mapping:
-                        year_cell = row[header_mapping['year']]
-                        if year_cell:
-                            student['year'] = str(year_cell).strip()
-                    
-                    if 'class' in header_mapping:
-                        class_cell = row[header_mapping['class']]
-                        if class_cell:
-                            student['class'] = str(class_cell).strip()
-                    
-                    if 'division' in header_mapping:
-                        div_cell = row[header_mapping['division']]
-                        if div_cell:
-                            student['division'] = str(div_cell).strip()
-                    
-                    # If no header mapping worked, try positional extraction
-                    if not student.get('rollNumber') and len(row) > 0 and row[0]:
-                        student['rollNumber'] = str(row[0]).strip()
-                    
-                    # Try to construct name from positions if not already set
-                    if not student.get('name'):
-                        if len(row) > 1 and row[1] and len(row) > 2 and row[2]:
-                            # Assume positions: roll_no, first_name, last_name
-                            first_name = str(row[1]).strip() if row[1] else ''
-                            last_name = str(row[2]).strip() if row[2] else ''
-                            if first_name or last_name:
-                                student['name'] = f"{first_name} {last_name}".strip()
-                        elif len(row) > 1 and row[1]:
-                            # Single name column
-                            student['name'] = str(row[1]).strip()
-                    
-                    # Handle other positional data
-                    if not student.get('email') and len(row) > 3 and row[3]:
-                        potential_email = str(row[3]).strip()
-                        if '@' in potential_email:  # Basic email check
-                            student['email'] = potential_email
-                    
-                    # Set defaults for missing fields
-                    student.setdefault('email', '')
-                    student.setdefault('department', '')
-                    student.setdefault('year', '')
-                    student.setdefault('class', '')
-                    student.setdefault('division', '')
-                    
+                        name = f"{mapped('firstName')} {mapped('lastName')}".strip()
+                    else:
+                        name = mapped('name')
+                    if not name:
+                        if len(row) > 2 and row[1] and row[2]:
+                            name = f"{_cell_text(row, 1)} {_cell_text(row, 2)}".strip()
+                        else:
+                            name = _cell_text(row, 1)
+
+                    email = mapped('email')
+                    if not email and '@' in _cell_text(row, 3):  # Basic email check
+                        email = _cell_text(row, 3)
+
                     # Validate and add student
-                    if student.get('rollNumber') and student.get('name'):
-                        # Clean up the data
-                        student['rollNumber'] = student['rollNumber'].replace('None', '').strip()
-                        student['name'] = student['name'].replace('None', '').strip()
-                        
-                        if student['rollNumber'] and student['name']:
-                            students.append(student)
-                            print(f"Extracted student: {student}")
-        
+                    roll_number = roll_number.replace('None', '').strip()
+                    name = name.replace('None', '').strip()
+                    if roll_number and name:
+                        students.append(
+                            roll_number, name, email, mapped('department'),
+                            mapped('year'), mapped('class'), mapped('division'),
+                        )
+
         # Method 2: Fallback to text extraction if no tables found
         if not tables:
-            text = extract_text_from_pdf(pdf_file_stream)
+            text = extract_text_from_pdf(pdf_file_stream, profile)
             if text:
-                students.extend(extract_students_from_text(text))
-                
+                students = Roster.from_records(extract_students_from_text(text), TEXT_STUDENT_FIELDS)
+
     except Exception as e:
-        print(f"Error processing PDF: {e}")
-        traceback.print_exc()
-        return []
+        logger.exception("Error processing PDF: %s", e)
+        return Roster()
 
-    print(f"Total extracted students: {len(students)}")
+    logger.info("Total extracted students: %d", len(students))
     return students
 
 def extract_students_from_text(text):
@@ -0,0 +1,76 @@
+"""
+Train the question scorer used by the paragraph fallback
+
+    python -m train_question_scorer corpus.jsonl [more.jsonl ...] [--out PATH]
+
+Each corpus line is {"text": "...", "label": 1 or 0}: a paragraph as it comes
+out of PDF extraction and whether it is a question. A share of the corpus
+is held out to report accuracy next to that of the is_question_text rules;
+the weights are then fitted on the whole corpus and written to --out
+(QUESTION_SCORER_WEIGHTS by default), where extraction picks them up.
+"""
+import argparse
+import json
+import random
+import sys
+
+from config import QUESTION_SCORER_WEIGHTS
+
+
+def load_corpus(paths):
+    texts, labels = [], []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if not isinstance(record.get("text"), str) or record.get("label") not in (0, 1, True, False):
+                    raise ValueError(f"{path}:{line_number}: expected {{\"text\": str, \"label\": 0 or 1}}")
+                texts.append(record["text"])
+                labels.append(int(record["label"]))
+    return texts, labels
+
+
+def accuracy(predicted, labels):
+    return sum(int(p) == label for p, label in zip(predicted, labels)) / max(1, len(labels))
+
+
+def main(argv=None):
+    from services.question_scorer import train_question_scorer
+    from services.question_service import is_question_text
+
+    parser = argparse.ArgumentParser(description="Train the paragraph question scorer")
+    parser.add_argument('corpus', nargs='+', help="JSONL files of {\"text\", \"label\"} records")
+    parser.add_argument('--out', default=QUESTION_SCORER_WEIGHTS)
+    parser.add_argument('--dim', type=int, default=1 << 16, help="number of hashed features")
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--holdout', type=float, default=0.2, help="share of the corpus held out for evaluation")
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args(argv)
+
+    texts, labels = load_corpus(args.corpus)
+    if len(set(labels)) < 2:
+        parser.error("the corpus needs both questions and non-questions")
+
+    order = list(range(len(texts)))
+    random.Random(args.seed).shuffle(order)
+    held = set(order[:int(len(order) * args.holdout)])
+    if held:
+        train = [i for i in order if i not in held]
+        scorer = train_question_scorer([texts[i] for i in train], [labels[i] for i in train],
+                                       dim=args.dim, epochs=args.epochs)
+        held_texts = [texts[i] for i in sorted(held)]
+        held_labels = [labels[i] for i in sorted(held)]
+        scored = scorer.probabilities(held_texts) >= 0.5
+        print(f"held out {len(held)} of {len(texts)}: scorer accuracy {accuracy(scored, held_labels):.3f}, "
+              f"rules accuracy {accuracy(map(is_question_text, held_texts), held_labels):.3f}")
+
+    scorer = train_question_scorer(texts, labels, dim=args.dim, epochs=args.epochs)
+    scorer.save(args.out)
+    print(f"wrote {args.out} ({args.dim} features, trained on {len(texts)} paragraphs)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,10 +14,16 @@ const PdfUpload = ({
   const [uploadedFileName, setUploadedFileName] = useState("");
   const [extractedQuestions, setExtractedQuestions] = useState([]);
   const fileInputRef = useRef(null);
+  // Lets the backend re-extract only the pages that changed when the same
+  // document (same file name) is uploaded again
+  const lastExtractionRef = useRef(null);
 
   const uploadPdfToBackend = async (file) => {
     const formData = new FormData();
     formData.append('file', file);
+    if (lastExtractionRef.current?.fileName === file.name) {
+      formData.append('previousExtractionId', lastExtractionRef.current.extractionId);
+    }
 
     // Use production API URL when deployed, localhost for development
     const apiUrl = process.env.NODE_ENV === 'production' 
@@ -36,6 +42,9 @@ const PdfUpload = ({
       }
 
       const result = await response.json();
+      lastExtractionRef.current = result.extractionId
+        ? { extractionId: result.extractionId, fileName: file.name }
+        : null;
       
       // Handle the new API response format
       if (result.questions) {